@@ -0,0 +1,70 @@
+"""Room allocation under per-room-type reservation locks.
+
+Picking a room and inserting its booking used to be a SELECT followed by an
+INSERT with nothing in between, so two concurrent requests could both see the
+same room as free. Every allocation now runs while holding the lock of each
+room type it touches: the availability check, the insert, the commit and the
+availability index update happen as one step per room type, while bookings
+for different room types still proceed in parallel.
+
+Locks are process-local; the database-level guard for multi-process
+deployments is the room-night ledger.
+"""
+import threading
+from contextlib import contextmanager
+
+from assignment import rank_rooms
+from availability import availability_index
+
+
+class ReservationLocks:
+    """One lock per room type, created on first use."""
+
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.waits = 0
+
+    def _lock_for(self, room_type):
+        with self._guard:
+            lock = self._locks.get(room_type)
+            if lock is None:
+                lock = self._locks[room_type] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def hold(self, *room_types):
+        """Hold the locks of all `room_types`, always taken in sorted order."""
+        locks = [self._lock_for(t) for t in sorted(set(room_types), key=str)]
+        acquired = []
+        try:
+            for lock in locks:
+                if not lock.acquire(blocking=False):
+                    self.waits += 1
+                    lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def stats(self):
+        with self._guard:
+            return {'room_types': len(self._locks), 'contended_acquisitions': self.waits}
+
+
+reservation_locks = ReservationLocks()
+
+
+def pick_rooms(room_type, check_in, check_out, quantity, taken=None):
+    """Ids of up to `quantity` free, bookable rooms of `room_type`, best fit first.
+
+    `taken` maps room ids to (check_in, check_out) stays already claimed by the
+    current request but not committed yet. Call with the room type's lock held.
+    """
+    taken = taken or {}
+    candidates = [
+        room_id for room_id in availability_index.free_rooms(check_in, check_out, room_type)
+        if not any(ci < check_out and co > check_in for ci, co in taken.get(room_id, ()))
+    ]
+    return rank_rooms(candidates, check_in, check_out)[:quantity]
@@ -1,52 +1,101 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from models import db, Room, Booking, Agent, RoomMaintenance, RoomCategory, User, Holiday, RateRule, RateAuditLog
+from models import (db, Room, Booking, Agent, RoomMaintenance, RoomCategory, User, Holiday, RateRule, RateAuditLog,
+                    AgentDailyStats,
+                    serialize_bookings, serialize_maintenance, serialize_rate_rules, serialize_audit_logs)
+from availability import availability_index
+from allocator import reservation_locks, pick_rooms
+from assignment import ReassignmentError, apply_reassignment, reassignment_plan
+from conditional import conditional, table_changed
+from database import DATABASE_URL, configure_database, retry_on_lock
+from events import EVENT_BUSY_RETRY_SECONDS, announce_events, event_bus, event_stream, record_booking_event
+from generations import generations
+from migrations import current_version, pending_migrations, upgrade
+from inventory import (INVENTORY_HORIZON_DAYS, category_inventory, maintenance_window, move_maintenance, move_room,
+                       rebuild_inventory, sellable_category)
+from ledger import NightsTaken, claim_nights, sync_nights, release_room, rooms_sold, backfill_room_nights
+from room_board import room_board
+from seed import seed_defaults
+from tape_chart import tape_chart
+from pricing import PricingContext, calculate_booking_price, rate_calendar
+from rollups import (record_booking_status, record_new_bookings, record_read_flag, agent_summaries, agent_summary,
+                     empty_summary, rebuild_agent_stats, dashboard_counters, reconcile_counters)
+from mailer import (queue_booking_notification, queue_confirmation_email, queue_room_change_email,
+                    start_outbox_worker, wake_outbox_worker, drain_outbox)
+from principals import (STREAM_TICKET_SECONDS, principal_cache, resolve_principal, authenticate, issue_stream_ticket,
+                        resolve_stream_ticket)
+from passwords import VerifierBusy
+from pagination import (InvalidCursor, keyset_page, list_response, page_size, stream_rows, wants_page,
+                        wants_stream)
 from datetime import datetime, timedelta
 import uuid
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import click
 import os
 import json
 import jwt
 from functools import wraps
 from werkzeug.utils import secure_filename
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hotel.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'uploads/receipts'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'hotel-booking-secret-key-change-in-production')
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+DEFAULT_CONFIG = {
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'UPLOAD_FOLDER': 'uploads/receipts',
+    'MAX_CONTENT_LENGTH': 16 * 1024 * 1024,  # 16MB max file size
+    'SECRET_KEY': os.getenv('SECRET_KEY', 'hotel-booking-secret-key-change-in-production')
+}
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
-CORS(app)
-
-# Create upload folder if it doesn't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+AVAILABILITY_HORIZON_DAYS = int(os.getenv('AVAILABILITY_HORIZON_DAYS', 90))
+MAX_AVAILABILITY_HORIZON_DAYS = 730
+MAX_PRICE_QUOTES = int(os.getenv('MAX_PRICE_QUOTES', 200))
 
-db.init_app(app)
+# Every endpoint and CLI command lives on this blueprint; create_app() builds the application
+api = Blueprint('api', __name__, cli_group=None)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def sync_booking_caches(*bookings):
+    """Propagate committed booking changes to the in-memory indexes."""
+    if len(bookings) > 1:
+        # Refresh the rows expired by the commit with one query per 500 rather than one each
+        ids = [db.inspect(b).identity[0] for b in bookings]
+        for i in range(0, len(ids), 500):
+            Booking.query.filter(Booking.id.in_(ids[i:i + 500])).all()
+    for booking in bookings:
+        availability_index.sync_booking(booking)
+    room_board.sync_bookings(*bookings)
+
+def sync_room_caches(room):
+    """Propagate a committed room change (including its maintenance status)."""
+    availability_index.sync_room(room)
+    room_board.refresh_rooms(room.id)
+
 # ==================== AUTH DECORATOR ====================
 
-def require_auth(roles=None):
+def bearer_token():
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
+def require_auth(roles=None, stream_ticket=False):
+    """`stream_ticket` also accepts ?ticket= from POST /api/events/ticket, for EventSource (no headers)."""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            token = None
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
+            token = bearer_token()
+            ticket = request.args.get('ticket') if stream_ticket and not token else None
 
-            if not token:
+            if not token and not ticket:
                 return jsonify({'error': 'Authentication required'}), 401
 
             try:
-                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-                current_user = User.query.get(data['user_id'])
-                if not current_user or current_user.status != 'active':
+                if ticket:
+                    current_user = resolve_stream_ticket(ticket, current_app.config['SECRET_KEY'])
+                else:
+                    current_user = resolve_principal(token, current_app.config['SECRET_KEY'])
+                if not current_user or current_user.kind != 'user' or current_user.status != 'active':
                     return jsonify({'error': 'Invalid or inactive user'}), 401
                 if roles and current_user.role not in roles:
                     return jsonify({'error': 'Insufficient permissions'}), 403
@@ -60,154 +109,46 @@ def require_auth(roles=None):
         return decorated_function
     return decorator
 
-# ==================== EMAIL HELPERS ====================
+def require_agent_auth(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = bearer_token()
 
-def send_email_notification(booking):
-    try:
-        email = os.getenv('EMAIL_ADDRESS', 'your-email@gmail.com')
-        password = os.getenv('EMAIL_PASSWORD', 'your-password')
-
-        if email == 'your-email@gmail.com' or password == 'your-password':
-            print("Email notification skipped - credentials not configured")
-            return
-
-        msg = MIMEMultipart()
-        msg['From'] = email
-        msg['To'] = email
-        msg['Subject'] = f'New Booking - {booking.customer_name}'
-
-        body = f"""
-        New booking received:
-
-        Customer: {booking.customer_name}
-        Email: {booking.customer_email}
-        Phone: {booking.customer_phone}
-        Room: {booking.room.room_number} ({booking.room.room_type})
-        Check-in: {booking.check_in}
-        Check-out: {booking.check_out}
-        Total: RM{booking.total_price}
-        """
-
-        msg.attach(MIMEText(body, 'plain'))
-
-        server = smtplib.SMTP('smtp.gmail.com', 587, timeout=5)
-        server.starttls()
-        server.login(email, password)
-        server.send_message(msg)
-        server.quit()
-        print("Email sent successfully")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-
-def send_confirmation_email(booking):
-    try:
-        email = os.getenv('EMAIL_ADDRESS', 'your-email@gmail.com')
-        password = os.getenv('EMAIL_PASSWORD', 'your-password')
-
-        if email == 'your-email@gmail.com' or password == 'your-password':
-            print("Confirmation email skipped - credentials not configured")
-            return
-
-        msg = MIMEMultipart()
-        msg['From'] = email
-        msg['To'] = booking.customer_email
-        msg['Subject'] = f'Booking Confirmed - {booking.room.room_type}'
-
-        body = f"""
-        Dear {booking.customer_name},
-
-        Your booking has been confirmed!
-
-        Booking Details:
-        Booking ID: {booking.id}
-        Room: {booking.room.room_number} ({booking.room.room_type})
-        Check-in: {booking.check_in}
-        Check-out: {booking.check_out}
-        Total Amount: RM{booking.total_price}
-
-        Thank you for choosing our hotel. We look forward to welcoming you!
-
-        Best regards,
-        Hotel Management
-        """
-
-        msg.attach(MIMEText(body, 'plain'))
-
-        server = smtplib.SMTP('smtp.gmail.com', 587, timeout=5)
-        server.starttls()
-        server.login(email, password)
-        server.send_message(msg)
-        server.quit()
-        print("Confirmation email sent successfully")
-    except Exception as e:
-        print(f"Failed to send confirmation email: {e}")
-
-# ==================== PRICE CALCULATION ====================
-
-def calculate_booking_price(room_price, room_type, check_in, check_out):
-    """Calculate booking price with holiday multipliers and rate rules."""
-    total = 0.0
-    nightly_breakdown = []
-    current_date = check_in
-
-    while current_date < check_out:
-        nightly_rate = room_price
-        multiplier = 1.0
-        notes = []
-
-        # Check for blackout dates
-        holiday = Holiday.query.filter_by(date=current_date).first()
-        if holiday and holiday.is_blackout:
-            return None, None, f"Blackout date: {holiday.name} on {current_date.strftime('%Y-%m-%d')}"
-
-        # Check for rate rules (highest multiplier wins)
-        active_rules = RateRule.query.filter(
-            RateRule.is_active == True,
-            RateRule.start_date <= current_date,
-            RateRule.end_date >= current_date,
-            db.or_(
-                RateRule.room_category.is_(None),
-                RateRule.room_category == '',
-                RateRule.room_category == room_type
-            )
-        ).all()
-
-        if active_rules:
-            best_rule = max(active_rules, key=lambda r: r.rate_multiplier)
-            multiplier = best_rule.rate_multiplier
-            notes.append(f"Rate rule: {best_rule.name} (x{best_rule.rate_multiplier})")
-
-        # Holiday multiplier stacks on top
-        if holiday:
-            multiplier *= holiday.rate_multiplier
-            notes.append(f"Holiday: {holiday.name} (x{holiday.rate_multiplier})")
-
-        nightly_total = round(nightly_rate * multiplier, 2)
-        total += nightly_total
-
-        nightly_breakdown.append({
-            'date': current_date.strftime('%Y-%m-%d'),
-            'base_rate': room_price,
-            'multiplier': round(multiplier, 2),
-            'total': nightly_total,
-            'notes': ', '.join(notes) if notes else 'Standard rate'
-        })
+        if not token:
+            return jsonify({'error': 'Authentication required'}), 401
 
-        current_date += timedelta(days=1)
+        try:
+            current_agent = resolve_principal(token, current_app.config['SECRET_KEY'])
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Invalid token'}), 401
 
-    return round(total, 2), nightly_breakdown, None
+        if current_agent is None:
+            return jsonify({'error': 'Agent not found'}), 404
+        if current_agent.kind != 'agent':
+            return jsonify({'error': 'Agent authentication required'}), 401
+        request.current_agent = current_agent
+
+        return f(*args, **kwargs)
+    return decorated_function
 
 # ==================== AUTH ENDPOINTS ====================
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     data = request.json
     email = data.get('email')
     password = data.get('password', '')
 
-    # Try User table first (admin, employee, customer)
-    user = User.query.filter_by(email=email).first()
-    if user and user.check_password(password):
+    # One lookup across users (admin, employee, customer) and agents
+    try:
+        principal = authenticate(email, password)
+    except VerifierBusy:
+        return jsonify({'error': 'Too many login attempts in progress, please retry'}), 503
+
+    if isinstance(principal, User):
+        user = principal
         if user.status != 'active':
             return jsonify({'error': 'Account is inactive'}), 401
 
@@ -215,16 +156,15 @@ def login():
             'user_id': user.id,
             'role': user.role,
             'exp': datetime.utcnow() + timedelta(hours=24)
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        }, current_app.config['SECRET_KEY'], algorithm='HS256')
 
         return jsonify({
             'token': token,
             'user': user.to_dict()
         })
 
-    # Try Agent table
-    agent = Agent.query.filter_by(email=email).first()
-    if agent and agent.check_password(password):
+    if isinstance(principal, Agent):
+        agent = principal
         if agent.status != 'approved':
             return jsonify({'error': 'Agent account is not approved yet'}), 401
 
@@ -232,7 +172,7 @@ def login():
             'agent_id': agent.id,
             'role': 'agent',
             'exp': datetime.utcnow() + timedelta(hours=24)
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        }, current_app.config['SECRET_KEY'], algorithm='HS256')
 
         return jsonify({
             'token': token,
@@ -241,7 +181,7 @@ def login():
 
     return jsonify({'error': 'Invalid email or password'}), 401
 
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.json
 
@@ -265,24 +205,27 @@ def register():
         'user_id': user.id,
         'role': user.role,
         'exp': datetime.utcnow() + timedelta(hours=24)
-    }, app.config['SECRET_KEY'], algorithm='HS256')
+    }, current_app.config['SECRET_KEY'], algorithm='HS256')
 
     return jsonify({
         'token': token,
         'user': user.to_dict()
     }), 201
 
-@app.route('/api/auth/me', methods=['GET'])
+@api.route('/api/auth/me', methods=['GET'])
 @require_auth()
 def get_current_user():
     return jsonify(request.current_user.to_dict())
 
-@app.route('/api/auth/agent-login', methods=['POST'])
+@api.route('/api/auth/agent-login', methods=['POST'])
 def agent_login():
     data = request.json
-    agent = Agent.query.filter_by(email=data.get('email')).first()
+    try:
+        agent = authenticate(data.get('email'), data.get('password', ''), kinds=('agent',))
+    except VerifierBusy:
+        return jsonify({'error': 'Too many login attempts in progress, please retry'}), 503
 
-    if not agent or not agent.check_password(data.get('password', '')):
+    if not agent:
         return jsonify({'error': 'Invalid email or password'}), 401
 
     if agent.status != 'approved':
@@ -292,35 +235,35 @@ def agent_login():
         'agent_id': agent.id,
         'role': 'agent',
         'exp': datetime.utcnow() + timedelta(hours=24)
-    }, app.config['SECRET_KEY'], algorithm='HS256')
+    }, current_app.config['SECRET_KEY'], algorithm='HS256')
 
     return jsonify({
         'token': token,
         'user': {**agent.to_dict(), 'role': 'agent'}
     })
 
-@app.route('/api/auth/change-password', methods=['POST'])
+@api.route('/api/auth/change-password', methods=['POST'])
 @require_auth()
 def change_password():
     data = request.json
-    user = request.current_user
+    user = User.query.get(request.current_user.id)
 
     if not user.check_password(data.get('current_password', '')):
         return jsonify({'error': 'Current password is incorrect'}), 400
 
     user.set_password(data['new_password'])
     db.session.commit()
+    principal_cache.invalidate('user', user.id)
     return jsonify({'message': 'Password changed successfully'})
 
 # ==================== USER MANAGEMENT (admin only) ====================
 
-@app.route('/api/users', methods=['GET'])
+@api.route('/api/users', methods=['GET'])
 @require_auth(roles=['admin'])
 def get_users():
-    users = User.query.order_by(User.created_at.desc()).all()
-    return jsonify([u.to_dict() for u in users])
+    return list_response(User.query, (User.created_at, User.id), lambda users: [u.to_dict() for u in users])
 
-@app.route('/api/users', methods=['POST'])
+@api.route('/api/users', methods=['POST'])
 @require_auth(roles=['admin'])
 def create_user():
     data = request.json
@@ -339,7 +282,7 @@ def create_user():
     db.session.commit()
     return jsonify(user.to_dict()), 201
 
-@app.route('/api/users/<int:user_id>', methods=['PUT'])
+@api.route('/api/users/<int:user_id>', methods=['PUT'])
 @require_auth(roles=['admin'])
 def update_user(user_id):
     user = User.query.get_or_404(user_id)
@@ -360,9 +303,12 @@ def update_user(user_id):
         user.set_password(data['password'])
 
     db.session.commit()
+    principal_cache.invalidate('user', user_id)
+    if 'name' in data:
+        table_changed('rate_rules')  # rate rules are listed with their creator's name
     return jsonify(user.to_dict())
 
-@app.route('/api/users/<int:user_id>', methods=['DELETE'])
+@api.route('/api/users/<int:user_id>', methods=['DELETE'])
 @require_auth(roles=['admin'])
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
@@ -370,16 +316,19 @@ def delete_user(user_id):
         return jsonify({'error': 'Cannot delete your own account'}), 400
     db.session.delete(user)
     db.session.commit()
+    principal_cache.invalidate('user', user_id)
+    table_changed('rate_rules')
     return jsonify({'message': 'User deleted successfully'})
 
 # ==================== CATEGORY ENDPOINTS ====================
 
-@app.route('/api/categories', methods=['GET'])
+@api.route('/api/categories', methods=['GET'])
+@conditional('room_categories', public=True)
 def get_categories():
     categories = RoomCategory.query.order_by(RoomCategory.name).all()
     return jsonify([c.to_dict() for c in categories])
 
-@app.route('/api/categories', methods=['POST'])
+@api.route('/api/categories', methods=['POST'])
 @require_auth(roles=['admin'])
 def create_category():
     data = request.json
@@ -394,9 +343,10 @@ def create_category():
     )
     db.session.add(category)
     db.session.commit()
+    table_changed('room_categories')
     return jsonify(category.to_dict()), 201
 
-@app.route('/api/categories/<int:category_id>', methods=['PUT'])
+@api.route('/api/categories/<int:category_id>', methods=['PUT'])
 @require_auth(roles=['admin'])
 def update_category(category_id):
     category = RoomCategory.query.get_or_404(category_id)
@@ -415,9 +365,10 @@ def update_category(category_id):
         category.capacity = data['capacity']
 
     db.session.commit()
+    table_changed('room_categories')
     return jsonify(category.to_dict())
 
-@app.route('/api/categories/<int:category_id>', methods=['DELETE'])
+@api.route('/api/categories/<int:category_id>', methods=['DELETE'])
 @require_auth(roles=['admin'])
 def delete_category(category_id):
     category = RoomCategory.query.get_or_404(category_id)
@@ -425,17 +376,19 @@ def delete_category(category_id):
         return jsonify({'error': 'Cannot delete category with rooms assigned to it'}), 400
     db.session.delete(category)
     db.session.commit()
+    table_changed('room_categories')
     return jsonify({'message': 'Category deleted successfully'})
 
 # ==================== HOLIDAY ENDPOINTS ====================
 
-@app.route('/api/holidays', methods=['GET'])
+@api.route('/api/holidays', methods=['GET'])
 @require_auth()
+@conditional('holidays')
 def get_holidays():
     holidays = Holiday.query.order_by(Holiday.date).all()
     return jsonify([h.to_dict() for h in holidays])
 
-@app.route('/api/holidays', methods=['POST'])
+@api.route('/api/holidays', methods=['POST'])
 @require_auth(roles=['admin'])
 def create_holiday():
     data = request.json
@@ -452,13 +405,16 @@ def create_holiday():
     )
     db.session.add(holiday)
     db.session.commit()
+    table_changed('holidays')
+    rate_calendar.refresh(holiday.date, holiday.date)
     return jsonify(holiday.to_dict()), 201
 
-@app.route('/api/holidays/<int:holiday_id>', methods=['PUT'])
+@api.route('/api/holidays/<int:holiday_id>', methods=['PUT'])
 @require_auth(roles=['admin'])
 def update_holiday(holiday_id):
     holiday = Holiday.query.get_or_404(holiday_id)
     data = request.json
+    old_date = holiday.date
 
     if 'name' in data:
         holiday.name = data['name']
@@ -474,25 +430,32 @@ def update_holiday(holiday_id):
         holiday.is_blackout = data['is_blackout']
 
     db.session.commit()
+    table_changed('holidays')
+    rate_calendar.refresh(old_date, old_date)
+    rate_calendar.refresh(holiday.date, holiday.date)
     return jsonify(holiday.to_dict())
 
-@app.route('/api/holidays/<int:holiday_id>', methods=['DELETE'])
+@api.route('/api/holidays/<int:holiday_id>', methods=['DELETE'])
 @require_auth(roles=['admin'])
 def delete_holiday(holiday_id):
     holiday = Holiday.query.get_or_404(holiday_id)
+    holiday_date = holiday.date
     db.session.delete(holiday)
     db.session.commit()
+    table_changed('holidays')
+    rate_calendar.refresh(holiday_date, holiday_date)
     return jsonify({'message': 'Holiday deleted successfully'})
 
 # ==================== RATE RULE ENDPOINTS ====================
 
-@app.route('/api/rates', methods=['GET'])
+@api.route('/api/rates', methods=['GET'])
 @require_auth()
+@conditional('rate_rules')
 def get_rates():
     rates = RateRule.query.order_by(RateRule.start_date.desc()).all()
-    return jsonify([r.to_dict() for r in rates])
+    return jsonify(serialize_rate_rules(rates))
 
-@app.route('/api/rates', methods=['POST'])
+@api.route('/api/rates', methods=['POST'])
 @require_auth(roles=['admin'])
 def create_rate():
     data = request.json
@@ -520,15 +483,18 @@ def create_rate():
     )
     db.session.add(log)
     db.session.commit()
+    table_changed('rate_rules')
+    rate_calendar.refresh(rate.start_date, rate.end_date, rate.room_category)
 
     return jsonify(rate.to_dict()), 201
 
-@app.route('/api/rates/<int:rate_id>', methods=['PUT'])
+@api.route('/api/rates/<int:rate_id>', methods=['PUT'])
 @require_auth(roles=['admin'])
 def update_rate(rate_id):
     rate = RateRule.query.get_or_404(rate_id)
     data = request.json
     old_values = rate.to_dict()
+    old_span = (rate.start_date, rate.end_date, rate.room_category)
 
     if 'name' in data:
         rate.name = data['name']
@@ -554,14 +520,18 @@ def update_rate(rate_id):
     )
     db.session.add(log)
     db.session.commit()
+    table_changed('rate_rules')
+    rate_calendar.refresh(*old_span)
+    rate_calendar.refresh(rate.start_date, rate.end_date, rate.room_category)
 
     return jsonify(rate.to_dict())
 
-@app.route('/api/rates/<int:rate_id>', methods=['DELETE'])
+@api.route('/api/rates/<int:rate_id>', methods=['DELETE'])
 @require_auth(roles=['admin'])
 def delete_rate(rate_id):
     rate = RateRule.query.get_or_404(rate_id)
     old_values = rate.to_dict()
+    old_span = (rate.start_date, rate.end_date, rate.room_category)
 
     log = RateAuditLog(
         rate_rule_id=rate.id,
@@ -572,18 +542,20 @@ def delete_rate(rate_id):
     db.session.add(log)
     db.session.delete(rate)
     db.session.commit()
+    table_changed('rate_rules')
+    rate_calendar.refresh(*old_span)
 
     return jsonify({'message': 'Rate rule deleted successfully'})
 
-@app.route('/api/rates/<int:rate_id>/history', methods=['GET'])
+@api.route('/api/rates/<int:rate_id>/history', methods=['GET'])
 @require_auth()
 def get_rate_history(rate_id):
     logs = RateAuditLog.query.filter_by(rate_rule_id=rate_id).order_by(RateAuditLog.changed_at.desc()).all()
-    return jsonify([l.to_dict() for l in logs])
+    return jsonify(serialize_audit_logs(logs))
 
 # ==================== PRICE CALCULATION ENDPOINT ====================
 
-@app.route('/api/bookings/calculate-price', methods=['POST'])
+@api.route('/api/bookings/calculate-price', methods=['POST'])
 def calculate_price():
     data = request.json
     check_in = datetime.strptime(data['check_in'], '%Y-%m-%d').date()
@@ -602,14 +574,93 @@ def calculate_price():
         'nights': len(breakdown)
     })
 
+@api.route('/api/bookings/calculate-price/batch', methods=['POST'])
+def calculate_price_batch():
+    """Quote many (room_type or room_id, check_in, check_out) combinations in one call."""
+    data = request.get_json(silent=True)
+    items = data.get('quotes', []) if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return jsonify({'error': 'quotes must be a list'}), 400
+    if not items:
+        return jsonify({'error': 'No quotes requested'}), 400
+    if len(items) > MAX_PRICE_QUOTES:
+        return jsonify({'error': f'At most {MAX_PRICE_QUOTES} quotes per request'}), 400
+
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('room_id') or 0, int) \
+                or not isinstance(item.get('room_type') or '', str):
+            parsed.append('Invalid quote: expected room_id or room_type, check_in and check_out')
+            continue
+        try:
+            check_in = datetime.strptime(item['check_in'], '%Y-%m-%d').date()
+            check_out = datetime.strptime(item['check_out'], '%Y-%m-%d').date()
+        except (KeyError, TypeError, ValueError):
+            parsed.append('Invalid date format. Use YYYY-MM-DD')
+            continue
+        if check_in >= check_out:
+            parsed.append('Check-out date must be after check-in date')
+        elif (check_out - check_in).days > MAX_AVAILABILITY_HORIZON_DAYS:
+            parsed.append(f'Stays are limited to {MAX_AVAILABILITY_HORIZON_DAYS} nights')
+        else:
+            parsed.append((check_in, check_out))
+    items = [item if isinstance(item, dict) else {} for item in items]
+
+    # Resolve every requested room and room type with at most two queries
+    valid = [item for item, stay in zip(items, parsed) if isinstance(stay, tuple)]
+    room_ids = {item['room_id'] for item in valid if item.get('room_id')}
+    rooms_by_id = {r.id: r for r in Room.query.filter(Room.id.in_(room_ids))} if room_ids else {}
+    room_types = {item['room_type'] for item in valid if item.get('room_type') and not item.get('room_id')}
+    first_room_of_type = {}
+    if room_types:
+        for room in Room.query.filter(Room.room_type.in_(room_types)).order_by(Room.id):
+            first_room_of_type.setdefault(room.room_type, room)
+
+    # One shared context for whatever falls outside the rate calendar
+    dates = [d for d in parsed if isinstance(d, tuple)]
+    pricing = PricingContext(min(d[0] for d in dates), max(d[1] for d in dates)) if dates else None
+
+    results = []
+    for item, stay in zip(items, parsed):
+        result = {k: item.get(k) for k in ('room_id', 'room_type', 'check_in', 'check_out')}
+        if isinstance(stay, str):
+            result['error'] = stay
+            results.append(result)
+            continue
+        check_in, check_out = stay
+
+        room = rooms_by_id.get(item['room_id']) if item.get('room_id') else first_room_of_type.get(item.get('room_type'))
+        if not room:
+            result['error'] = 'Room not found' if item.get('room_id') else 'Room type not found'
+            results.append(result)
+            continue
+
+        total, breakdown, error = calculate_booking_price(
+            room.price_per_night, room.room_type, check_in, check_out, pricing
+        )
+        if error:
+            result['error'] = error
+        else:
+            result.update({
+                'room_type': room.room_type,
+                'room_price': room.price_per_night,
+                'total_price': total,
+                'breakdown': breakdown,
+                'nights': len(breakdown)
+            })
+        results.append(result)
+
+    return jsonify({'quotes': results})
+
 # ==================== ROOM ENDPOINTS ====================
 
-@app.route('/api/rooms', methods=['GET'])
+@api.route('/api/rooms', methods=['GET'])
+@conditional('rooms', public=True)
 def get_rooms():
     rooms = Room.query.all()
     return jsonify([room.to_dict() for room in rooms])
 
-@app.route('/api/rooms/available', methods=['GET'])
+@api.route('/api/rooms/available', methods=['GET'])
 def get_available_rooms():
     check_in_str = request.args.get('check_in')
     check_out_str = request.args.get('check_out')
@@ -637,34 +688,28 @@ def get_available_rooms():
 
     all_rooms = query.all()
 
-    available_rooms = []
-    for room in all_rooms:
-        conflicting_bookings = Booking.query.filter(
-            Booking.room_id == room.id,
-            Booking.status != 'cancelled',
-            Booking.check_in < check_out,
-            Booking.check_out > check_in
-        ).first()
-
-        if not conflicting_bookings:
-            available_rooms.append(room)
+    free_room_ids = set(availability_index.free_rooms(check_in, check_out))
+    available_rooms = [room for room in all_rooms if room.id in free_room_ids]
 
     return jsonify([room.to_dict() for room in available_rooms])
 
-@app.route('/api/rooms/category-availability', methods=['GET'])
+@api.route('/api/rooms/category-availability', methods=['GET'])
 def get_category_availability():
     """Return available room count per category for given dates, plus booked date ranges."""
     check_in_str = request.args.get('check_in')
     check_out_str = request.args.get('check_out')
+    horizon = min(max(request.args.get('horizon', AVAILABILITY_HORIZON_DAYS, type=int), 1), MAX_AVAILABILITY_HORIZON_DAYS)
 
     categories = RoomCategory.query.all()
+    operational_rooms = Room.query.filter(Room.maintenance_status == 'operational').order_by(Room.id).all()
+    rooms_by_type = {}
+    for room in operational_rooms:
+        rooms_by_type.setdefault(room.room_type, []).append(room)
 
     if not check_in_str or not check_out_str:
         result = []
         for cat in categories:
-            total = Room.query.filter_by(room_type=cat.name).filter(
-                Room.maintenance_status == 'operational'
-            ).count()
+            total = len(rooms_by_type.get(cat.name, []))
             result.append({
                 'category': cat.name,
                 'total_rooms': total,
@@ -679,58 +724,41 @@ def get_category_availability():
     except ValueError:
         return jsonify({'error': 'Invalid date format'}), 400
 
+    stay_days = (check_out - check_in).days
+    if stay_days <= 0 or stay_days > MAX_AVAILABILITY_HORIZON_DAYS:
+        return jsonify({'error': f'check_out must be after check_in and at most {MAX_AVAILABILITY_HORIZON_DAYS} days later'}), 400
+
+    # Free rooms for the stay come from one room x night occupancy matrix
+    # (bookings and maintenance); fully booked nights over the horizon from
+    # the category inventory.
+    today = datetime.now().date()
+    occupancy = availability_index.occupancy([room.id for room in operational_rooms], check_in, stay_days)
+    inventory = category_inventory(today, today + timedelta(days=horizon))
+
+    row_of = {room.id: row for row, room in enumerate(operational_rooms)}
+
     result = []
     for cat in categories:
-        rooms_of_type = Room.query.filter_by(room_type=cat.name).filter(
-            Room.maintenance_status == 'operational'
-        ).all()
+        rooms_of_type = rooms_by_type.get(cat.name, [])
+        cat_occupancy = occupancy[[row_of[room.id] for room in rooms_of_type]]
 
-        available_count = 0
-        all_booked_ranges = []
+        available_count = int((~cat_occupancy.any(axis=1)).sum())
 
+        fully_booked_dates = [
+            night.isoformat() for night, sellable, sold in inventory.get(cat.name, [])
+            if rooms_of_type and sold >= sellable
+        ]
+
+        all_booked_ranges = []
         for room in rooms_of_type:
-            conflicting = Booking.query.filter(
-                Booking.room_id == room.id,
-                Booking.status != 'cancelled',
-                Booking.check_in < check_out,
-                Booking.check_out > check_in
-            ).first()
-
-            if not conflicting:
-                available_count += 1
-
-            # Collect all booked date ranges for this category (next 90 days)
-            bookings = Booking.query.filter(
-                Booking.room_id == room.id,
-                Booking.status != 'cancelled',
-                Booking.check_out > datetime.now().date()
-            ).all()
-            for b in bookings:
+            for booked_in, booked_out in availability_index.bookings_ending_after(room.id, today):
                 all_booked_ranges.append({
                     'room_id': room.id,
                     'room_number': room.room_number,
-                    'check_in': b.check_in.isoformat(),
-                    'check_out': b.check_out.isoformat()
+                    'check_in': booked_in.isoformat(),
+                    'check_out': booked_out.isoformat()
                 })
 
-        # Compute dates where ALL rooms are booked (fully unavailable)
-        fully_booked_dates = []
-        scan_start = datetime.now().date()
-        scan_end = scan_start + timedelta(days=90)
-        current = scan_start
-        while current < scan_end:
-            booked_count = 0
-            for room in rooms_of_type:
-                is_booked = any(
-                    datetime.strptime(br['check_in'], '%Y-%m-%d').date() <= current < datetime.strptime(br['check_out'], '%Y-%m-%d').date()
-                    for br in all_booked_ranges if br['room_id'] == room.id
-                )
-                if is_booked:
-                    booked_count += 1
-            if booked_count >= len(rooms_of_type) and len(rooms_of_type) > 0:
-                fully_booked_dates.append(current.isoformat())
-            current += timedelta(days=1)
-
         result.append({
             'category': cat.name,
             'total_rooms': len(rooms_of_type),
@@ -741,24 +769,18 @@ def get_category_availability():
 
     return jsonify(result)
 
-@app.route('/api/rooms/<int:room_id>/availability', methods=['POST'])
+@api.route('/api/rooms/<int:room_id>/availability', methods=['POST'])
 def check_availability(room_id):
     data = request.json
     check_in = datetime.strptime(data['check_in'], '%Y-%m-%d').date()
     check_out = datetime.strptime(data['check_out'], '%Y-%m-%d').date()
 
-    conflicting_bookings = Booking.query.filter(
-        Booking.room_id == room_id,
-        Booking.status != 'cancelled',
-        Booking.check_in < check_out,
-        Booking.check_out > check_in
-    ).all()
-
-    return jsonify({'available': len(conflicting_bookings) == 0})
+    return jsonify({'available': availability_index.is_free(room_id, check_in, check_out)})
 
 # ==================== BOOKING ENDPOINTS ====================
 
-@app.route('/api/bookings', methods=['POST'])
+@api.route('/api/bookings', methods=['POST'])
+@retry_on_lock
 def create_booking():
     data = request.json
 
@@ -766,48 +788,12 @@ def create_booking():
     check_out = datetime.strptime(data['check_out'], '%Y-%m-%d').date()
 
     # Handle booking by room type (auto-assignment)
-    if 'room_type' in data and 'room_id' not in data:
+    auto_assign = 'room_type' in data and 'room_id' not in data
+    if auto_assign:
         room_type = data['room_type']
 
-        rooms_of_type = Room.query.filter_by(room_type=room_type).all()
-
-        if not rooms_of_type:
+        if not availability_index.room_ids(room_type):
             return jsonify({'error': 'Room type not found'}), 404
-
-        available_room = None
-        for room in rooms_of_type:
-            if room.maintenance_status == 'maintenance' or room.maintenance_status == 'closed':
-                continue
-
-            conflicting_maintenance = RoomMaintenance.query.filter(
-                RoomMaintenance.room_id == room.id,
-                RoomMaintenance.status == 'ongoing',
-                RoomMaintenance.start_date < check_out,
-                db.or_(
-                    RoomMaintenance.end_date.is_(None),
-                    RoomMaintenance.end_date > check_in
-                )
-            ).first()
-
-            if conflicting_maintenance:
-                continue
-
-            conflicting_bookings = Booking.query.filter(
-                Booking.room_id == room.id,
-                Booking.status != 'cancelled',
-                Booking.check_in < check_out,
-                Booking.check_out > check_in
-            ).first()
-
-            if not conflicting_bookings:
-                available_room = room
-                break
-
-        if not available_room:
-            return jsonify({'error': 'No rooms of this type available for selected dates'}), 400
-
-        room_id = available_room.id
-        room_for_price = available_room
     else:
         room_id = data.get('room_id')
 
@@ -818,44 +804,7 @@ def create_booking():
         if not room:
             return jsonify({'error': 'Room not found'}), 404
 
-        if room.maintenance_status == 'maintenance' or room.maintenance_status == 'closed':
-            return jsonify({'error': 'Room is currently in maintenance and cannot be booked'}), 400
-
-        conflicting_maintenance = RoomMaintenance.query.filter(
-            RoomMaintenance.room_id == room_id,
-            RoomMaintenance.status == 'ongoing',
-            RoomMaintenance.start_date < check_out,
-            db.or_(
-                RoomMaintenance.end_date.is_(None),
-                RoomMaintenance.end_date > check_in
-            )
-        ).first()
-
-        if conflicting_maintenance:
-            return jsonify({'error': 'Room has scheduled maintenance during selected dates'}), 400
-
-        conflicting_bookings = Booking.query.filter(
-            Booking.room_id == room_id,
-            Booking.status != 'cancelled',
-            Booking.check_in < check_out,
-            Booking.check_out > check_in
-        ).all()
-
-        if conflicting_bookings:
-            return jsonify({'error': 'Room not available for selected dates'}), 400
-
-        room_for_price = room
-
-    # Server-side price calculation
-    total, breakdown, price_error = calculate_booking_price(
-        room_for_price.price_per_night, room_for_price.room_type, check_in, check_out
-    )
-
-    if price_error:
-        return jsonify({'error': price_error}), 400
-
-    # Use server-calculated price, fall back to client price if calculation returns 0
-    final_price = total if total > 0 else data.get('total_price', 0)
+        room_type = room.room_type
 
     # Try to link booking to logged-in customer
     linked_user_id = data.get('user_id')
@@ -863,33 +812,77 @@ def create_booking():
         auth_header = request.headers.get('Authorization')
         if auth_header and auth_header.startswith('Bearer '):
             try:
-                token_data = jwt.decode(auth_header.split(' ')[1], app.config['SECRET_KEY'], algorithms=['HS256'])
+                token_data = jwt.decode(auth_header.split(' ')[1], current_app.config['SECRET_KEY'], algorithms=['HS256'])
                 if 'user_id' in token_data:
                     linked_user_id = token_data['user_id']
             except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
                 pass
 
-    booking = Booking(
-        room_id=room_id,
-        customer_name=data['customer_name'],
-        customer_email=data['customer_email'],
-        customer_phone=data['customer_phone'],
-        check_in=check_in,
-        check_out=check_out,
-        total_price=final_price,
-        status='pending',
-        agent_id=data.get('agent_id'),
-        user_id=linked_user_id
-    )
+    # Check, insert and publish while no other request can claim a room of this type
+    with reservation_locks.hold(room_type):
+        if auto_assign:
+            candidates = pick_rooms(room_type, check_in, check_out, 1)
 
-    db.session.add(booking)
-    db.session.commit()
+            if not candidates:
+                return jsonify({'error': 'No rooms of this type available for selected dates'}), 400
+
+            room_id = candidates[0]
+            room_for_price = Room.query.get(room_id)
+        else:
+            blocked = availability_index.blocked_by(room.id, check_in, check_out)
+            if blocked == 'closed':
+                return jsonify({'error': 'Room is currently in maintenance and cannot be booked'}), 400
+            if blocked == 'maintenance':
+                return jsonify({'error': 'Room has scheduled maintenance during selected dates'}), 400
+            if blocked:
+                return jsonify({'error': 'Room not available for selected dates'}), 400
+
+            room_for_price = room
+
+        # Server-side price calculation
+        total, breakdown, price_error = calculate_booking_price(
+            room_for_price.price_per_night, room_for_price.room_type, check_in, check_out
+        )
+
+        if price_error:
+            return jsonify({'error': price_error}), 400
+
+        # Use server-calculated price, fall back to client price if calculation returns 0
+        final_price = total if total > 0 else data.get('total_price', 0)
+
+        booking = Booking(
+            room_id=room_id,
+            customer_name=data['customer_name'],
+            customer_email=data['customer_email'],
+            customer_phone=data['customer_phone'],
+            check_in=check_in,
+            check_out=check_out,
+            total_price=final_price,
+            status='pending',
+            agent_id=data.get('agent_id'),
+            user_id=linked_user_id,
+            room_pinned=not auto_assign  # the guest chose this room
+        )
 
-    send_email_notification(booking)
+        db.session.add(booking)
+        db.session.flush()
+        try:
+            claim_nights(booking)
+        except NightsTaken:
+            db.session.rollback()
+            return jsonify({'error': 'Room not available for selected dates'}), 400
+        record_booking_status(booking)
+        queue_booking_notification([booking])
+        record_booking_event('booking-created', booking)
+        db.session.commit()
+        sync_booking_caches(booking)
+    wake_outbox_worker()
+    announce_events()
 
     return jsonify(booking.to_dict()), 201
 
-@app.route('/api/bookings/multi', methods=['POST'])
+@api.route('/api/bookings/multi', methods=['POST'])
+@retry_on_lock
 def create_multi_booking():
     data = request.json
 
@@ -902,298 +895,381 @@ def create_multi_booking():
     global_check_out_str = data.get('check_out')
 
     booking_group_id = str(uuid.uuid4())
-    created_bookings = []
+    new_rows = []
+    assigned = {}  # room_id -> Room, kept loaded for the notification email
+    taken = {}  # room_id -> stays assigned earlier in this request
     total_group_price = 0
 
-    for item in rooms_requested:
-        room_type = item['room_type']
-        quantity = int(item['quantity'])
+    with reservation_locks.hold(*[item['room_type'] for item in rooms_requested]):
+        for item in rooms_requested:
+            room_type = item['room_type']
+            try:
+                quantity = int(item['quantity'])
+            except (KeyError, TypeError, ValueError):
+                quantity = 0
+            if quantity < 1:
+                return jsonify({'error': f'Quantity for {room_type} must be at least 1'}), 400
 
-        # Per-room dates override global dates
-        item_check_in_str = item.get('check_in') or global_check_in_str
-        item_check_out_str = item.get('check_out') or global_check_out_str
+            # Per-room dates override global dates
+            item_check_in_str = item.get('check_in') or global_check_in_str
+            item_check_out_str = item.get('check_out') or global_check_out_str
 
-        if not item_check_in_str or not item_check_out_str:
-            return jsonify({'error': f'Missing dates for {room_type}'}), 400
+            if not item_check_in_str or not item_check_out_str:
+                return jsonify({'error': f'Missing dates for {room_type}'}), 400
 
-        check_in = datetime.strptime(item_check_in_str, '%Y-%m-%d').date()
-        check_out = datetime.strptime(item_check_out_str, '%Y-%m-%d').date()
+            check_in = datetime.strptime(item_check_in_str, '%Y-%m-%d').date()
+            check_out = datetime.strptime(item_check_out_str, '%Y-%m-%d').date()
 
-        if check_in >= check_out:
-            return jsonify({'error': f'Check-out must be after check-in for {room_type}'}), 400
+            if check_in >= check_out:
+                return jsonify({'error': f'Check-out must be after check-in for {room_type}'}), 400
 
-        rooms_of_type = Room.query.filter_by(room_type=room_type).all()
+            assigned_ids = pick_rooms(room_type, check_in, check_out, quantity, taken)
+            assigned_rooms = Room.query.filter(Room.id.in_(assigned_ids)).order_by(Room.id).all() if assigned_ids else []
 
-        assigned_rooms = []
-        for room in rooms_of_type:
-            if len(assigned_rooms) >= quantity:
-                break
-
-            if room.maintenance_status in ('maintenance', 'closed'):
-                continue
-
-            conflicting_maintenance = RoomMaintenance.query.filter(
-                RoomMaintenance.room_id == room.id,
-                RoomMaintenance.status == 'ongoing',
-                RoomMaintenance.start_date < check_out,
-                db.or_(
-                    RoomMaintenance.end_date.is_(None),
-                    RoomMaintenance.end_date > check_in
-                )
-            ).first()
-
-            if conflicting_maintenance:
-                continue
-
-            conflicting_bookings = Booking.query.filter(
-                Booking.room_id == room.id,
-                Booking.status != 'cancelled',
-                Booking.check_in < check_out,
-                Booking.check_out > check_in
-            ).first()
-
-            if not conflicting_bookings:
-                # Check not already assigned in this request
-                if room.id not in [r.id for r in assigned_rooms]:
-                    assigned_rooms.append(room)
-
-        if len(assigned_rooms) < quantity:
-            db.session.rollback()
-            return jsonify({'error': f'Only {len(assigned_rooms)} of {quantity} {room_type} rooms available for {item_check_in_str} to {item_check_out_str}'}), 400
+            if len(assigned_rooms) < quantity:
+                return jsonify({'error': f'Only {len(assigned_rooms)} of {quantity} {room_type} rooms available for {item_check_in_str} to {item_check_out_str}'}), 400
 
-        for room in assigned_rooms:
-            total, breakdown, price_error = calculate_booking_price(
-                room.price_per_night, room.room_type, check_in, check_out
-            )
+            # Rooms of a type usually share a rate, so each distinct rate is priced once
+            pricing = PricingContext(check_in, check_out)
+            quotes = {}
+            for room in assigned_rooms:
+                if room.price_per_night not in quotes:
+                    quotes[room.price_per_night] = calculate_booking_price(
+                        room.price_per_night, room.room_type, check_in, check_out, pricing
+                    )
+                total, breakdown, price_error = quotes[room.price_per_night]
 
-            if price_error:
-                db.session.rollback()
-                return jsonify({'error': price_error}), 400
-
-            booking = Booking(
-                room_id=room.id,
-                customer_name=data['customer_name'],
-                customer_email=data['customer_email'],
-                customer_phone=data['customer_phone'],
-                check_in=check_in,
-                check_out=check_out,
-                total_price=total,
-                status='pending',
-                agent_id=data.get('agent_id'),
-                booking_group=booking_group_id
-            )
-            db.session.add(booking)
-            db.session.flush()
-            created_bookings.append(booking)
-            total_group_price += total
-
-    db.session.commit()
+                if price_error:
+                    return jsonify({'error': price_error}), 400
 
-    for b in created_bookings:
-        send_email_notification(b)
+                new_rows.append({
+                    'room_id': room.id,
+                    'customer_name': data['customer_name'],
+                    'customer_email': data['customer_email'],
+                    'customer_phone': data['customer_phone'],
+                    'check_in': check_in,
+                    'check_out': check_out,
+                    'total_price': total,
+                    'status': 'pending',
+                    'agent_id': data.get('agent_id'),
+                    'booking_group': booking_group_id
+                })
+                assigned[room.id] = room
+                taken.setdefault(room.id, []).append((check_in, check_out))
+                total_group_price += total
+
+        # Nothing touches the database until every item has been assigned and
+        # priced; then all bookings go in with one executemany INSERT and are
+        # read back by their group id.
+        db.session.execute(insert(Booking), new_rows)
+        created_bookings = Booking.query.filter_by(booking_group=booking_group_id).order_by(Booking.id).all()
+        try:
+            claim_nights(*created_bookings)
+        except NightsTaken:
+            db.session.rollback()
+            return jsonify({'error': 'Some of the selected rooms are no longer available, please try again'}), 400
+        record_new_bookings(created_bookings)
+        queue_booking_notification(created_bookings)
+        record_booking_event('booking-created', *created_bookings)
+        db.session.commit()
+        sync_booking_caches(*created_bookings)
+    wake_outbox_worker()
+    announce_events()
 
     return jsonify({
         'booking_group': booking_group_id,
-        'bookings': [b.to_dict() for b in created_bookings],
+        'bookings': serialize_bookings(created_bookings),
         'total_price': round(total_group_price, 2),
         'first_booking_id': created_bookings[0].id if created_bookings else None
     }), 201
 
-@app.route('/api/bookings', methods=['GET'])
+@api.route('/api/bookings', methods=['GET'])
 @require_auth()
 def get_bookings():
-    bookings = Booking.query.order_by(Booking.created_at.desc()).all()
-    return jsonify([booking.to_dict() for booking in bookings])
+    return list_response(Booking.query, (Booking.created_at, Booking.id), serialize_bookings)
 
-@app.route('/api/my-bookings', methods=['GET'])
+@api.route('/api/my-bookings', methods=['GET'])
 @require_auth()
 def get_my_bookings():
     user = request.current_user
     if user.role == 'customer':
-        bookings = Booking.query.filter(
+        query = Booking.query.filter(
             db.or_(Booking.user_id == user.id, Booking.customer_email == user.email)
-        ).order_by(Booking.created_at.desc()).all()
+        )
     else:
-        bookings = Booking.query.order_by(Booking.created_at.desc()).all()
-    return jsonify([b.to_dict() for b in bookings])
+        query = Booking.query
+    return list_response(query, (Booking.created_at, Booking.id), serialize_bookings)
 
-@app.route('/api/agent-bookings', methods=['GET'])
+@api.route('/api/agent-bookings', methods=['GET'])
+@require_agent_auth
 def get_agent_own_bookings():
-    token = None
-    auth_header = request.headers.get('Authorization')
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split(' ')[1]
+    agent = request.current_agent
+    bookings = Booking.query.filter_by(agent_id=agent.id).order_by(Booking.created_at.desc()).all()
 
-    if not token:
-        return jsonify({'error': 'Authentication required'}), 401
-
-    try:
-        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-        if 'agent_id' not in data:
-            return jsonify({'error': 'Agent authentication required'}), 401
-
-        agent = Agent.query.get(data['agent_id'])
-        if not agent:
-            return jsonify({'error': 'Agent not found'}), 404
-
-        bookings = Booking.query.filter_by(agent_id=agent.id).order_by(Booking.created_at.desc()).all()
-
-        total_revenue = sum(b.total_price for b in bookings if b.status == 'confirmed')
-        confirmed = sum(1 for b in bookings if b.status == 'confirmed')
-        pending = sum(1 for b in bookings if b.status == 'pending')
-        cancelled = sum(1 for b in bookings if b.status == 'cancelled')
-
-        return jsonify({
-            'agent': agent.to_dict(),
-            'bookings': [b.to_dict() for b in bookings],
-            'summary': {
-                'total': len(bookings),
-                'confirmed': confirmed,
-                'pending': pending,
-                'cancelled': cancelled,
-                'revenue': total_revenue
-            }
-        })
-    except jwt.ExpiredSignatureError:
-        return jsonify({'error': 'Token expired'}), 401
-    except jwt.InvalidTokenError:
-        return jsonify({'error': 'Invalid token'}), 401
+    return jsonify({
+        'agent': agent.to_dict(),
+        'bookings': serialize_bookings(bookings),
+        'summary': agent_summary(agent.id)
+    })
 
-@app.route('/api/bookings/<int:booking_id>', methods=['GET'])
+@api.route('/api/bookings/<int:booking_id>', methods=['GET'])
 def get_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     return jsonify(booking.to_dict())
 
-@app.route('/api/bookings/<int:booking_id>', methods=['PUT'])
+@api.route('/api/bookings/<int:booking_id>', methods=['PUT'])
 @require_auth()
+@retry_on_lock
 def update_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     data = request.json
 
     old_status = booking.status
+    old_read = booking.read_by_employee
+    old_room_id = booking.room_id
+    current_room = Room.query.get(booking.room_id)
 
-    if 'room_id' in data:
-        new_room = Room.query.get(data['room_id'])
-        if not new_room:
-            return jsonify({'error': 'Room not found'}), 404
-
-        current_room = Room.query.get(booking.room_id)
-        if new_room.room_type != current_room.room_type:
-            return jsonify({'error': 'Can only assign room of same type'}), 400
-
-        conflicting = Booking.query.filter(
-            Booking.room_id == new_room.id,
-            Booking.id != booking_id,
-            Booking.status != 'cancelled',
-            Booking.check_in < booking.check_out,
-            Booking.check_out > booking.check_in
-        ).first()
-
-        if conflicting:
+    # Moving a booking claims room-nights, so it goes through the allocator lock
+    with reservation_locks.hold(current_room.room_type):
+        if 'room_id' in data:
+            new_room = Room.query.get(data['room_id'])
+            if not new_room:
+                return jsonify({'error': 'Room not found'}), 404
+
+            if new_room.room_type != current_room.room_type:
+                return jsonify({'error': 'Can only assign room of same type'}), 400
+
+            blocked = availability_index.blocked_by(new_room.id, booking.check_in, booking.check_out,
+                                                    exclude_booking_id=booking.id)
+            if blocked == 'booked':
+                return jsonify({'error': 'Selected room is not available for these dates'}), 400
+            if blocked:
+                return jsonify({'error': 'Selected room is under maintenance'}), 400
+
+            booking.room_id = new_room.id
+            booking.room_pinned = True
+
+        if 'room_pinned' in data:
+            booking.room_pinned = bool(data['room_pinned'])
+        if 'status' in data:
+            booking.status = data['status']
+            record_booking_status(booking, old_status)
+        if 'read_by_employee' in data:
+            booking.read_by_employee = data['read_by_employee']
+            record_read_flag(booking, old_read)
+        if 'receipt_url' in data:
+            booking.receipt_url = data['receipt_url']
+
+        try:
+            sync_nights(booking, old_status, old_room_id)
+        except NightsTaken:
+            db.session.rollback()
             return jsonify({'error': 'Selected room is not available for these dates'}), 400
 
-        if new_room.maintenance_status in ['maintenance', 'closed']:
-            return jsonify({'error': 'Selected room is under maintenance'}), 400
-
-        booking.room_id = new_room.id
+        if old_status != 'confirmed' and booking.status == 'confirmed':
+            queue_confirmation_email(booking)
+        if booking.status != old_status:
+            record_booking_event('booking-status-changed', booking, previous_status=old_status)
+        if booking.room_id != old_room_id:
+            record_booking_event('booking-room-changed', booking, previous_room_id=old_room_id)
 
-    if 'status' in data:
-        booking.status = data['status']
-    if 'read_by_employee' in data:
-        booking.read_by_employee = data['read_by_employee']
-    if 'receipt_url' in data:
-        booking.receipt_url = data['receipt_url']
+        db.session.commit()
+        sync_booking_caches(booking)
+    wake_outbox_worker()
+    announce_events()
 
-    db.session.commit()
+    return jsonify(booking.to_dict())
 
-    if old_status != 'confirmed' and booking.status == 'confirmed':
-        send_confirmation_email(booking)
+@api.route('/api/rooms/reassign', methods=['POST'])
+@require_auth(roles=['admin'])
+@retry_on_lock
+def reassign_rooms():
+    """Re-pack future unpinned bookings of one room type to reduce fragmented gaps."""
+    data = request.json or {}
+    room_type = data.get('room_type')
+    if not room_type or not availability_index.room_ids(room_type):
+        return jsonify({'error': 'Room type not found'}), 404
+
+    with reservation_locks.hold(room_type):
+        try:
+            moves, report = reassignment_plan(room_type)
+        except ReassignmentError as e:
+            return jsonify({'error': str(e)}), 409
+
+        report['dry_run'] = bool(data.get('dry_run'))
+        report['changes'] = [
+            {'booking_id': booking_id, 'from_room_id': old_room, 'to_room_id': new_room}
+            for booking_id, (old_room, new_room) in moves.items()
+        ]
+        if report['dry_run']:
+            return jsonify(report)
+
+        try:
+            moved = apply_reassignment(moves)
+        except NightsTaken:
+            db.session.rollback()
+            return jsonify({'error': 'Bookings changed during re-optimization, please try again'}), 409
+        old_rooms = {room.id: room for room in Room.query.filter(Room.id.in_({old for old, _ in moves.values()}))}
+        for booking in moved:
+            old_room_id = moves[booking.id][0]
+            record_booking_event('booking-room-changed', booking, previous_room_id=old_room_id)
+            if booking.status == 'confirmed':
+                # The confirmation email named the old room
+                queue_room_change_email(booking, old_rooms[old_room_id])
+        db.session.commit()
+        sync_booking_caches(*moved)
+    if moved:
+        wake_outbox_worker()
+        announce_events()
 
-    return jsonify(booking.to_dict())
+    return jsonify(report)
 
-@app.route('/api/bookings/<int:booking_id>/available-rooms', methods=['GET'])
+@api.route('/api/bookings/<int:booking_id>/available-rooms', methods=['GET'])
 @require_auth()
 def get_available_rooms_for_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     current_room = Room.query.get(booking.room_id)
 
-    rooms_of_type = Room.query.filter_by(room_type=current_room.room_type).all()
+    free_room_ids = availability_index.free_rooms(
+        booking.check_in, booking.check_out, current_room.room_type, exclude_booking_id=booking_id
+    )
+    rooms = Room.query.filter(Room.id.in_(free_room_ids)).order_by(Room.id).all() if free_room_ids else []
 
     available_rooms = []
-    for room in rooms_of_type:
-        if room.maintenance_status in ['maintenance', 'closed']:
-            continue
-
-        conflicting = Booking.query.filter(
-            Booking.room_id == room.id,
-            Booking.id != booking_id,
-            Booking.status != 'cancelled',
-            Booking.check_in < booking.check_out,
-            Booking.check_out > booking.check_in
-        ).first()
-
-        if not conflicting:
-            room_dict = room.to_dict()
-            room_dict['is_current'] = (room.id == booking.room_id)
-            available_rooms.append(room_dict)
+    for room in rooms:
+        room_dict = room.to_dict()
+        room_dict['is_current'] = (room.id == booking.room_id)
+        available_rooms.append(room_dict)
 
     return jsonify(available_rooms)
 
-@app.route('/api/notifications/unread', methods=['GET'])
+@api.route('/api/events/ticket', methods=['POST'])
+@require_auth(roles=['admin', 'employee'])
+def booking_events_ticket():
+    """Short-lived ticket for opening /api/events, so the session token never appears in a URL."""
+    ticket = issue_stream_ticket(request.current_user, current_app.config['SECRET_KEY'])
+    return jsonify({'ticket': ticket, 'expires_in': STREAM_TICKET_SECONDS})
+
+@api.route('/api/events', methods=['GET'])
+@require_auth(roles=['admin', 'employee'], stream_ticket=True)
+def booking_events():
+    """Server-sent booking events: booking-created, booking-status-changed, receipt-uploaded."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    app = current_app._get_current_object()
+    subscription = event_bus.subscribe(app)
+    if subscription is None:
+        response = jsonify({'error': 'Too many open event streams, retry shortly'})
+        response.headers['Retry-After'] = str(EVENT_BUSY_RETRY_SECONDS)
+        return response, 503
+    response = Response(event_stream(app, subscription, last_event_id), mimetype='text/event-stream')
+    response.call_on_close(lambda: event_bus.unsubscribe(subscription))  # also if the stream never starts
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let proxies pass events through unbuffered
+    return response
+
+@api.route('/api/notifications/unread', methods=['GET'])
 def get_unread_notifications():
-    count = Booking.query.filter_by(read_by_employee=False).count()
-    return jsonify({'count': count})
+    return jsonify({'count': int(dashboard_counters()['unread_notifications'])})
 
-@app.route('/api/dashboard/stats', methods=['GET'])
+@api.route('/api/dashboard/stats', methods=['GET'])
 @require_auth()
 def get_dashboard_stats():
-    total_bookings = Booking.query.count()
-    pending_bookings = Booking.query.filter_by(status='pending').count()
-    confirmed_bookings = Booking.query.filter_by(status='confirmed').count()
-    total_revenue = db.session.query(db.func.sum(Booking.total_price)).filter(
-        Booking.status == 'confirmed'
-    ).scalar() or 0
+    counters = dashboard_counters()
 
     return jsonify({
-        'total_bookings': total_bookings,
-        'pending_bookings': pending_bookings,
-        'confirmed_bookings': confirmed_bookings,
-        'total_revenue': total_revenue
+        'total_bookings': int(counters['total_bookings']),
+        'pending_bookings': int(counters['pending_bookings']),
+        'confirmed_bookings': int(counters['confirmed_bookings']),
+        'total_revenue': counters['total_revenue']
     })
 
-@app.route('/api/room-status', methods=['GET'])
+@api.route('/api/occupancy', methods=['GET'])
+@require_auth()
+def get_occupancy():
+    """Rooms sold per night from the room-night ledger."""
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'from and to dates (YYYY-MM-DD) are required'}), 400
+    if end <= start or (end - start).days > MAX_AVAILABILITY_HORIZON_DAYS:
+        return jsonify({'error': f'to must be after from and at most {MAX_AVAILABILITY_HORIZON_DAYS} days later'}), 400
+
+    room_type = request.args.get('room_type')
+    total_rooms = len(availability_index.room_ids(room_type, operational_only=True))
+    sold = rooms_sold(start, end, room_type)
+
+    nights = []
+    day = start
+    while day < end:
+        nights.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'sold': sold.get(day, 0),
+            'available': max(total_rooms - sold.get(day, 0), 0)
+        })
+        day += timedelta(days=1)
+
+    return jsonify({'room_type': room_type, 'total_rooms': total_rooms, 'nights': nights})
+
+@api.route('/api/inventory', methods=['GET'])
+@require_auth()
+def get_inventory():
+    """Sellable, sold and available rooms per category for each night in [from, to)."""
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'from and to dates (YYYY-MM-DD) are required'}), 400
+    if end <= start or (end - start).days > MAX_AVAILABILITY_HORIZON_DAYS:
+        return jsonify({'error': f'to must be after from and at most {MAX_AVAILABILITY_HORIZON_DAYS} days later'}), 400
+
+    inventory = category_inventory(start, end, request.args.get('category'))
+    return jsonify([
+        {
+            'category': category,
+            'nights': [
+                {
+                    'date': night.strftime('%Y-%m-%d'),
+                    'sellable': sellable,
+                    'sold': sold,
+                    'available': max(sellable - sold, 0)
+                }
+                for night, sellable, sold in nights
+            ]
+        }
+        for category, nights in inventory.items()
+    ])
+
+@api.route('/api/room-status', methods=['GET'])
 @require_auth()
 def get_room_status():
-    today = datetime.now().date()
-    rooms = Room.query.all()
+    return Response(room_board.as_json(), mimetype='application/json')
 
-    room_status = []
-    for room in rooms:
-        if room.maintenance_status == 'maintenance':
-            status = 'maintenance'
-            current_booking = None
-        elif room.maintenance_status == 'closed':
-            status = 'closed'
-            current_booking = None
-        else:
-            current_booking = Booking.query.filter(
-                Booking.room_id == room.id,
-                Booking.status != 'cancelled',
-                Booking.check_in <= today,
-                Booking.check_out > today
-            ).first()
-            status = 'occupied' if current_booking else 'available'
-
-        room_status.append({
-            'room': room.to_dict(),
-            'status': status,
-            'current_booking': current_booking.to_dict() if current_booking else None
-        })
+@api.route('/api/tape-chart', methods=['GET'])
+@require_auth()
+def get_tape_chart():
+    """Room x night grid for [from, to), each room's nights run-length encoded.
 
-    return jsonify(room_status)
+    ?details=1 adds the customer name, status and dates of every booking and
+    maintenance record on the chart.
+    """
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'from and to dates (YYYY-MM-DD) are required'}), 400
+    if end <= start or (end - start).days > MAX_AVAILABILITY_HORIZON_DAYS:
+        return jsonify({'error': f'to must be after from and at most {MAX_AVAILABILITY_HORIZON_DAYS} days later'}), 400
+
+    return jsonify(tape_chart(start, end, request.args.get('details') in ('1', 'true')))
 
 # Receipt Upload Endpoint
-@app.route('/api/bookings/<int:booking_id>/upload-receipt', methods=['POST'])
+@api.route('/api/bookings/<int:booking_id>/upload-receipt', methods=['POST'])
 def upload_receipt(booking_id):
     booking = Booking.query.get_or_404(booking_id)
 
@@ -1207,11 +1283,14 @@ def upload_receipt(booking_id):
 
     if file and allowed_file(file.filename):
         filename = secure_filename(f"booking_{booking_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
 
         booking.receipt_url = filepath
+        record_booking_event('receipt-uploaded', booking)
         db.session.commit()
+        sync_booking_caches(booking)
+        announce_events()
 
         return jsonify({'message': 'Receipt uploaded successfully', 'receipt_url': filepath})
 
@@ -1219,12 +1298,12 @@ def upload_receipt(booking_id):
 
 # ==================== AGENT ENDPOINTS ====================
 
-@app.route('/api/agents', methods=['GET'])
+@api.route('/api/agents', methods=['GET'])
 def get_agents():
     agents = Agent.query.order_by(Agent.created_at.desc()).all()
     return jsonify([agent.to_dict() for agent in agents])
 
-@app.route('/api/agents', methods=['POST'])
+@api.route('/api/agents', methods=['POST'])
 def create_agent():
     data = request.json
 
@@ -1246,12 +1325,12 @@ def create_agent():
 
     return jsonify(agent.to_dict()), 201
 
-@app.route('/api/agents/<int:agent_id>', methods=['GET'])
+@api.route('/api/agents/<int:agent_id>', methods=['GET'])
 def get_agent(agent_id):
     agent = Agent.query.get_or_404(agent_id)
     return jsonify(agent.to_dict())
 
-@app.route('/api/agents/<int:agent_id>', methods=['PUT'])
+@api.route('/api/agents/<int:agent_id>', methods=['PUT'])
 @require_auth()
 def update_agent(agent_id):
     agent = Agent.query.get_or_404(agent_id)
@@ -1269,74 +1348,64 @@ def update_agent(agent_id):
         agent.status = data['status']
 
     db.session.commit()
+    principal_cache.invalidate('agent', agent_id)
+    if 'name' in data:
+        room_board.invalidate()  # the board shows agent names
     return jsonify(agent.to_dict())
 
-@app.route('/api/agents/<int:agent_id>', methods=['DELETE'])
+@api.route('/api/agents/<int:agent_id>', methods=['DELETE'])
 @require_auth()
 def delete_agent(agent_id):
     agent = Agent.query.get_or_404(agent_id)
+    AgentDailyStats.query.filter_by(agent_id=agent_id).delete()
     db.session.delete(agent)
     db.session.commit()
+    principal_cache.invalidate('agent', agent_id)
     return jsonify({'message': 'Agent deleted successfully'})
 
 # ==================== AGENT TRANSACTIONS ====================
 
-@app.route('/api/agents/<int:agent_id>/bookings', methods=['GET'])
+@api.route('/api/agents/<int:agent_id>/bookings', methods=['GET'])
 @require_auth()
 def get_agent_bookings(agent_id):
     agent = Agent.query.get_or_404(agent_id)
     bookings = Booking.query.filter_by(agent_id=agent_id).order_by(Booking.created_at.desc()).all()
 
-    total_revenue = sum(b.total_price for b in bookings if b.status == 'confirmed')
-    confirmed = sum(1 for b in bookings if b.status == 'confirmed')
-    pending = sum(1 for b in bookings if b.status == 'pending')
-    cancelled = sum(1 for b in bookings if b.status == 'cancelled')
-
     return jsonify({
         'agent': agent.to_dict(),
-        'bookings': [b.to_dict() for b in bookings],
-        'summary': {
-            'total': len(bookings),
-            'confirmed': confirmed,
-            'pending': pending,
-            'cancelled': cancelled,
-            'revenue': total_revenue
-        }
+        'bookings': serialize_bookings(bookings),
+        'summary': agent_summary(agent_id)
     })
 
-@app.route('/api/agents/transactions-summary', methods=['GET'])
+@api.route('/api/agents/transactions-summary', methods=['GET'])
 @require_auth()
 def get_agent_transactions_summary():
     agents = Agent.query.all()
+    stats = agent_summaries()
     summaries = []
 
     for agent in agents:
-        bookings = Booking.query.filter_by(agent_id=agent.id).all()
-        total_revenue = sum(b.total_price for b in bookings if b.status == 'confirmed')
-        confirmed = sum(1 for b in bookings if b.status == 'confirmed')
-        pending = sum(1 for b in bookings if b.status == 'pending')
-        cancelled = sum(1 for b in bookings if b.status == 'cancelled')
-
+        summary = stats.get(agent.id, empty_summary())
         summaries.append({
             'agent': agent.to_dict(),
-            'total_bookings': len(bookings),
-            'confirmed': confirmed,
-            'pending': pending,
-            'cancelled': cancelled,
-            'revenue': total_revenue
+            'total_bookings': summary['total'],
+            'confirmed': summary['confirmed'],
+            'pending': summary['pending'],
+            'cancelled': summary['cancelled'],
+            'revenue': summary['revenue']
         })
 
     return jsonify(summaries)
 
 # ==================== ROOM MAINTENANCE ENDPOINTS ====================
 
-@app.route('/api/room-maintenance', methods=['GET'])
+@api.route('/api/room-maintenance', methods=['GET'])
 @require_auth()
 def get_room_maintenance():
-    maintenance_records = RoomMaintenance.query.order_by(RoomMaintenance.created_at.desc()).all()
-    return jsonify([record.to_dict() for record in maintenance_records])
+    return list_response(RoomMaintenance.query, (RoomMaintenance.created_at, RoomMaintenance.id),
+                         serialize_maintenance)
 
-@app.route('/api/room-maintenance', methods=['POST'])
+@api.route('/api/room-maintenance', methods=['POST'])
 @require_auth()
 def create_room_maintenance():
     data = request.json
@@ -1353,24 +1422,35 @@ def create_room_maintenance():
 
     room = Room.query.get(data['room_id'])
     if room:
+        counted_in = sellable_category(room)
         room.maintenance_status = 'maintenance'
+        move_room(room.id, counted_in, None)  # before the new window exists
 
     db.session.add(maintenance)
     db.session.commit()
+    availability_index.sync_maintenance(maintenance)
+    if room:
+        table_changed('rooms')
+        sync_room_caches(room)
 
     return jsonify(maintenance.to_dict()), 201
 
-@app.route('/api/room-maintenance/<int:maintenance_id>', methods=['PUT'])
+@api.route('/api/room-maintenance/<int:maintenance_id>', methods=['PUT'])
 @require_auth()
 def update_room_maintenance(maintenance_id):
     maintenance = RoomMaintenance.query.get_or_404(maintenance_id)
     data = request.json
 
+    maintained = Room.query.get(maintenance.room_id)
+    counted_in = sellable_category(maintained) if maintained else None
+    window = maintenance_window(maintenance)
+
+    room = None
     if 'end_date' in data:
         if data['end_date']:
             maintenance.end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
             maintenance.status = 'completed'
-            room = Room.query.get(maintenance.room_id)
+            room = maintained
             if room:
                 room.maintenance_status = 'operational'
 
@@ -1380,11 +1460,20 @@ def update_room_maintenance(maintenance_id):
     if 'status' in data:
         maintenance.status = data['status']
 
+    if maintained:
+        # The window change is counted under the old flag, the flag change under the new window
+        move_maintenance(maintained.id, counted_in, maintenance.id, window, maintenance_window(maintenance))
+        move_room(maintained.id, counted_in, sellable_category(maintained))
+
     db.session.commit()
+    availability_index.sync_maintenance(maintenance)
+    if room:
+        table_changed('rooms')
+        sync_room_caches(room)
     return jsonify(maintenance.to_dict())
 
 # Room History Endpoint
-@app.route('/api/room-history', methods=['GET'])
+@api.route('/api/room-history', methods=['GET'])
 @require_auth()
 def get_room_history():
     date_filter = request.args.get('date')
@@ -1402,8 +1491,6 @@ def get_room_history():
     if room_id:
         query = query.filter(Booking.room_id == room_id)
 
-    bookings = query.order_by(Booking.check_in.desc()).all()
-
     maintenance_query = RoomMaintenance.query
 
     if date_filter:
@@ -1419,15 +1506,44 @@ def get_room_history():
     if room_id:
         maintenance_query = maintenance_query.filter(RoomMaintenance.room_id == room_id)
 
+    booking_columns = (Booking.check_in, Booking.id)
+    maintenance_columns = (RoomMaintenance.start_date, RoomMaintenance.id)
+
+    if wants_stream():
+        def generate():
+            yield '{"bookings":'
+            yield from stream_rows(query, booking_columns, serialize_bookings)
+            yield ',"maintenance":'
+            yield from stream_rows(maintenance_query, maintenance_columns, serialize_maintenance)
+            yield '}'
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+    if wants_page():
+        # Each list is paged independently: ?cursor= for bookings, ?maintenance_cursor= for maintenance
+        try:
+            bookings, next_cursor = keyset_page(query, booking_columns, page_size(), request.args.get('cursor'))
+            maintenance_records, next_maintenance_cursor = keyset_page(
+                maintenance_query, maintenance_columns, page_size(), request.args.get('maintenance_cursor')
+            )
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return jsonify({
+            'bookings': serialize_bookings(bookings),
+            'maintenance': serialize_maintenance(maintenance_records),
+            'next_cursor': next_cursor,
+            'next_maintenance_cursor': next_maintenance_cursor
+        })
+
+    bookings = query.order_by(Booking.check_in.desc()).all()
     maintenance_records = maintenance_query.order_by(RoomMaintenance.start_date.desc()).all()
 
     return jsonify({
-        'bookings': [booking.to_dict() for booking in bookings],
-        'maintenance': [record.to_dict() for record in maintenance_records]
+        'bookings': serialize_bookings(bookings),
+        'maintenance': serialize_maintenance(maintenance_records)
     })
 
 # Room Add/Edit Endpoints
-@app.route('/api/rooms', methods=['POST'])
+@api.route('/api/rooms', methods=['POST'])
 @require_auth()
 def create_room():
     data = request.json
@@ -1449,15 +1565,20 @@ def create_room():
     )
 
     db.session.add(room)
+    db.session.flush()
+    move_room(room.id, None, sellable_category(room))
     db.session.commit()
+    table_changed('rooms')
+    sync_room_caches(room)
 
     return jsonify(room.to_dict()), 201
 
-@app.route('/api/rooms/<int:room_id>', methods=['PUT'])
+@api.route('/api/rooms/<int:room_id>', methods=['PUT'])
 @require_auth()
 def update_room(room_id):
     room = Room.query.get_or_404(room_id)
     data = request.json
+    counted_in = sellable_category(room)
 
     if 'room_number' in data:
         room.room_number = data['room_number']
@@ -1478,158 +1599,159 @@ def update_room(room_id):
     if 'category_id' in data:
         room.category_id = data['category_id']
 
+    move_room(room.id, counted_in, sellable_category(room))
     db.session.commit()
+    table_changed('rooms')
+    sync_room_caches(room)
     return jsonify(room.to_dict())
 
-@app.route('/api/rooms/<int:room_id>', methods=['DELETE'])
+@api.route('/api/rooms/<int:room_id>', methods=['DELETE'])
 @require_auth()
 def delete_room(room_id):
     room = Room.query.get_or_404(room_id)
+    move_room(room_id, sellable_category(room), None)
+    release_room(room_id)
     db.session.delete(room)
     db.session.commit()
+    table_changed('rooms')
+    availability_index.remove_room(room_id)
+    room_board.refresh_rooms(room_id)
     return jsonify({'message': 'Room deleted successfully'})
 
-# ==================== INIT DB ====================
+# ==================== METRICS ====================
+
+@api.route('/api/metrics', methods=['GET'])
+@require_auth(roles=['admin'])
+def get_metrics():
+    return jsonify({
+        'auth_cache': principal_cache.stats(),
+        'reservation_locks': reservation_locks.stats(),
+        'cache_generations': generations.snapshot(),
+        'event_bus': event_bus.stats(),
+        'pid': os.getpid()
+    })
+
+# ==================== HEALTH ====================
 
-def init_db():
+@api.route('/api/health', methods=['GET'])
+def health():
+    """Liveness: the worker is up and serving requests."""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@api.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness: the database answers and its schema is current."""
+    try:
+        pending = [name for _, name, _ in pending_migrations()]
+    except OperationalError as e:
+        db.session.rollback()
+        return jsonify({'status': 'unavailable', 'error': str(e.orig)}), 503
+    if pending:
+        return jsonify({'status': 'migrating', 'pending_migrations': pending}), 503
+    return jsonify({'status': 'ready', 'schema_version': current_version()})
+
+# ==================== CLI COMMANDS ====================
+
+@api.cli.command('rebuild-agent-stats')
+def rebuild_agent_stats_command():
+    """Recompute the per-agent daily booking rollup from the Booking table."""
+    rows = rebuild_agent_stats()
+    print(f"Agent stats rebuilt: {rows} rollup rows")
+
+@api.cli.command('reconcile-counters')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+def reconcile_counters_command(dry_run):
+    """Recompute the dashboard counters from the Booking table and report drift."""
+    drift = reconcile_counters(fix=not dry_run)
+    if not drift:
+        print("Dashboard counters are in sync")
+    for name, (stored, actual) in drift.items():
+        print(f"{name}: stored {stored}, actual {actual}" + ("" if dry_run else " (fixed)"))
+
+@api.cli.command('drain-outbox')
+def drain_outbox_command():
+    """Send every queued email that is due, then exit."""
+    print(f"Outbox drained: {drain_outbox()} messages attempted")
+
+@api.cli.command('backfill-room-nights')
+def backfill_room_nights_command():
+    """Rebuild the room-night ledger from existing bookings."""
+    written, conflicts = backfill_room_nights()
+    print(f"Room-night ledger rebuilt: {written} nights")
+    if conflicts:
+        print(f"Overlapping bookings not in the ledger: {', '.join(map(str, conflicts))}")
+    print(f"Category inventory rebuilt: {rebuild_inventory()} category-nights")
+
+@api.cli.command('rebuild-inventory')
+@click.option('--horizon', default=INVENTORY_HORIZON_DAYS, show_default=True, help='Nights ahead of today to build.')
+def rebuild_inventory_command(horizon):
+    """Recreate the per-category nightly inventory from rooms and the room-night ledger."""
+    print(f"Category inventory rebuilt: {rebuild_inventory(horizon)} category-nights")
+
+@api.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    applied = upgrade()
+    for version, name in applied:
+        print(f"Applied migration {version}: {name}")
+    print(f"Schema is at version {current_version()}")
+
+@api.cli.command('seed')
+def seed_command():
+    """Insert the default admin users, agent, room categories and rooms that are missing."""
+    created = seed_defaults()
+    if not created:
+        print("Default data already present")
+    for table, count in created.items():
+        print(f"Seeded {count} {table}")
+
+# ==================== APP FACTORY ====================
+
+def create_app(config=None):
+    """Build the application; `config` overrides DEFAULT_CONFIG (and DATABASE_URL via SQLALCHEMY_DATABASE_URI)."""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    CORS(app)
+
+    # Create upload folder if it doesn't exist
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    configure_database(app, app.config.get('SQLALCHEMY_DATABASE_URI', DATABASE_URL))
+    # Worker processes of one deployment share cache generations through this file
+    os.makedirs(app.instance_path, exist_ok=True)
+    generations.open(app.config.get('GENERATIONS_FILE') or os.path.join(app.instance_path, 'cache-generations'))
+    app.register_blueprint(api)
+    return app
+
+def warm_up(app):
+    """Load the per-process caches before the first request instead of during it."""
     with app.app_context():
-        db.drop_all()
-        db.create_all()
-
-        # Seed default admin user
-        if User.query.count() == 0:
-            admin = User(
-                name='Admin',
-                email='admin@hotel.com',
-                role='admin',
-                status='active'
-            )
-            admin.set_password('admin123')
-            db.session.add(admin)
-
-            admin2 = User(
-                name='Admin',
-                email='admin@admin.com',
-                role='admin',
-                status='active'
-            )
-            admin2.set_password('admin')
-            db.session.add(admin2)
-
-            db.session.commit()
-            print("Default admin user created: admin@hotel.com / admin123")
-            print("Default admin user created: admin@admin.com / admin")
-
-        # Seed default categories
-        if RoomCategory.query.count() == 0:
-            categories = [
-                RoomCategory(name='Deluxe Room', description='Elegant room with modern amenities', base_price=150, capacity=2),
-                RoomCategory(name='Superior Family Room', description='Spacious family room with multiple beds', base_price=280, capacity=4),
-                RoomCategory(name='Grand Suite', description='Luxurious suite for large groups', base_price=480, capacity=8),
-                RoomCategory(name='Presidential Suite', description='Ultimate luxury suite', base_price=750, capacity=2),
-            ]
-            for cat in categories:
-                db.session.add(cat)
-            db.session.commit()
-            print("Default room categories created")
-
-        # Seed default agent
-        if Agent.query.count() == 0:
-            agent = Agent(
-                name='Lee',
-                email='lee@agent.com',
-                phone='0123456789',
-                company='Lee Travel Agency',
-                status='approved'
-            )
-            agent.set_password('password')
-            db.session.add(agent)
-            db.session.commit()
-            print("Default agent created: lee@agent.com / password")
-
-        if Room.query.count() == 0:
-            # Get category IDs
-            deluxe = RoomCategory.query.filter_by(name='Deluxe Room').first()
-            family = RoomCategory.query.filter_by(name='Superior Family Room').first()
-            grand = RoomCategory.query.filter_by(name='Grand Suite').first()
-            presidential = RoomCategory.query.filter_by(name='Presidential Suite').first()
-
-            rooms = [
-                # Deluxe Rooms (2 pax - 5 rooms)
-                Room(room_number='101', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=deluxe.id,
-                     description='Elegant room with modern amenities and comfortable queen bed',
-                     image_url='https://images.unsplash.com/photo-1611892440504-42a792e24d32?w=800',
-                     amenities='Free WiFi, Air Conditioning, Queen Bed, City View, Mini Bar, Smart TV'),
-                Room(room_number='102', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=deluxe.id,
-                     description='Stylish room with premium bedding and contemporary design',
-                     image_url='https://images.unsplash.com/photo-1590490360182-c33d57733427?w=800',
-                     amenities='Free WiFi, Air Conditioning, Queen Bed, City View, Mini Bar, Smart TV'),
-                Room(room_number='103', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=deluxe.id,
-                     description='Cozy deluxe room with private balcony and city views',
-                     image_url='https://images.unsplash.com/photo-1598928506311-c55ded91a20c?w=800',
-                     amenities='Free WiFi, Air Conditioning, Queen Bed, Balcony, Mini Bar, Smart TV'),
-                Room(room_number='104', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=deluxe.id,
-                     description='Bright and spacious room with natural lighting',
-                     image_url='https://images.unsplash.com/photo-1582719478250-c89cae4dc85b?w=800',
-                     amenities='Free WiFi, Air Conditioning, Queen Bed, City View, Mini Bar, Smart TV'),
-                Room(room_number='105', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=deluxe.id,
-                     description='Modern deluxe room with sophisticated decor',
-                     image_url='https://images.unsplash.com/photo-1566665797739-1674de7a421a?w=800',
-                     amenities='Free WiFi, Air Conditioning, Queen Bed, City View, Mini Bar, Smart TV'),
-
-                # Superior Family Rooms (4 pax - 5 rooms)
-                Room(room_number='201', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=family.id,
-                     description='Spacious family room with 2 queen beds and sitting area',
-                     image_url='https://images.unsplash.com/photo-1631049307264-da0ec9d70304?w=800',
-                     amenities='Free WiFi, Air Conditioning, 2 Queen Beds, Sofa, Mini Bar, Smart TV, Coffee Maker'),
-                Room(room_number='202', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=family.id,
-                     description='Family-friendly room with separate sleeping and living areas',
-                     image_url='https://images.unsplash.com/photo-1591088398332-8a7791972843?w=800',
-                     amenities='Free WiFi, Air Conditioning, 2 Queen Beds, Sofa, Mini Bar, Smart TV, Coffee Maker'),
-                Room(room_number='203', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=family.id,
-                     description='Modern family suite with premium comfort',
-                     image_url='https://images.unsplash.com/photo-1618773928121-c32242e63f39?w=800',
-                     amenities='Free WiFi, Air Conditioning, 2 Queen Beds, Sofa, Mini Bar, Smart TV, Coffee Maker'),
-                Room(room_number='204', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=family.id,
-                     description='Large family room with panoramic city views',
-                     image_url='https://images.unsplash.com/photo-1595576508898-0ad5c879a061?w=800',
-                     amenities='Free WiFi, Air Conditioning, 2 Queen Beds, City View, Mini Bar, Smart TV, Coffee Maker'),
-                Room(room_number='205', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=family.id,
-                     description='Comfortable family accommodation with modern facilities',
-                     image_url='https://images.unsplash.com/photo-1522771739844-6a9f6d5f14af?w=800',
-                     amenities='Free WiFi, Air Conditioning, 2 Queen Beds, Sofa, Mini Bar, Smart TV, Coffee Maker'),
-
-                # Grand Suite (8 pax - 3 rooms)
-                Room(room_number='301', room_type='Grand Suite', price_per_night=480, capacity=8, category_id=grand.id,
-                     description='Luxurious suite with multiple bedrooms perfect for large groups',
-                     image_url='https://images.unsplash.com/photo-1582719508461-905c673771fd?w=800',
-                     amenities='Free WiFi, Air Conditioning, 4 Bedrooms, Living Room, Kitchen, Dining Area, Smart TV, Washing Machine'),
-                Room(room_number='302', room_type='Grand Suite', price_per_night=480, capacity=8, category_id=grand.id,
-                     description='Premium group accommodation with separate living and dining areas',
-                     image_url='https://images.unsplash.com/photo-1629140727571-9b5c6f6267b4?w=800',
-                     amenities='Free WiFi, Air Conditioning, 4 Bedrooms, Living Room, Kitchen, Balcony, Smart TV, Washing Machine'),
-                Room(room_number='303', room_type='Grand Suite', price_per_night=480, capacity=8, category_id=grand.id,
-                     description='Spacious multi-bedroom suite with modern amenities and stunning views',
-                     image_url='https://images.unsplash.com/photo-1615874959474-d609969a20ed?w=800',
-                     amenities='Free WiFi, Air Conditioning, 4 Bedrooms, Living Room, Kitchen, City View, Smart TV, Washing Machine'),
-
-                # Presidential Suite (2 pax - 2 rooms)
-                Room(room_number='401', room_type='Presidential Suite', price_per_night=750, capacity=2, category_id=presidential.id,
-                     description='Ultimate luxury suite with exclusive amenities and breathtaking views',
-                     image_url='https://images.unsplash.com/photo-1631049552240-59c37f38802b?w=800',
-                     amenities='Free WiFi, King Bed, Private Balcony, Jacuzzi, Living Room, Dining Area, Butler Service, Premium Minibar'),
-                Room(room_number='402', room_type='Presidential Suite', price_per_night=750, capacity=2, category_id=presidential.id,
-                     description='Exquisite penthouse suite with unparalleled luxury and personalized service',
-                     image_url='https://images.unsplash.com/photo-1591088398332-8a7791972843?w=800',
-                     amenities='Free WiFi, King Bed, Ocean View, Jacuzzi, Living Room, Dining Area, Butler Service, Premium Minibar'),
-            ]
+        availability_index.ensure_loaded()
+        rate_calendar.ensure_current()
+        room_board.entries()
+        db.session.remove()
 
-            for room in rooms:
-                db.session.add(room)
+# ==================== INIT DB ====================
 
-            db.session.commit()
-            print("Database initialized with sample rooms")
+@api.cli.command('init-db')
+def init_db_command():
+    """Apply pending migrations and seed the database if it was just created."""
+    init_db(current_app._get_current_object())
+
+def init_db(app):
+    """Bring the schema up to date; seed only a database created just now."""
+    with app.app_context():
+        applied = upgrade()
+        if applied and applied[0][0] == 1 and User.query.first() is None:
+            seed_defaults()
+            print("New database seeded: admin@hotel.com / admin123, lee@agent.com / password")
 
 if __name__ == '__main__':
-    init_db()
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app = create_app()
+    init_db(app)
+    # With the reloader on, only the serving child process runs the mailer
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_outbox_worker(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
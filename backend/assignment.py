@@ -0,0 +1,253 @@
+"""Gap-aware room assignment.
+
+Each room type is treated as an interval scheduling problem. New stays go to
+the room where they leave the fewest orphaned gaps (runs of free nights too
+short to sell) and otherwise fit most snugly against neighbouring bookings,
+which keeps long free stretches intact for long stays.
+
+reassignment_plan() tidies a whole room type with as few moves as it can:
+pending and confirmed bookings arriving after the REASSIGNMENT_FREEZE_DAYS
+freeze window and not pinned to their room are walked by check-in date, and
+one only moves when it strands orphaned nights where it is and a slot flush
+against another stay strands fewer without breaking up a long free stretch.
+In-house, past, frozen and pinned bookings and maintenance windows stay where
+they are.
+"""
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import update
+
+from availability import RoomIntervals, availability_index
+from ledger import claim_nights, release_nights
+from models import db, Booking
+
+ORPHAN_GAP_NIGHTS = int(os.getenv('ORPHAN_GAP_NIGHTS', 1))
+LONG_STAY_NIGHTS = int(os.getenv('LONG_STAY_NIGHTS', 7))
+REASSIGNMENT_HORIZON_DAYS = int(os.getenv('REASSIGNMENT_HORIZON_DAYS', 365))
+# Arrivals this close keep their room: guests and housekeeping may already know it
+REASSIGNMENT_FREEZE_DAYS = int(os.getenv('REASSIGNMENT_FREEZE_DAYS', 7))
+OPEN_GAP = 10 ** 6  # stand-in length for "no booking on this side"
+
+
+def placement_cost(gap_before, gap_after):
+    """Sort key for placing a stay between gaps of free nights: orphans first, then total slack."""
+    gaps = [OPEN_GAP if g is None else g for g in (gap_before, gap_after)]
+    orphans = sum(1 for g in gaps if 0 < g <= ORPHAN_GAP_NIGHTS)
+    return orphans, sum(gaps)
+
+
+def rank_rooms(room_ids, check_in, check_out, today=None):
+    """Free rooms ordered from best to worst fit for [check_in, check_out)."""
+    today = today or date.today()
+    horizon = max((check_in - today).days, 0)
+
+    def cost(room_id):
+        before, after = availability_index.gaps_around(room_id, check_in, check_out)
+        # Nights before today cannot be sold, so today bounds the gap before
+        before = horizon if before is None else min(before, horizon)
+        return placement_cost(before, after), room_id
+
+    return sorted(room_ids, key=cost)
+
+
+# ==================== RE-OPTIMIZATION ====================
+
+class ReassignmentError(Exception):
+    """A movable booking fits nowhere, not even in its current room."""
+
+
+def fragmentation(stays, rooms, first, days):
+    """Orphaned and long-stay-sellable room-nights in the `days` nights from ordinal `first`.
+
+    `stays` is a list of (room index, start, end) with date ordinals; `rooms`
+    is the number of rooms. A run of free nights counts as orphaned when it is
+    at most ORPHAN_GAP_NIGHTS long and a stay follows it.
+    """
+    delta = np.zeros((rooms, days + 1), dtype=np.int32)
+    if stays:
+        rows, starts, ends = (np.asarray(column) for column in zip(*stays))
+        np.add.at(delta, (rows, np.clip(starts - first, 0, days)), 1)
+        np.add.at(delta, (rows, np.clip(ends - first, 0, days)), -1)
+    free = np.cumsum(delta[:, :days], axis=1) == 0
+
+    # Pad every row with an occupied night on both sides, then free runs start
+    # where the padded row steps up and end where it steps down.
+    padded = np.zeros((rooms, days + 2), dtype=np.int8)
+    padded[:, 1:-1] = free
+    steps = np.diff(padded, axis=1)
+    run_starts = np.nonzero(steps == 1)
+    run_ends = np.nonzero(steps == -1)[1]
+    lengths = run_ends - run_starts[1]
+    bounded = run_ends < days  # a stay follows the run inside the window
+    return {
+        'orphan_nights': int(lengths[(lengths <= ORPHAN_GAP_NIGHTS) & bounded].sum()),
+        'long_stay_nights': int(lengths[lengths >= LONG_STAY_NIGHTS].sum())
+    }
+
+
+def reassignment_plan(room_type, today=None):
+    """Plan a re-pack of `room_type`; return (moves {booking_id: (old_room, new_room)}, report)."""
+    today = today or date.today()
+    room_ids = availability_index.room_ids(room_type, operational_only=True)
+    all_room_ids = availability_index.room_ids(room_type)
+    today_ordinal = today.toordinal()
+    first, last = today_ordinal + 1, today_ordinal + 1 + REASSIGNMENT_HORIZON_DAYS
+
+    # Stays come from the availability index; the database only says which may move
+    stays = availability_index.stays_ending_after(all_room_ids, today)
+    movable_ids = set(db.session.scalars(db.select(Booking.id).where(
+        Booking.room_id.in_(all_room_ids),
+        Booking.status.in_(('pending', 'confirmed')),
+        Booking.check_in > today + timedelta(days=REASSIGNMENT_FREEZE_DAYS),
+        db.or_(Booking.room_pinned.is_(None), Booking.room_pinned == False)
+    )))
+    blocks = availability_index.blocks(room_ids)
+
+    row_of = {room_id: i for i, room_id in enumerate(room_ids)}
+    current = []  # (room row, start, end) as things stand
+    layout = {room_id: RoomIntervals() for room_id in room_ids}  # every stay and block, as planned so far
+    ends_at = defaultdict(set)    # check-out ordinal -> rooms with a stay or block ending then
+    starts_at = defaultdict(set)  # check-in ordinal -> rooms with a stay or block starting then
+    movable = []
+    for room_id, room_stays in stays.items():
+        for start, end, booking_id in room_stays:
+            if booking_id in movable_ids:
+                movable.append((start, end, booking_id, room_id))
+            if room_id in layout:
+                current.append((row_of[room_id], start, end))
+                layout[room_id].add(start, end, booking_id)
+                ends_at[end].add(room_id)
+                starts_at[start].add(room_id)
+    for room_id, room_blocks in blocks.items():
+        for start, end in room_blocks:
+            end = min(end, last + 1)  # open-ended maintenance
+            current.append((row_of[room_id], start, end))
+            layout[room_id].add(start, end, None)
+            ends_at[end].add(room_id)
+            starts_at[start].add(room_id)
+
+    def orphaned(gap, bounded):
+        return gap if bounded and 0 < gap <= ORPHAN_GAP_NIGHTS else 0
+
+    def long_stay(gap):
+        return gap if gap >= LONG_STAY_NIGHTS else 0
+
+    def split(start, end, previous_end, next_start):
+        """(orphaned, long-stay-sellable) nights change from placing [start, end) between these neighbours."""
+        free_from = max(previous_end or first, first)
+        before = max(start - free_from, 0)
+        bounded = next_start is not None
+        after = max((next_start if bounded else last) - end, 0)
+        run = before + (end - start) + after
+        return (
+            orphaned(before, True) + orphaned(after, bounded) - orphaned(run, bounded),
+            long_stay(before) + long_stay(after) - long_stay(run)
+        )
+
+    def neighbours_of(room_id, start, booking_id):
+        """Neighbours of a stay already in the layout, as if it were not there."""
+        intervals = layout[room_id]
+        i = bisect_left(intervals.starts, start)
+        while intervals.booking_ids[i] != booking_id:
+            i += 1
+        previous_end = intervals.max_ends[i - 1] if i else None
+        next_start = intervals.starts[i + 1] if i + 1 < len(intervals.starts) else None
+        return previous_end, next_start
+
+    def place(room_id, start, end, booking_id):
+        layout[room_id].add(start, end, booking_id)
+        ends_at[end].add(room_id)
+        starts_at[start].add(room_id)
+
+    def lift(room_id, start, end, booking_id):
+        layout[room_id].remove(booking_id)
+        if start not in layout[room_id].starts:
+            starts_at[start].discard(room_id)
+        if end not in layout[room_id].ends:
+            ends_at[end].discard(room_id)
+
+    # Repair pass: every movable stay stays put unless moving it into a slot
+    # flush against another stay strands fewer nights without breaking up a
+    # long free stretch. Ties keep the current room, then the lowest id.
+    moves = {}
+    movable.sort()
+    for start, end, booking_id, current_room in movable:
+        if current_room in layout:
+            kept_orphans, kept_long = split(start, end, *neighbours_of(current_room, start, booking_id))
+            if kept_orphans <= 0:
+                continue  # strands nothing where it is: leave the guest alone
+            lift(current_room, start, end, booking_id)
+            candidates = ends_at.get(start, set()) | starts_at.get(end, set())
+        else:
+            # Its room is closed or under maintenance: it has to go somewhere
+            kept_orphans = kept_long = None
+            candidates = room_ids
+        best = None
+        for room_id in sorted(candidates):
+            if room_id == current_room or not layout[room_id].is_free(start, end):
+                continue
+            orphans, long_stays = split(start, end, *layout[room_id].neighbours(start, end))
+            if kept_orphans is not None:
+                # Lifting the stay out of its room gives back what it took there
+                orphans, long_stays = orphans - kept_orphans, long_stays - kept_long
+                if orphans >= 0 or long_stays < 0:
+                    continue
+            if best is None or (orphans, -long_stays) < best[0]:
+                best = ((orphans, -long_stays), room_id)
+        if best is None and kept_orphans is None:
+            raise ReassignmentError(f'Booking {booking_id} cannot be placed in any {room_type} room')
+        chosen = current_room if best is None else best[1]
+        place(chosen, start, end, booking_id)
+        if chosen != current_room:
+            moves[booking_id] = (current_room, chosen)
+
+    after_stays = [
+        (row_of[room_id], start, end)
+        for room_id in room_ids
+        for start, end in zip(layout[room_id].starts, layout[room_id].ends)
+    ]
+    days = last - first
+    before = fragmentation(current, len(room_ids), first, days)
+    after = fragmentation(after_stays, len(room_ids), first, days)
+    # A plan that does not sell more long stays (or, at equal long stays,
+    # strand fewer nights) is reported but not applied
+    improved = (after['long_stay_nights'], -after['orphan_nights']) > \
+        (before['long_stay_nights'], -before['orphan_nights'])
+    if not improved:
+        moves = {}
+    report = {
+        'room_type': room_type,
+        'rooms': len(room_ids),
+        'movable_bookings': len(movable),
+        'moves': len(moves),
+        'window': {
+            'from': date.fromordinal(first).strftime('%Y-%m-%d'),
+            'to': (date.fromordinal(last) - timedelta(days=1)).strftime('%Y-%m-%d')
+        },
+        'improved': improved,
+        'before': before,
+        'after': after
+    }
+    return moves, report
+
+
+def apply_reassignment(moves, chunk_size=500):
+    """Write planned moves and their room-nights; returns the moved bookings. The caller commits."""
+    if not moves:
+        return []
+    db.session.execute(update(Booking), [
+        {'id': booking_id, 'room_id': new_room} for booking_id, (_, new_room) in moves.items()
+    ])
+    booking_ids = list(moves)
+    moved = []
+    for i in range(0, len(booking_ids), chunk_size):
+        moved.extend(Booking.query.filter(Booking.id.in_(booking_ids[i:i + chunk_size])).all())
+    # Release everything before claiming, so rooms swapping stays never collide
+    for i in range(0, len(moved), chunk_size):
+        release_nights(*moved[i:i + chunk_size])
+    claim_nights(*moved)
+    return moved
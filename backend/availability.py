@@ -0,0 +1,362 @@
+"""In-memory availability index.
+
+Every room's non-cancelled bookings are kept as sorted [check_in, check_out)
+intervals, so "which rooms are free for these dates" is answered for the whole
+hotel in one pass instead of one Booking query per room.
+
+Next to its bookings each room keeps its blocks: ongoing maintenance records
+([start_date, end_date), open-ended while end_date is unset) and, while the
+room is flagged 'maintenance' or 'closed', a closure covering every date. A
+room is free for a stay when neither overlaps it; every availability check
+(booking, moving, room lists, category counts, auto-assignment) goes through
+that one rule.
+
+Each process keeps its own index; a write made by another worker process
+(seen through the shared "availability" generation) triggers a reload.
+"""
+import threading
+from bisect import bisect_left
+from datetime import date
+
+import numpy as np
+
+from generations import Generation
+from models import db, Room, Booking, RoomMaintenance
+
+UNBOOKABLE = ('maintenance', 'closed')
+OPEN_END = date.max.toordinal() + 1  # end ordinal of open-ended maintenance and closures
+CLOSURE = 0  # block id of a room's closure; maintenance record n is block -n
+
+
+class RoomIntervals:
+    """Sorted booking intervals of a single room, stored as date ordinals."""
+
+    __slots__ = ('starts', 'ends', 'booking_ids', 'max_ends')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.booking_ids = []
+        # max_ends[i] is the latest check-out among intervals 0..i, which lets
+        # an overlap scan stop as soon as nothing earlier can reach the range.
+        self.max_ends = []
+
+    def add(self, start, end, booking_id):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.booking_ids.insert(i, booking_id)
+        self._reindex(i)
+
+    def remove(self, booking_id):
+        try:
+            i = self.booking_ids.index(booking_id)
+        except ValueError:
+            return
+        del self.starts[i]
+        del self.ends[i]
+        del self.booking_ids[i]
+        self._reindex(i)
+
+    def _reindex(self, i):
+        del self.max_ends[i:]
+        running = self.max_ends[i - 1] if i else None
+        for end in self.ends[i:]:
+            if running is None or end > running:
+                running = end
+            self.max_ends.append(running)
+
+    def conflicts(self, start, end, exclude_booking_id=None):
+        """Return ids of bookings overlapping [start, end)."""
+        found = []
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] > start:
+            if self.ends[i] > start and self.booking_ids[i] != exclude_booking_id:
+                found.append(self.booking_ids[i])
+            i -= 1
+        return found
+
+    def is_free(self, start, end, exclude_booking_id=None):
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] > start:
+            if self.ends[i] > start and self.booking_ids[i] != exclude_booking_id:
+                return False
+            i -= 1
+        return True
+
+    def neighbours(self, start, end):
+        """(latest check-out before start, earliest check-in from end) around a free range.
+
+        Either side is None when the room has no booking there.
+        """
+        i = bisect_left(self.starts, end)
+        previous_end = self.max_ends[i - 1] if i else None
+        next_start = self.starts[i] if i < len(self.starts) else None
+        return previous_end, next_start
+
+
+class AvailabilityIndex:
+    """Process-wide index of room occupancy, loaded lazily with three bulk queries."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._intervals = {}     # room_id -> RoomIntervals of bookings
+        self._blocks = {}        # room_id -> RoomIntervals of maintenance and closure
+        self._rooms = {}         # room_id -> {'room_type', 'maintenance_status'}
+        self._booking_room = {}  # booking_id -> room_id
+        self._maintenance_room = {}  # maintenance id -> room_id
+        self._generation = Generation('availability')
+
+    def load(self):
+        """(Re)build the index from the database. Requires an app context."""
+        self._generation.mark_current()
+        rooms = db.session.query(Room.id, Room.room_type, Room.maintenance_status).all()
+        bookings = db.session.query(
+            Booking.id, Booking.room_id, Booking.check_in, Booking.check_out
+        ).filter(Booking.status != 'cancelled').order_by(Booking.check_in).all()
+        maintenance = db.session.query(
+            RoomMaintenance.id, RoomMaintenance.room_id, RoomMaintenance.start_date, RoomMaintenance.end_date
+        ).filter(RoomMaintenance.status == 'ongoing').all()
+
+        with self._lock:
+            self._intervals = {}
+            self._blocks = {}
+            self._rooms = {}
+            self._booking_room = {}
+            self._maintenance_room = {}
+            for room_id, room_type, maintenance_status in rooms:
+                self._rooms[room_id] = {
+                    'room_type': room_type,
+                    'maintenance_status': maintenance_status
+                }
+                self._intervals[room_id] = RoomIntervals()
+                self._set_closure(room_id, maintenance_status)
+            for booking_id, room_id, check_in, check_out in bookings:
+                self._add(booking_id, room_id, check_in, check_out)
+            for maintenance_id, room_id, start_date, end_date in maintenance:
+                self._add_maintenance(maintenance_id, room_id, start_date, end_date)
+            self._loaded = True
+
+    def ensure_loaded(self):
+        if not self._loaded or self._generation.is_stale():
+            with self._lock:
+                if not self._loaded or self._generation.is_stale():
+                    self.load()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def _add(self, booking_id, room_id, check_in, check_out):
+        intervals = self._intervals.setdefault(room_id, RoomIntervals())
+        intervals.add(check_in.toordinal(), check_out.toordinal(), booking_id)
+        self._booking_room[booking_id] = room_id
+
+    def _discard(self, booking_id):
+        room_id = self._booking_room.pop(booking_id, None)
+        if room_id is not None and room_id in self._intervals:
+            self._intervals[room_id].remove(booking_id)
+
+    def _add_maintenance(self, maintenance_id, room_id, start_date, end_date):
+        blocks = self._blocks.setdefault(room_id, RoomIntervals())
+        blocks.add(start_date.toordinal(), end_date.toordinal() if end_date else OPEN_END, -maintenance_id)
+        self._maintenance_room[maintenance_id] = room_id
+
+    def _discard_maintenance(self, maintenance_id):
+        room_id = self._maintenance_room.pop(maintenance_id, None)
+        if room_id is not None and room_id in self._blocks:
+            self._blocks[room_id].remove(-maintenance_id)
+
+    def _set_closure(self, room_id, maintenance_status):
+        blocks = self._blocks.setdefault(room_id, RoomIntervals())
+        blocks.remove(CLOSURE)
+        if maintenance_status in UNBOOKABLE:
+            blocks.add(0, OPEN_END, CLOSURE)
+
+    # ---- write path -------------------------------------------------------
+
+    def _published(self):
+        """Tell other processes about a local write; drop the index if one of theirs was missed."""
+        if not self._generation.bump():
+            self._loaded = False
+
+    def sync_booking(self, booking):
+        """Mirror a committed booking (new, moved, re-dated or cancelled)."""
+        with self._lock:
+            if self._loaded:
+                self._discard(booking.id)
+                if booking.status != 'cancelled':
+                    self._add(booking.id, booking.room_id, booking.check_in, booking.check_out)
+            self._published()
+
+    def sync_room(self, room):
+        with self._lock:
+            if self._loaded:
+                self._rooms[room.id] = {
+                    'room_type': room.room_type,
+                    'maintenance_status': room.maintenance_status
+                }
+                self._intervals.setdefault(room.id, RoomIntervals())
+                self._set_closure(room.id, room.maintenance_status)
+            self._published()
+
+    def sync_maintenance(self, maintenance):
+        """Mirror a committed maintenance record (new, ended or edited)."""
+        with self._lock:
+            if self._loaded:
+                self._discard_maintenance(maintenance.id)
+                if maintenance.status == 'ongoing':
+                    self._add_maintenance(maintenance.id, maintenance.room_id, maintenance.start_date,
+                                          maintenance.end_date)
+            self._published()
+
+    def remove_room(self, room_id):
+        with self._lock:
+            if self._loaded:
+                self._rooms.pop(room_id, None)
+                intervals = self._intervals.pop(room_id, None)
+                if intervals:
+                    for booking_id in intervals.booking_ids:
+                        self._booking_room.pop(booking_id, None)
+                blocks = self._blocks.pop(room_id, None)
+                if blocks:
+                    for block_id in blocks.booking_ids:
+                        self._maintenance_room.pop(-block_id, None)
+            self._published()
+
+    # ---- read path --------------------------------------------------------
+
+    def room_ids(self, room_type=None, operational_only=False):
+        """Room ids in id order, optionally restricted to a type / operational rooms."""
+        self.ensure_loaded()
+        with self._lock:
+            return [
+                room_id for room_id, info in sorted(self._rooms.items())
+                if (room_type is None or info['room_type'] == room_type)
+                and (not operational_only or info['maintenance_status'] not in UNBOOKABLE)
+            ]
+
+    def _blocked_by(self, room_id, start, end, exclude_booking_id=None):
+        blocks = self._blocks.get(room_id)
+        if blocks is not None and not blocks.is_free(start, end):
+            return 'closed' if CLOSURE in blocks.conflicts(start, end) else 'maintenance'
+        intervals = self._intervals.get(room_id)
+        if intervals is not None and not intervals.is_free(start, end, exclude_booking_id):
+            return 'booked'
+        return None
+
+    def blocked_by(self, room_id, check_in, check_out, exclude_booking_id=None):
+        """Why the room cannot take [check_in, check_out): 'closed', 'maintenance', 'booked', or None if free."""
+        self.ensure_loaded()
+        with self._lock:
+            return self._blocked_by(room_id, check_in.toordinal(), check_out.toordinal(), exclude_booking_id)
+
+    def is_free(self, room_id, check_in, check_out, exclude_booking_id=None):
+        return self.blocked_by(room_id, check_in, check_out, exclude_booking_id) is None
+
+    def conflicts(self, room_id, check_in, check_out, exclude_booking_id=None):
+        """Ids of the bookings overlapping [check_in, check_out)."""
+        self.ensure_loaded()
+        with self._lock:
+            intervals = self._intervals.get(room_id)
+            if intervals is None:
+                return []
+            return intervals.conflicts(check_in.toordinal(), check_out.toordinal(), exclude_booking_id)
+
+    def gaps_around(self, room_id, check_in, check_out):
+        """Free nights left before and after a stay placed in a free room (None: open-ended).
+
+        Maintenance bounds a gap just like a booking does.
+        """
+        self.ensure_loaded()
+        start, end = check_in.toordinal(), check_out.toordinal()
+        previous_end = next_start = None
+        with self._lock:
+            for intervals in (self._intervals.get(room_id), self._blocks.get(room_id)):
+                if intervals is None:
+                    continue
+                before, after = intervals.neighbours(start, end)
+                if before is not None and (previous_end is None or before > previous_end):
+                    previous_end = before
+                if after is not None and (next_start is None or after < next_start):
+                    next_start = after
+        return (
+            start - previous_end if previous_end is not None else None,
+            next_start - end if next_start is not None else None
+        )
+
+    def bookings_ending_after(self, room_id, day):
+        """(check_in, check_out) dates of a room's bookings that end after `day`, by check-in."""
+        self.ensure_loaded()
+        cutoff = day.toordinal()
+        with self._lock:
+            intervals = self._intervals.get(room_id)
+            if intervals is None:
+                return []
+            return [
+                (date.fromordinal(start), date.fromordinal(end))
+                for start, end in zip(intervals.starts, intervals.ends) if end > cutoff
+            ]
+
+    def stays_ending_after(self, room_ids, day):
+        """{room_id: [(start, end, booking_id), ...]} by check-in, as date ordinals, for stays ending after `day`."""
+        self.ensure_loaded()
+        cutoff = day.toordinal()
+        with self._lock:
+            stays = {}
+            for room_id in room_ids:
+                intervals = self._intervals.get(room_id)
+                stays[room_id] = [] if intervals is None else [
+                    stay for stay in zip(intervals.starts, intervals.ends, intervals.booking_ids) if stay[1] > cutoff
+                ]
+            return stays
+
+    def blocks(self, room_ids):
+        """{room_id: [(start, end), ...]} of maintenance and closure blocks, as date ordinals."""
+        self.ensure_loaded()
+        with self._lock:
+            blocks = {}
+            for room_id in room_ids:
+                intervals = self._blocks.get(room_id)
+                blocks[room_id] = [] if intervals is None else list(zip(intervals.starts, intervals.ends))
+            return blocks
+
+    def occupancy(self, room_ids, start_date, days):
+        """Boolean room x day matrix: cell [i, d] is set when room_ids[i] is booked or blocked on start_date + d."""
+        self.ensure_loaded()
+        origin = start_date.toordinal()
+        rows, starts, ends = [], [], []
+        with self._lock:
+            for row, room_id in enumerate(room_ids):
+                for intervals in (self._intervals.get(room_id), self._blocks.get(room_id)):
+                    if intervals is None:
+                        continue
+                    stop = bisect_left(intervals.starts, origin + days)
+                    for start, end in zip(intervals.starts[:stop], intervals.ends[:stop]):
+                        if end > origin:
+                            rows.append(row)
+                            starts.append(start)
+                            ends.append(end)
+
+        # Mark +1 at each check-in and -1 at each check-out, then a running sum
+        # along the day axis gives the number of bookings covering every cell.
+        delta = np.zeros((len(room_ids), days + 1), dtype=np.int32)
+        if rows:
+            rows = np.asarray(rows)
+            np.add.at(delta, (rows, np.clip(np.asarray(starts) - origin, 0, days)), 1)
+            np.add.at(delta, (rows, np.clip(np.asarray(ends) - origin, 0, days)), -1)
+        return np.cumsum(delta[:, :days], axis=1) > 0
+
+    def free_rooms(self, check_in, check_out, room_type=None, exclude_booking_id=None):
+        """Ids of rooms with no overlapping booking, maintenance or closure for [check_in, check_out)."""
+        start, end = check_in.toordinal(), check_out.toordinal()
+        self.ensure_loaded()
+        with self._lock:
+            return [
+                room_id for room_id in self.room_ids(room_type)
+                if self._blocked_by(room_id, start, end, exclude_booking_id) is None
+            ]
+
+
+availability_index = AvailabilityIndex()
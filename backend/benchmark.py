@@ -0,0 +1,665 @@
+"""Micro-benchmarks for the booking backend.
+
+Every benchmark runs against a throwaway SQLite database, never hotel.db:
+
+    python benchmark.py pricing
+    python benchmark.py login --threads 8
+    python benchmark.py allocator --threads 8 --room-types 4
+    python benchmark.py assignment --rooms 500 --days 365
+    python benchmark.py db --threads 8 --seconds 5
+    python benchmark.py room-board --rooms 1000
+    python benchmark.py tape-chart --rooms 500 --days 180
+    python benchmark.py inventory --rooms 500 --room-types 4 --days 90
+    python benchmark.py blocked-intervals --rooms 500 --room-types 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import cycle
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from database import configure_database
+from models import db, Booking, Holiday, RateRule, Room, RoomMaintenance, User
+from pricing import calculate_booking_price, price_with_context, rate_calendar
+
+
+def make_app(uri='sqlite://', **pragmas):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_database(app, uri, **pragmas)
+    return app
+
+
+class QueryCounter:
+    """Counts statements executed on the current engine inside a `with` block."""
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(db.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times; return (mean milliseconds, queries per call)."""
+    with QueryCounter() as counter:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = time.perf_counter() - started
+    return elapsed * 1000 / repeat, counter.count / repeat
+
+
+# ==================== PRICING ====================
+
+def legacy_price(room_price, room_type, check_in, check_out):
+    """The per-night query loop calculate_booking_price used to run, kept as a baseline."""
+    total = 0.0
+    current_date = check_in
+    while current_date < check_out:
+        multiplier = 1.0
+        holiday = Holiday.query.filter_by(date=current_date).first()
+        if holiday and holiday.is_blackout:
+            return None
+        rules = RateRule.query.filter(
+            RateRule.is_active == True,
+            RateRule.start_date <= current_date,
+            RateRule.end_date >= current_date,
+            db.or_(
+                RateRule.room_category.is_(None),
+                RateRule.room_category == '',
+                RateRule.room_category == room_type
+            )
+        ).all()
+        if rules:
+            multiplier = max(r.rate_multiplier for r in rules)
+        if holiday:
+            multiplier *= holiday.rate_multiplier
+        total += round(room_price * multiplier, 2)
+        current_date += timedelta(days=1)
+    return round(total, 2)
+
+
+def bench_pricing(args):
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        start = date.today() + timedelta(days=30)
+        for i in range(0, 365, 9):
+            db.session.add(Holiday(name=f'Holiday {i}', date=start + timedelta(days=i), rate_multiplier=1.5))
+        for i in range(0, 365, 30):
+            db.session.add(RateRule(name=f'Season {i}', start_date=start + timedelta(days=i),
+                                    end_date=start + timedelta(days=i + 20), rate_multiplier=1.2))
+            db.session.add(RateRule(name=f'Deluxe {i}', room_category='Deluxe Room',
+                                    start_date=start + timedelta(days=i + 5),
+                                    end_date=start + timedelta(days=i + 40), rate_multiplier=1.4))
+        db.session.commit()
+        rate_calendar.rebuild()
+
+        print(f"{'nights':>6}  {'legacy ms':>10} {'queries':>7}  {'context ms':>10} {'queries':>7}"
+              f"  {'calendar ms':>11} {'queries':>7}")
+        for nights in (1, 7, 14, 28, 56, 112):
+            check_out = start + timedelta(days=nights)
+            expected = legacy_price(150, 'Deluxe Room', start, check_out)
+            assert expected == price_with_context(150, 'Deluxe Room', start, check_out)[0]
+            assert expected == calculate_booking_price(150, 'Deluxe Room', start, check_out)[0]
+            row = []
+            for fn in (legacy_price, price_with_context, calculate_booking_price):
+                row.extend(timed(lambda: fn(150, 'Deluxe Room', start, check_out), args.repeat))
+            print(f'{nights:>6}  {row[0]:>10.2f} {row[1]:>7.0f}  {row[2]:>10.2f} {row[3]:>7.0f}'
+                  f'  {row[4]:>11.2f} {row[5]:>7.0f}')
+
+
+# ==================== LOGIN ====================
+
+def bench_login(args):
+    from passwords import PASSWORD_HASH_METHOD, PASSWORD_WORKERS, shutdown
+    from principals import authenticate
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        for i in range(args.threads):
+            user = User(name=f'User {i}', email=f'user{i}@example.com', role='customer', status='active')
+            user.set_password('secret123')
+            db.session.add(user)
+        db.session.commit()
+
+    def login(i):
+        with app.app_context():
+            assert authenticate(f'user{i % args.threads}@example.com', 'secret123') is not None
+
+    attempts = args.repeat * args.threads
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(login, range(args.threads)))  # warm up the verifier processes
+        started = time.perf_counter()
+        list(pool.map(login, range(attempts)))
+        elapsed = time.perf_counter() - started
+    shutdown()
+
+    cores = os.cpu_count() or 1
+    rate = attempts / elapsed
+    print(f'method={PASSWORD_HASH_METHOD} workers={PASSWORD_WORKERS} threads={args.threads} cores={cores}')
+    print(f'{attempts} logins in {elapsed:.2f}s: {rate:.1f} logins/s, {rate / cores:.1f} per core, '
+          f'{elapsed * 1000 / attempts * args.threads:.1f} ms mean latency')
+
+
+# ==================== ALLOCATOR ====================
+
+def count_double_bookings():
+    """Pairs of active bookings that share a room-night."""
+    other = db.aliased(Booking)
+    return db.session.query(db.func.count()).select_from(Booking).join(other, db.and_(
+        other.room_id == Booking.room_id,
+        other.id > Booking.id,
+        other.check_in < Booking.check_out,
+        other.check_out > Booking.check_in
+    )).filter(Booking.status != 'cancelled', other.status != 'cancelled').scalar()
+
+
+def bench_allocator(args):
+    """Concurrent auto-assigned bookings competing for a few room types."""
+    from contextlib import nullcontext
+    from allocator import pick_rooms, reservation_locks
+    from availability import availability_index
+
+    workdir = tempfile.mkdtemp()
+    app = make_app(f"sqlite:///{os.path.join(workdir, 'allocator.db')}")
+    room_types = [f'Type {i}' for i in range(args.room_types)]
+    with app.app_context():
+        db.create_all()
+        for i, t in enumerate(room_types):
+            for n in range(args.rooms_per_type):
+                db.session.add(Room(room_number=f'{i}-{n}', room_type=t, price_per_night=100,
+                                    capacity=2))
+        db.session.commit()
+        availability_index.load()
+
+    start = date.today() + timedelta(days=1)
+    outcomes = {'booked': 0, 'sold_out': 0}
+    tally = threading.Lock()
+
+    def book(seed):
+        rng = random.Random(seed)
+        room_type = rng.choice(room_types)
+        check_in = start + timedelta(days=rng.randrange(args.days))
+        check_out = check_in + timedelta(days=rng.randint(1, 4))
+        with app.app_context():
+            with (nullcontext() if args.no_locks else reservation_locks.hold(room_type)):
+                picked = pick_rooms(room_type, check_in, check_out, 1)
+                if picked:
+                    booking = Booking(room_id=picked[0], customer_name='Guest', customer_email='guest@example.com',
+                                      customer_phone='0', check_in=check_in, check_out=check_out,
+                                      total_price=100, status='pending')
+                    db.session.add(booking)
+                    db.session.commit()
+                    availability_index.sync_booking(booking)
+        with tally:
+            outcomes['booked' if picked else 'sold_out'] += 1
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        started = time.perf_counter()
+        list(pool.map(book, range(args.repeat * args.threads)))
+        elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        doubles = count_double_bookings()
+    print(f"threads={args.threads} room_types={args.room_types} rooms_per_type={args.rooms_per_type} "
+          f"locks={'off' if args.no_locks else 'on'}")
+    print(f"{outcomes['booked']} booked, {outcomes['sold_out']} sold out in {elapsed:.2f}s: "
+          f"{outcomes['booked'] / elapsed:.1f} bookings/s, {doubles} overlapping booking pairs")
+
+
+# ==================== ASSIGNMENT ====================
+
+def bench_assignment(args):
+    """Re-pack a year of first-fit bookings across one large room type."""
+    from sqlalchemy import insert
+    from assignment import rank_rooms, reassignment_plan
+    from availability import availability_index
+
+    app = make_app()
+    rng = random.Random(7)
+    today = date.today()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Room), [
+            {'room_number': str(n), 'room_type': 'Standard', 'price_per_night': 100, 'capacity': 2}
+            for n in range(args.rooms)
+        ])
+        room_ids = [room_id for (room_id,) in db.session.query(Room.id).order_by(Room.id)]
+
+        # Random arrivals assigned first-fit, the way rooms used to be picked
+        grid = np.zeros((args.rooms, args.days + 8), dtype=bool)
+        rows = []
+        for _ in range(int(args.rooms * args.days * 0.75 / 3)):
+            offset = rng.randrange(1, args.days)
+            nights = rng.choice((1, 1, 2, 2, 3, 4, 7))
+            free = np.flatnonzero(~grid[:, offset:offset + nights].any(axis=1))
+            if not len(free):
+                continue
+            grid[free[0], offset:offset + nights] = True
+            check_in = today + timedelta(days=offset)
+            rows.append({'room_id': room_ids[free[0]], 'customer_name': 'Guest', 'customer_email': 'guest@example.com',
+                         'customer_phone': '0', 'check_in': check_in, 'check_out': check_in + timedelta(days=nights),
+                         'total_price': 100, 'status': 'confirmed', 'room_pinned': False})
+        db.session.execute(insert(Booking), rows)
+        db.session.commit()
+        availability_index.load()
+
+        started = time.perf_counter()
+        moves, report = reassignment_plan('Standard')
+        elapsed = time.perf_counter() - started
+        print(f"{args.rooms} rooms x {args.days} days, {len(rows)} bookings: plan in {elapsed * 1000:.0f} ms, "
+              f"{len(moves)} moves")
+        print(f"orphan nights {report['before']['orphan_nights']} -> {report['after']['orphan_nights']}, "
+              f"long-stay nights {report['before']['long_stay_nights']} -> {report['after']['long_stay_nights']}")
+
+        check_in = today + timedelta(days=args.days // 2)
+        free = availability_index.free_rooms(check_in, check_in + timedelta(days=2), 'Standard')
+        ms, _ = timed(lambda: rank_rooms(free, check_in, check_in + timedelta(days=2)), args.repeat)
+        print(f'rank {len(free)} free rooms for one stay: {ms:.2f} ms')
+
+
+# ==================== ROOM BOARD ====================
+
+def legacy_room_status(today):
+    """The board as it was built before: one occupant query per room, N+1 serialization."""
+    board = []
+    for room in Room.query.all():
+        current_booking = None
+        if room.maintenance_status not in ('maintenance', 'closed'):
+            current_booking = Booking.query.filter(
+                Booking.room_id == room.id,
+                Booking.status != 'cancelled',
+                Booking.check_in <= today,
+                Booking.check_out > today
+            ).first()
+        board.append({'room': room.to_dict(),
+                      'current_booking': current_booking.to_dict() if current_booking else None})
+    return board
+
+
+def bench_room_board(args):
+    """Front-desk board for a large property: per-room queries vs one join vs the snapshot."""
+    from sqlalchemy import insert
+    from room_board import room_board, room_status_rows
+
+    app = make_app()
+    today = date.today()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Room), [
+            {'room_number': str(n), 'room_type': 'Standard', 'price_per_night': 100, 'capacity': 2}
+            for n in range(args.rooms)
+        ])
+        room_ids = [room_id for (room_id,) in db.session.query(Room.id)]
+        # Most rooms occupied tonight, plus a few weeks of other stays
+        rows = []
+        for i, room_id in enumerate(room_ids):
+            for week in range(-2, 3):
+                check_in = today + timedelta(days=week * 7 - (i % 3))
+                rows.append({'room_id': room_id, 'customer_name': 'Guest', 'customer_email': 'guest@example.com',
+                             'customer_phone': '0', 'check_in': check_in, 'check_out': check_in + timedelta(days=5),
+                             'total_price': 500, 'status': 'confirmed'})
+        db.session.execute(insert(Booking), rows)
+        db.session.commit()
+
+        def legacy():
+            legacy_room_status(today)
+            db.session.expunge_all()
+
+        def joined():
+            room_status_rows(today)
+            db.session.expunge_all()
+
+        repeat = max(1, args.repeat // 4)
+        room_board.as_json()  # built once per day (and patched on writes), then served as is
+        for name, fn in (('per-room queries', legacy), ('single join', joined), ('snapshot', room_board.as_json)):
+            ms, queries = timed(fn, repeat)
+            print(f'{name:>16}: {ms:8.2f} ms, {queries:6.0f} queries per load ({args.rooms} rooms)')
+
+
+# ==================== TAPE CHART ====================
+
+def legacy_tape_chart(start, days):
+    """The chart as the browser stitched it: one room-history call per date, a dense grid per room."""
+    from models import RoomMaintenance, serialize_bookings, serialize_maintenance
+
+    rooms = {room.id: [0] * days for room in Room.query.all()}
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        bookings = serialize_bookings(Booking.query.filter(Booking.check_in <= day, Booking.check_out >= day))
+        maintenance = serialize_maintenance(RoomMaintenance.query.filter(
+            RoomMaintenance.start_date <= day,
+            db.or_(RoomMaintenance.end_date >= day, RoomMaintenance.end_date.is_(None))
+        ))
+        for record in maintenance:
+            rooms[record['room_id']][offset] = -record['id']
+        for booking in bookings:
+            if booking['status'] != 'cancelled' and booking['check_out'] != day.isoformat():
+                rooms[booking['room_id']][offset] = booking['id']
+        db.session.expunge_all()
+    return rooms
+
+
+def bench_tape_chart(args):
+    """Whole-property chart: per-date history calls vs one interval query and run-length encoding."""
+    import json
+    from sqlalchemy import insert
+    from models import RoomMaintenance
+    from tape_chart import tape_chart
+
+    app = make_app()
+    rng = random.Random(7)
+    start = date.today()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Room), [
+            {'room_number': str(n), 'room_type': 'Standard', 'price_per_night': 100, 'capacity': 2}
+            for n in range(args.rooms)
+        ])
+        room_ids = [room_id for (room_id,) in db.session.query(Room.id)]
+        # Back-to-back stays at about 75% occupancy, and a few rooms in maintenance
+        rows = []
+        for room_id in room_ids:
+            day = rng.randrange(-3, 3)
+            while day < args.days:
+                nights = rng.choice((1, 2, 2, 3, 4, 7))
+                check_in = start + timedelta(days=day)
+                rows.append({'room_id': room_id, 'customer_name': 'Guest', 'customer_email': 'guest@example.com',
+                             'customer_phone': '0', 'check_in': check_in, 'check_out': check_in + timedelta(days=nights),
+                             'total_price': 100 * nights, 'status': 'confirmed'})
+                day += nights + rng.choice((0, 0, 1, 2, 3))
+        db.session.execute(insert(Booking), rows)
+        db.session.execute(insert(RoomMaintenance), [
+            {'room_id': room_id, 'start_date': start + timedelta(days=rng.randrange(args.days)), 'status': 'ongoing'}
+            for room_id in room_ids[::50]
+        ])
+        db.session.commit()
+
+        end = start + timedelta(days=args.days)
+        chart = tape_chart(start, end)
+        runs = sum(len(room['runs']) for room in chart['rooms'] if 'runs' in room)
+        dense = sum('cells' in room for room in chart['rooms'])
+        # Sizes as jsonify sends them; the dense chart is the same chart with every room night by night
+        size = lambda payload: len(json.dumps(payload, separators=(',', ':'))) // 1024
+        grid = legacy_tape_chart(start, args.days)
+        dense_chart = dict(chart, rooms=[
+            {**{k: v for k, v in room.items() if k not in ('runs', 'cells')}, 'cells': grid[room['room_id']]}
+            for room in chart['rooms']
+        ])
+        print(f"{args.rooms} rooms x {args.days} days, {len(rows)} bookings: {runs} runs, {dense} rooms sent dense; "
+              f"dense chart {size(dense_chart)} KiB, chart {size(chart)} KiB, "
+              f"with details {size(tape_chart(start, end, details=True))} KiB")
+
+        repeat = max(1, args.repeat // 10)
+        for name, fn in (('per-date history', lambda: legacy_tape_chart(start, args.days)),
+                         ('tape chart', lambda: json.dumps(tape_chart(start, end))),
+                         ('with details', lambda: json.dumps(tape_chart(start, end, details=True)))):
+            ms, queries = timed(fn, repeat)
+            print(f'{name:>16}: {ms:8.2f} ms, {queries:6.0f} queries per chart')
+
+
+# ==================== CATEGORY INVENTORY ====================
+
+def scanned_category_nights(start, days):
+    """Free rooms per category and night derived from scratch: every room, every overlapping booking."""
+    rooms = {room.id: room.room_type for room in Room.query.filter(Room.maintenance_status == 'operational')}
+    free = {room_type: [count] * days for room_type, count in Counter(rooms.values()).items()}
+    end = start + timedelta(days=days)
+    for booking in Booking.query.filter(Booking.status != 'cancelled', Booking.check_in < end, Booking.check_out > start):
+        if booking.room_id not in rooms:
+            continue
+        nights = free[rooms[booking.room_id]]
+        for offset in range(max((booking.check_in - start).days, 0), min((booking.check_out - start).days, days)):
+            nights[offset] -= 1
+    db.session.expunge_all()
+    return free
+
+
+def bench_inventory(args):
+    """Free rooms per category for each night of a quarter: scanned from bookings vs the inventory table."""
+    from ledger import backfill_room_nights
+    from inventory import category_inventory, rebuild_inventory
+    from sqlalchemy import insert
+
+    app = make_app()
+    rng = random.Random(7)
+    start = date.today()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Room), [
+            {'room_number': str(n), 'room_type': f'Type {n % args.room_types}', 'price_per_night': 100, 'capacity': 2}
+            for n in range(args.rooms)
+        ])
+        room_ids = [room_id for (room_id,) in db.session.query(Room.id)]
+        rows = []
+        for room_id in room_ids:
+            day = rng.randrange(-3, 3)
+            while day < 365:
+                nights = rng.choice((1, 2, 2, 3, 4, 7))
+                check_in = start + timedelta(days=day)
+                rows.append({'room_id': room_id, 'customer_name': 'Guest', 'customer_email': 'guest@example.com',
+                             'customer_phone': '0', 'check_in': check_in, 'check_out': check_in + timedelta(days=nights),
+                             'total_price': 100 * nights, 'status': 'confirmed'})
+                day += nights + rng.choice((0, 1, 2, 3))
+        db.session.execute(insert(Booking), rows)
+        db.session.commit()
+        backfill_room_nights()
+        rebuild_inventory(365)
+
+        end = start + timedelta(days=args.days)
+        inventory = category_inventory(start, end)
+        scanned = scanned_category_nights(start, args.days)
+        agree = all([sellable - sold for _, sellable, sold in inventory[t]] == scanned[t] for t in scanned)
+        print(f"{args.rooms} rooms in {args.room_types} categories, {len(rows)} bookings over a year; "
+              f"{args.days} nights agree: {agree}")
+        for name, fn in (('scan bookings', lambda: scanned_category_nights(start, args.days)),
+                         ('inventory read', lambda: category_inventory(start, end))):
+            ms, queries = timed(fn, args.repeat)
+            print(f'{name:>16}: {ms:8.2f} ms, {queries:6.0f} queries per read')
+
+
+# ==================== BLOCKED INTERVALS ====================
+
+def legacy_blocked(room, check_in, check_out):
+    """A room's availability as it was checked before: the flag, then a maintenance and a booking query."""
+    if room.maintenance_status in ('maintenance', 'closed'):
+        return 'closed'
+    if RoomMaintenance.query.filter(
+        RoomMaintenance.room_id == room.id,
+        RoomMaintenance.status == 'ongoing',
+        RoomMaintenance.start_date < check_out,
+        db.or_(RoomMaintenance.end_date.is_(None), RoomMaintenance.end_date > check_in)
+    ).first():
+        return 'maintenance'
+    if Booking.query.filter(
+        Booking.room_id == room.id,
+        Booking.status != 'cancelled',
+        Booking.check_in < check_out,
+        Booking.check_out > check_in
+    ).first():
+        return 'booked'
+    return None
+
+
+def legacy_free_rooms(room_type, check_in, check_out):
+    return [room.id for room in Room.query.filter(Room.room_type == room_type).order_by(Room.id)
+            if legacy_blocked(room, check_in, check_out) is None]
+
+
+def bench_blocked_intervals(args):
+    """Free rooms of a type for a stay: per-room maintenance + booking queries vs one index lookup."""
+    from availability import availability_index
+    from sqlalchemy import insert
+
+    app = make_app()
+    rng = random.Random(11)
+    today = date.today()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Room), [
+            {'room_number': str(n), 'room_type': f'Type {n % args.room_types}', 'price_per_night': 100, 'capacity': 2,
+             'maintenance_status': 'closed' if rng.random() < 0.02 else 'operational'}
+            for n in range(args.rooms)
+        ])
+        room_ids = [room_id for (room_id,) in db.session.query(Room.id)]
+        bookings, maintenance = [], []
+        for room_id in room_ids:
+            day = rng.randrange(-3, 3)
+            while day < 365:
+                nights = rng.choice((1, 2, 2, 3, 4, 7))
+                check_in = today + timedelta(days=day)
+                bookings.append({'room_id': room_id, 'customer_name': 'Guest', 'customer_email': 'guest@example.com',
+                                 'customer_phone': '0', 'check_in': check_in,
+                                 'check_out': check_in + timedelta(days=nights), 'total_price': 100 * nights,
+                                 'status': 'confirmed'})
+                day += nights + rng.choice((0, 1, 2, 3, 5))
+            if rng.random() < 0.1:
+                start_date = today + timedelta(days=rng.randrange(0, 300))
+                maintenance.append({'room_id': room_id, 'start_date': start_date, 'status': 'ongoing',
+                                    'end_date': None if rng.random() < 0.3 else start_date + timedelta(days=3)})
+        db.session.execute(insert(Booking), bookings)
+        db.session.execute(insert(RoomMaintenance), maintenance)
+        db.session.commit()
+        availability_index.load()
+
+        stays = [(today + timedelta(days=offset), today + timedelta(days=offset + rng.choice((1, 2, 3, 7))))
+                 for offset in (rng.randrange(0, 330) for _ in range(args.repeat))]
+        agree = all(
+            legacy_free_rooms('Type 0', check_in, check_out) == availability_index.free_rooms(check_in, check_out,
+                                                                                               'Type 0')
+            for check_in, check_out in stays
+        )
+        rooms = Room.query.order_by(Room.id).all()
+        agree = agree and all(
+            legacy_blocked(room, check_in, check_out) == availability_index.blocked_by(room.id, check_in, check_out)
+            for room in rooms[:50] for check_in, check_out in stays
+        )
+        db.session.expunge_all()
+        print(f"{args.rooms} rooms in {args.room_types} types, {len(bookings)} bookings, "
+              f"{len(maintenance)} maintenance windows; answers agree: {agree}")
+
+        room = db.session.get(Room, room_ids[0])
+        for label, legacy, indexed in (
+            ('free rooms of a type', lambda stay: legacy_free_rooms('Type 0', *stay),
+             lambda stay: availability_index.free_rooms(*stay, 'Type 0')),
+            ('one room', lambda stay: legacy_blocked(room, *stay),
+             lambda stay: availability_index.blocked_by(room.id, *stay))
+        ):
+            for name, lookup in (('per-room queries', legacy), ('index lookup', indexed)):
+                next_stay = cycle(stays)
+                ms, queries = timed(lambda: lookup(next(next_stay)), args.repeat)
+                print(f'{label:>20}, {name:>16}: {ms:8.3f} ms, {queries:6.0f} queries')
+
+
+# ==================== DATABASE ====================
+
+DB_PROFILES = {
+    # SQLite's own defaults: rollback journal, fsync on every commit, no mmap
+    'default': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'mmap_size': 0, 'cache_size': -2000},
+    'wal': {}
+}
+
+
+def bench_db(args):
+    """Mixed read/write throughput on a file database under each PRAGMA profile."""
+    writers = max(1, args.threads // 4)
+    readers = max(1, args.threads - writers)
+    print(f'{readers} reader and {writers} writer threads, {args.seconds}s per profile')
+    for name, pragmas in DB_PROFILES.items():
+        workdir = tempfile.mkdtemp()
+        app = make_app(f"sqlite:///{os.path.join(workdir, 'db.db')}", **pragmas)
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(Room(room_number=str(n), room_type=f'Type {n % 4}', price_per_night=100,
+                                    capacity=2) for n in range(50))
+            db.session.commit()
+            room_ids = [r.id for r in Room.query.all()]
+            journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+
+        counts = {'reads': 0, 'writes': 0, 'lock_errors': 0}
+        counts_lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+
+        def bump(key):
+            with counts_lock:
+                counts[key] += 1
+
+        def read():
+            with app.app_context():
+                while time.perf_counter() < deadline:
+                    Booking.query.filter(Booking.room_id == random.choice(room_ids),
+                                         Booking.status != 'cancelled').count()
+                    db.session.rollback()
+                    bump('reads')
+
+        def write(seed):
+            rng = random.Random(seed)
+            with app.app_context():
+                while time.perf_counter() < deadline:
+                    check_in = date(2030, 1, 1) + timedelta(days=rng.randrange(365))
+                    db.session.add(Booking(room_id=rng.choice(room_ids), customer_name='Bench',
+                                           customer_email='bench@example.com', customer_phone='0',
+                                           check_in=check_in, check_out=check_in + timedelta(days=2),
+                                           total_price=200, status='pending'))
+                    try:
+                        db.session.commit()
+                        bump('writes')
+                    except OperationalError:
+                        db.session.rollback()
+                        bump('lock_errors')
+
+        threads = [threading.Thread(target=read) for _ in range(readers)]
+        threads += [threading.Thread(target=write, args=(i,)) for i in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        with app.app_context():
+            db.engine.dispose()
+        print(f"{name:>8} (journal_mode={journal_mode}): {counts['reads'] / args.seconds:8.1f} reads/s "
+              f"{counts['writes'] / args.seconds:7.1f} writes/s  {counts['lock_errors']} lock errors")
+
+
+BENCHMARKS = {
+    'pricing': bench_pricing,
+    'login': bench_login,
+    'allocator': bench_allocator,
+    'assignment': bench_assignment,
+    'db': bench_db,
+    'room-board': bench_room_board,
+    'tape-chart': bench_tape_chart,
+    'inventory': bench_inventory,
+    'blocked-intervals': bench_blocked_intervals,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--room-types', type=int, default=4)
+    parser.add_argument('--rooms-per-type', type=int, default=5)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--rooms', type=int, default=500)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--no-locks', action='store_true', help='allocate without reservation locks (baseline)')
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,58 @@
+"""Conditional GET for reference data.
+
+Rooms, categories, holidays and rate rules change a few times a week but are
+polled constantly. Each of those tables has a version counter in the shared
+generation store; the endpoints that write them call table_changed() after
+committing, and the list endpoints carry an ETag built from the version. A
+request whose If-None-Match still matches gets 304 Not Modified before any
+query runs.
+"""
+import os
+from functools import wraps
+
+from flask import make_response, request
+
+from generations import generations
+
+REFERENCE_CACHE_MAX_AGE = int(os.getenv('REFERENCE_CACHE_MAX_AGE', 30))
+
+
+def table_changed(*tables):
+    """Bump the version of each table; call after the commit that changed them."""
+    for table in tables:
+        generations.bump(table)
+
+
+def table_etag(*tables):
+    versions = '.'.join(str(generations.get(t)) for t in tables)
+    return f"{generations.get('epoch'):x}.{versions}"
+
+
+def conditional(*tables, public=False):
+    """Serve the view with an ETag for `tables` and answer matching If-None-Match with 304.
+
+    Public data may be cached by browsers and proxies for REFERENCE_CACHE_MAX_AGE
+    seconds; anything else must be revalidated on every use.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            # Taken before the query: a write racing with it leaves an older
+            # ETag on the new data, which costs one extra download, never a stale 304
+            etag = table_etag(*tables)
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if public:
+                response.cache_control.public = True
+                response.cache_control.max_age = REFERENCE_CACHE_MAX_AGE
+            else:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
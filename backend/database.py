@@ -0,0 +1,101 @@
+"""Database engine configuration.
+
+DATABASE_URL picks the backend (default: SQLite file hotel.db in the instance
+folder). SQLite connections run in WAL mode with a busy timeout, so readers no
+longer wait behind a writer, and write paths wrapped in retry_on_lock() retry
+the rare "database is locked" error with exponential backoff. Any other engine
+gets a sized, pre-pinged, recycled connection pool.
+"""
+import os
+import random
+import time
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+from models import db
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///hotel.db')
+
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64000))  # negative: KiB, so about 64 MB
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+
+DB_LOCK_RETRIES = int(os.getenv('DB_LOCK_RETRIES', 5))
+DB_LOCK_BACKOFF_MS = int(os.getenv('DB_LOCK_BACKOFF_MS', 20))
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for `url`."""
+    if is_sqlite(url):
+        # The driver's own busy handler waits as long as the PRAGMA below
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False}}
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING
+    }
+
+
+def sqlite_pragmas(journal_mode=SQLITE_JOURNAL_MODE, synchronous=SQLITE_SYNCHRONOUS,
+                   busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS, mmap_size=SQLITE_MMAP_SIZE,
+                   cache_size=SQLITE_CACHE_SIZE):
+    """Connect-event listener applying the given PRAGMAs to every new SQLite connection."""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+        if journal_mode:
+            cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+        if synchronous:
+            cursor.execute(f'PRAGMA synchronous = {synchronous}')
+        cursor.execute(f'PRAGMA mmap_size = {int(mmap_size)}')
+        cursor.execute(f'PRAGMA cache_size = {int(cache_size)}')
+        cursor.close()
+    return on_connect
+
+
+def configure_database(app, url=DATABASE_URL, **pragmas):
+    """Point Flask-SQLAlchemy at `url` and tune the engine for its backend."""
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    db.init_app(app)
+    if is_sqlite(url):
+        with app.app_context():
+            event.listen(db.engine, 'connect', sqlite_pragmas(**pragmas))
+
+
+def is_lock_error(error):
+    message = str(error.orig).lower()
+    return 'database is locked' in message or 'database is busy' in message or 'deadlock' in message
+
+
+def retry_on_lock(f):
+    """Re-run a write path, after rolling back, when the database reports a lock conflict."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        for attempt in range(DB_LOCK_RETRIES + 1):
+            try:
+                return f(*args, **kwargs)
+            except OperationalError as e:
+                db.session.rollback()
+                if attempt == DB_LOCK_RETRIES or not is_lock_error(e):
+                    raise
+                delay = DB_LOCK_BACKOFF_MS * (2 ** attempt) / 1000
+                time.sleep(delay + random.uniform(0, delay))
+    return wrapper
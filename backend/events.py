@@ -0,0 +1,239 @@
+"""Booking event stream for staff dashboards.
+
+Booking writes add a BookingEvent row in the same transaction as the change,
+like the email outbox, and call announce_events() after committing. That
+bumps the shared "events" generation, so every worker process learns about
+the write with a memory read instead of a query. One EventBus thread per
+process then loads the new rows once and fans them out to the server-sent
+event streams open in that process.
+
+Every open stream holds a server thread for as long as it lasts, so each
+process serves at most EVENT_MAX_STREAMS of them (by default half of
+WEB_THREADS) and turns further ones away with 503 and a Retry-After, leaving
+the remaining threads to ordinary requests.
+
+Event ids are BookingEvent ids. A reconnecting EventSource sends the last id
+it saw and gets the missed events replayed from the table, which keeps
+EVENT_RETENTION_HOURS of history; a client too far behind is told to resync.
+
+Ids are not commit order everywhere: PostgreSQL and MySQL hand them out at
+insert, so an event can commit after one with a higher id. The bus therefore
+re-reads the last EVENT_REORDER_SECONDS of events on every poll and skips the
+ones it already delivered, and a replay also resends events created within
+that window before the client's last id. Delivery is at least once, and not
+always in id order; clients treat events as "something changed" signals.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from generations import Generation, generations
+from models import db, BookingEvent
+
+EVENT_POLL_SECONDS = float(os.getenv('EVENT_POLL_SECONDS', 0.5))
+EVENT_HEARTBEAT_SECONDS = int(os.getenv('EVENT_HEARTBEAT_SECONDS', 15))
+EVENT_RETENTION_HOURS = int(os.getenv('EVENT_RETENTION_HOURS', 24))
+EVENT_REPLAY_LIMIT = 1000
+# Longest a transaction may sit between writing its event and committing (keep above WEB_TIMEOUT)
+EVENT_REORDER_SECONDS = int(os.getenv('EVENT_REORDER_SECONDS', 60))
+EVENT_QUEUE_SIZE = 1000
+EVENT_RETRY_MS = 3000
+EVENT_BUSY_RETRY_SECONDS = 15  # Retry-After sent when a process has no stream slot left
+EVENT_MAX_STREAMS = int(os.getenv('EVENT_MAX_STREAMS', max(int(os.getenv('WEB_THREADS', 8)) // 2, 1)))
+
+
+def booking_payload(booking):
+    return {
+        'booking_id': booking.id,
+        'booking_group': booking.booking_group,
+        'room_id': booking.room_id,
+        'agent_id': booking.agent_id,
+        'customer_name': booking.customer_name,
+        'check_in': booking.check_in.strftime('%Y-%m-%d'),
+        'check_out': booking.check_out.strftime('%Y-%m-%d'),
+        'status': booking.status,
+        'total_price': booking.total_price
+    }
+
+
+def record_booking_event(kind, *bookings, **extra):
+    """Add one `kind` event per booking (flushed, so it has an id). The caller commits."""
+    for booking in bookings:
+        payload = booking_payload(booking)
+        payload.update(extra)
+        db.session.add(BookingEvent(kind=kind, booking_id=booking.id, payload=json.dumps(payload)))
+
+
+def announce_events():
+    """Tell every process that events were committed; call after the commit."""
+    generations.bump('events')
+    event_bus.wake()
+
+
+def format_event(event_id, kind, payload):
+    return f'id: {event_id}\nevent: {kind}\ndata: {payload}\n\n'
+
+
+def events_after(event_id, limit):
+    """Events a client that last saw `event_id` may have missed, in id order.
+
+    Besides every higher id, this includes lower ids created within
+    EVENT_REORDER_SECONDS before `event_id`, which may have committed after it.
+    """
+    seen_at = db.session.query(BookingEvent.created_at).filter(BookingEvent.id == event_id).scalar()
+    missed = BookingEvent.id > event_id
+    if seen_at is not None:
+        missed = db.or_(missed, db.and_(
+            BookingEvent.id < event_id,
+            BookingEvent.created_at >= seen_at - timedelta(seconds=EVENT_REORDER_SECONDS)
+        ))
+    return db.session.query(BookingEvent.id, BookingEvent.kind, BookingEvent.payload).filter(
+        missed
+    ).order_by(BookingEvent.id).limit(limit).all()
+
+
+def recent_events(since):
+    """(id, kind, payload, created_at) of every event created at or after `since`, in id order."""
+    return db.session.query(BookingEvent.id, BookingEvent.kind, BookingEvent.payload, BookingEvent.created_at).filter(
+        BookingEvent.created_at >= since
+    ).order_by(BookingEvent.id).all()
+
+
+# ==================== EVENT BUS ====================
+
+class Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(EVENT_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class EventBus:
+    """Per-process fan-out of committed booking events to open streams."""
+
+    def __init__(self, max_streams=EVENT_MAX_STREAMS):
+        self.max_streams = max_streams
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._generation = Generation('events')
+        self._delivered = {}  # event id -> created_at, for events inside the reorder window
+        self._since = None    # re-read events created from here on
+        self.last_id = None
+
+    def subscribe(self, app):
+        """A new Subscription, or None when this process already serves max_streams streams."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_streams:
+                return None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(app,), name='event-bus', daemon=True)
+                self._thread.start()
+            subscription = Subscription()
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def wake(self):
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'max_streams': self.max_streams,
+                    'last_event_id': self.last_id}
+
+    def _run(self, app):
+        pruned_at = 0
+        while True:
+            try:
+                with app.app_context():
+                    if self._since is None:
+                        self._start()
+                    if self._generation.is_stale():
+                        self._generation.mark_current()
+                        self._fetch()
+                    if time.time() - pruned_at > 3600:
+                        prune_events()
+                        pruned_at = time.time()
+                    db.session.remove()  # never hold a read snapshot between polls
+            except Exception as e:
+                print(f"Event bus error: {e}")
+            self._wake.wait(EVENT_POLL_SECONDS)
+            self._wake.clear()
+
+    def _start(self):
+        """Treat events written before the bus started as delivered; they are only replayed."""
+        self._generation.mark_current()
+        self._since = datetime.utcnow() - timedelta(seconds=EVENT_REORDER_SECONDS)
+        self._delivered = {event_id: created_at for event_id, _, _, created_at in recent_events(self._since)}
+        self.last_id = max(self._delivered, default=0)
+
+    def _fetch(self):
+        rows = recent_events(self._since)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for event_id, kind, payload, created_at in rows:
+            if event_id in self._delivered:
+                continue
+            self._delivered[event_id] = created_at
+            self.last_id = max(self.last_id or 0, event_id)
+            for subscription in subscribers:
+                try:
+                    subscription.queue.put_nowait((event_id, kind, payload))
+                except queue.Full:
+                    # A stalled client; its stream ends and it resumes from the table
+                    subscription.overflowed = True
+                    self.unsubscribe(subscription)
+        if rows:
+            newest = max(created_at for _, _, _, created_at in rows)
+            self._since = max(self._since, newest - timedelta(seconds=EVENT_REORDER_SECONDS))
+            self._delivered = {event_id: created_at for event_id, created_at in self._delivered.items()
+                               if created_at >= self._since}
+
+
+event_bus = EventBus()
+
+
+def prune_events():
+    cutoff = datetime.utcnow() - timedelta(hours=EVENT_RETENTION_HOURS)
+    BookingEvent.query.filter(BookingEvent.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+
+# ==================== STREAM ====================
+
+def event_stream(app, subscription, last_event_id=None):
+    """Server-sent events for `subscription`: replay after `last_event_id`, then live events and heartbeats."""
+    try:
+        yield f'retry: {EVENT_RETRY_MS}\n\n'
+        replayed = set()  # live events that may repeat the replay
+        if last_event_id is not None:
+            with app.app_context():
+                oldest = db.session.query(db.func.min(BookingEvent.id)).scalar()
+                missed = events_after(last_event_id, EVENT_REPLAY_LIMIT + 1)
+                db.session.remove()
+            if len(missed) > EVENT_REPLAY_LIMIT or (oldest is not None and last_event_id < oldest - 1):
+                # Too far behind (or pruned): the client should reload its lists
+                yield 'event: resync\ndata: {}\n\n'
+            else:
+                for event_id, kind, payload in missed:
+                    yield format_event(event_id, kind, payload)
+                    replayed.add(event_id)
+        while True:
+            try:
+                event_id, kind, payload = subscription.queue.get(timeout=EVENT_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                if subscription.overflowed:
+                    return
+                yield ': heartbeat\n\n'
+                continue
+            if event_id not in replayed:
+                yield format_event(event_id, kind, payload)
+    finally:
+        event_bus.unsubscribe(subscription)
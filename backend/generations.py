@@ -0,0 +1,126 @@
+"""Cross-process cache generations.
+
+Each in-memory cache (availability index, rate calendar, principal cache)
+lives in every worker process. A cache that changes its own copy after a
+commit also bumps its generation here; before serving a read it compares the
+shared generation with the last one it has seen and rebuilds when another
+process has written since. Reference tables get counters too; they version
+the ETags of their list endpoints (see conditional.py).
+
+Generations are 64-bit counters in a small memory-mapped file, so a check is
+one memory read; bumps take an flock so concurrent increments are not lost.
+Until open() is called (scripts and benchmarks that never call create_app())
+the counters are plain process-local integers.
+"""
+import mmap
+import os
+import random
+import struct
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process only
+    fcntl = None
+
+SLOT = struct.Struct('<Q')
+SLOTS = 64
+# Every process must map a name to the same slot: append new names, never reorder
+NAMES = ('availability', 'rates', 'principals', 'epoch', 'rooms', 'room_categories', 'holidays', 'rate_rules',
+         'events', 'room_board')
+
+
+class GenerationStore:
+    """Named counters shared by every process that opens the same file."""
+
+    def __init__(self):
+        self._local = [0] * SLOTS
+        self._local[NAMES.index('epoch')] = self._new_epoch()
+        self._map = None
+        self._fd = None
+        self._guard = threading.Lock()
+
+    def open(self, path):
+        """Share counters through `path` (created if missing)."""
+        self.close()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < SLOT.size * SLOTS:
+            os.ftruncate(fd, SLOT.size * SLOTS)
+        self._map = mmap.mmap(fd, SLOT.size * SLOTS)
+        self._fd = fd
+        with self._locked():
+            if not self.get('epoch'):
+                SLOT.pack_into(self._map, self._slot('epoch') * SLOT.size, self._new_epoch())
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map = self._fd = None
+
+    def _slot(self, name):
+        return NAMES.index(name)
+
+    @staticmethod
+    def _new_epoch():
+        # Tells a fresh file apart from one whose counters happen to match
+        return random.getrandbits(63) | 1
+
+    @contextmanager
+    def _locked(self):
+        with self._guard:
+            if fcntl and self._map is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl and self._map is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def get(self, name):
+        slot = self._slot(name)
+        if self._map is None:
+            return self._local[slot]
+        return SLOT.unpack_from(self._map, slot * SLOT.size)[0]
+
+    def bump(self, name):
+        """Increment `name`; return (previous, new)."""
+        slot = self._slot(name)
+        with self._locked():
+            if self._map is None:
+                previous = self._local[slot]
+                self._local[slot] = previous + 1
+            else:
+                previous = SLOT.unpack_from(self._map, slot * SLOT.size)[0]
+                SLOT.pack_into(self._map, slot * SLOT.size, previous + 1)
+            return previous, previous + 1
+
+    def snapshot(self):
+        return {name: self.get(name) for name in NAMES}
+
+
+generations = GenerationStore()
+
+
+class Generation:
+    """The view one cache has of its shared generation."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seen = generations.get(name)
+
+    def mark_current(self):
+        """Call before reloading from the database."""
+        self.seen = generations.get(self.name)
+
+    def is_stale(self):
+        return generations.get(self.name) != self.seen
+
+    def bump(self):
+        """Record a local write; return False if another process wrote since the last check."""
+        previous, new = generations.bump(self.name)
+        if previous != self.seen:
+            return False
+        self.seen = new
+        return True
@@ -0,0 +1,62 @@
+"""Gunicorn settings for the booking backend.
+
+    gunicorn -c gunicorn.conf.py
+
+Prefork: the master applies pending migrations once, then forks WEB_WORKERS
+processes with WEB_THREADS threads each. The app is not preloaded, so every
+worker builds its own app and database engine after the fork and `kill -HUP
+<master pid>` reloads new code gracefully, letting in-flight requests finish.
+Each worker warms its availability index and rate calendar before it accepts
+requests and runs its own outbox mailer thread.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Every worker starts its own password pool (passwords.py), so the host runs
+# WEB_WORKERS x PASSWORD_WORKERS hashing processes on top of the web workers.
+# The default PASSWORD_WORKERS=1 gives one per web worker; raise it only when
+# WEB_WORKERS is well below the core count, so the product stays near the cores.
+# Each open event stream (/api/events) occupies a thread for as long as the tab is open.
+# A worker serves at most EVENT_MAX_STREAMS streams (default WEB_THREADS // 2) and
+# answers 503 beyond that, so WEB_THREADS - EVENT_MAX_STREAMS threads per worker always
+# stay free for API requests. Size for the staff tabs open at once: WEB_WORKERS x
+# EVENT_MAX_STREAMS must cover them, so raise WEB_THREADS along with EVENT_MAX_STREAMS.
+threads = int(os.getenv('WEB_THREADS', 8))
+worker_class = 'gthread'
+wsgi_app = 'wsgi:app'
+preload_app = False
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+
+
+def on_starting(server):
+    """Runs once in the master before any worker is forked.
+
+    Migrations run in a child process so the master never imports the app:
+    workers then load fresh code on every reload and inherit no connections.
+    """
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], check=True,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def post_worker_init(worker):
+    from app import warm_up
+    from mailer import start_outbox_worker
+
+    warm_up(worker.wsgi)
+    start_outbox_worker(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    from passwords import shutdown
+
+    shutdown()
@@ -0,0 +1,238 @@
+"""Per-category nightly inventory.
+
+CategoryInventory holds, for every room category and night, how many rooms
+can be sold (not flagged under maintenance or closed, and not inside an
+ongoing maintenance window that night) and how many of those are held by a
+booking. Both counts are adjusted in the same transaction as the change
+behind them. The room-night ledger reports every night it claims or releases
+here, room writes call move_room() when a room joins, leaves or changes
+category, and maintenance edits call move_maintenance(). "How many Deluxe
+rooms are free each night next quarter" is then one indexed range read.
+
+Rows are created from the source tables the first time a night is read (or
+by rebuild_inventory()); writes only adjust rows that already exist, so a
+night nobody has looked at yet costs nothing to keep current.
+"""
+import os
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, CategoryInventory, Room, RoomCategory, RoomMaintenance, RoomNight
+
+INVENTORY_HORIZON_DAYS = int(os.getenv('INVENTORY_HORIZON_DAYS', 730))
+UNSELLABLE = ('maintenance', 'closed')
+
+
+def sellable_category(room):
+    """The category whose inventory `room` counts towards, or None while it is out of service."""
+    return None if room.maintenance_status in UNSELLABLE else room.room_type
+
+
+def maintenance_window(record):
+    """(start_date, end_date or None) of an ongoing maintenance record, None once it no longer blocks."""
+    return (record.start_date, record.end_date) if record.status == 'ongoing' else None
+
+
+def under_maintenance(room_id, night, exclude_id=None):
+    """SQL condition: an ongoing maintenance record of `room_id` (other than `exclude_id`) covers `night`."""
+    conditions = [
+        RoomMaintenance.room_id == room_id,
+        RoomMaintenance.status == 'ongoing',
+        RoomMaintenance.start_date <= night,
+        db.or_(RoomMaintenance.end_date.is_(None), RoomMaintenance.end_date > night)
+    ]
+    if exclude_id is not None:
+        conditions.append(RoomMaintenance.id != exclude_id)
+    return select(RoomMaintenance.id).where(*conditions).exists()
+
+
+# ==================== WRITE PATH ====================
+
+def count_nights(nights, sign):
+    """Add `sign` to `sold` for each {'room_id', 'night'} in `nights` whose room is sellable that night."""
+    if not nights:
+        return
+    room_ids = {n['room_id'] for n in nights}
+    rooms = dict(db.session.query(Room.id, Room.room_type).filter(
+        Room.id.in_(room_ids),
+        Room.maintenance_status.notin_(UNSELLABLE)
+    ))
+    windows = defaultdict(list)
+    for room_id, start_date, end_date in db.session.query(
+        RoomMaintenance.room_id, RoomMaintenance.start_date, RoomMaintenance.end_date
+    ).filter(RoomMaintenance.room_id.in_(room_ids), RoomMaintenance.status == 'ongoing'):
+        windows[room_id].append((start_date, end_date))
+    deltas = Counter(
+        (rooms[n['room_id']], n['night']) for n in nights
+        if n['room_id'] in rooms and not any(
+            start_date <= n['night'] and (end_date is None or n['night'] < end_date)
+            for start_date, end_date in windows[n['room_id']]
+        )
+    )
+    if not deltas:
+        return
+    stmt = update(CategoryInventory).where(
+        CategoryInventory.category == bindparam('b_category'),
+        CategoryInventory.night == bindparam('b_night')
+    ).values(sold=CategoryInventory.sold + bindparam('b_delta'))
+    db.session.connection().execute(stmt, [
+        {'b_category': category, 'b_night': night, 'b_delta': sign * count}
+        for (category, night), count in deltas.items()
+    ])
+
+
+def move_room(room_id, before, after):
+    """Move a room's inventory from category `before` to `after` (None: not sellable).
+
+    The room's held nights move with it; nights inside one of its ongoing
+    maintenance windows are not counted in either category. Call before its
+    nights are released when the room is being deleted.
+    """
+    if before == after:
+        return
+    for category, sign in ((before, -1), (after, 1)):
+        if category is None:
+            continue
+        _adjust(room_id, sign, CategoryInventory.category == category,
+                ~under_maintenance(room_id, CategoryInventory.night))
+
+
+def move_maintenance(room_id, category, maintenance_id, before, after):
+    """Re-count a room's nights when maintenance record `maintenance_id` changes from window `before` to `after`.
+
+    Windows are (start_date, end_date or None) while the record is ongoing and
+    None otherwise; `category` is the room's sellable_category(). Nights
+    another ongoing record covers are left alone.
+    """
+    if before == after or category is None:
+        return
+    for window, sign in ((before, 1), (after, -1)):
+        if window is None:
+            continue
+        start_date, end_date = window
+        conditions = [
+            CategoryInventory.category == category,
+            CategoryInventory.night >= start_date,
+            ~under_maintenance(room_id, CategoryInventory.night, exclude_id=maintenance_id)
+        ]
+        if end_date is not None:
+            conditions.append(CategoryInventory.night < end_date)
+        _adjust(room_id, sign, *conditions)
+
+
+def _adjust(room_id, sign, *conditions):
+    """Add `sign` to `sellable` of the rows matching `conditions`, and to `sold` where `room_id` holds the night."""
+    CategoryInventory.query.filter(*conditions).update(
+        {CategoryInventory.sellable: CategoryInventory.sellable + sign}, synchronize_session=False
+    )
+    CategoryInventory.query.filter(
+        *conditions,
+        CategoryInventory.night.in_(select(RoomNight.night).where(RoomNight.room_id == room_id))
+    ).update({CategoryInventory.sold: CategoryInventory.sold + sign}, synchronize_session=False)
+
+
+# ==================== READ PATH ====================
+
+def inventory_categories():
+    names = set(db.session.scalars(select(RoomCategory.name)))
+    names.update(db.session.scalars(select(Room.room_type).distinct()))
+    return sorted(names)
+
+
+def materialize(start, end, categories):
+    """Create the missing rows of `categories` for nights in [start, end) from rooms and the ledger."""
+    existing = set(db.session.query(CategoryInventory.category, CategoryInventory.night).filter(
+        CategoryInventory.category.in_(categories),
+        CategoryInventory.night >= start,
+        CategoryInventory.night < end
+    ))
+    sellable = dict(db.session.query(Room.room_type, db.func.count(Room.id)).filter(
+        Room.maintenance_status.notin_(UNSELLABLE)
+    ).group_by(Room.room_type))
+    under_repair = defaultdict(set)  # (category, night) -> sellable rooms inside a maintenance window
+    for category, room_id, start_date, end_date in db.session.query(
+        Room.room_type, RoomMaintenance.room_id, RoomMaintenance.start_date, RoomMaintenance.end_date
+    ).join(Room, Room.id == RoomMaintenance.room_id).filter(
+        Room.maintenance_status.notin_(UNSELLABLE),
+        RoomMaintenance.status == 'ongoing',
+        RoomMaintenance.start_date < end,
+        db.or_(RoomMaintenance.end_date.is_(None), RoomMaintenance.end_date > start)
+    ):
+        night, stop = max(start_date, start), min(end_date or end, end)
+        while night < stop:
+            under_repair[(category, night)].add(room_id)
+            night += timedelta(days=1)
+    sold = {
+        (category, night): count for category, night, count in db.session.query(
+            Room.room_type, RoomNight.night, db.func.count(RoomNight.id)
+        ).join(Room, Room.id == RoomNight.room_id).filter(
+            Room.maintenance_status.notin_(UNSELLABLE),
+            RoomNight.night >= start,
+            RoomNight.night < end,
+            ~under_maintenance(RoomNight.room_id, RoomNight.night)
+        ).group_by(Room.room_type, RoomNight.night)
+    }
+    rows = [
+        {'category': category, 'night': night,
+         'sellable': sellable.get(category, 0) - len(under_repair.get((category, night), ())),
+         'sold': sold.get((category, night), 0)}
+        for category in categories
+        for night in (start + timedelta(days=offset) for offset in range((end - start).days))
+        if (category, night) not in existing
+    ]
+    if not rows:
+        return 0
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(CategoryInventory), rows)
+    except IntegrityError:
+        # Another transaction created some of them first
+        return materialize(start, end, categories)
+    return len(rows)
+
+
+def category_inventory(start, end, category=None):
+    """{category: [(night, sellable, sold), ...]} for the nights in [start, end).
+
+    Nights never stored before are created (and committed) first.
+    """
+    categories = [name for name in inventory_categories() if category in (None, name)]
+
+    def read():
+        query = db.session.query(
+            CategoryInventory.category, CategoryInventory.night, CategoryInventory.sellable, CategoryInventory.sold
+        ).filter(
+            CategoryInventory.category.in_(categories),
+            CategoryInventory.night >= start,
+            CategoryInventory.night < end
+        )
+        return query.order_by(CategoryInventory.category, CategoryInventory.night).all()
+
+    rows = read()
+    if len(rows) < len(categories) * (end - start).days:
+        materialize(start, end, categories)
+        db.session.commit()
+        rows = read()
+
+    result = {name: [] for name in categories}
+    for name, night, sellable, sold in rows:
+        result[name].append((night, sellable, sold))
+    return result
+
+
+def rebuild_inventory(horizon_days=INVENTORY_HORIZON_DAYS, commit=True):
+    """Recreate every row from rooms and the ledger, from the first held night to `horizon_days` ahead.
+
+    Committed unless `commit` is False, as migrations pass.
+    """
+    today = date.today()
+    first_night = db.session.query(db.func.min(RoomNight.night)).scalar()
+    start = min(first_night, today) if first_night else today
+    CategoryInventory.query.delete()
+    written = materialize(start, today + timedelta(days=horizon_days), inventory_categories())
+    if commit:
+        db.session.commit()
+    return written
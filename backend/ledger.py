@@ -0,0 +1,117 @@
+"""Room-night ledger.
+
+Every night a room is held by a non-cancelled booking is a RoomNight row,
+written in the same transaction as the booking change. The unique
+(room_id, night) key makes the database itself reject a second booking of the
+same room-night, whatever process or code path tries to insert it, and lets
+availability and occupancy questions be answered with indexed counts. Every
+claim and release is also counted in the per-category inventory (inventory.py).
+"""
+from datetime import timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from inventory import count_nights
+from models import db, Booking, Room, RoomNight
+
+
+class NightsTaken(Exception):
+    """At least one requested room-night is already held by another booking."""
+
+
+def stay_nights(check_in, check_out):
+    for offset in range((check_out - check_in).days):
+        yield check_in + timedelta(days=offset)
+
+
+def claim_nights(*bookings):
+    """Hold the nights of `bookings` (flushed, so they have ids) in one bulk insert.
+
+    Raises NightsTaken if any of them is already held; nothing is claimed then.
+    """
+    rows = [
+        {'room_id': b.room_id, 'night': night, 'booking_id': b.id}
+        for b in bookings if b.status != 'cancelled'
+        for night in stay_nights(b.check_in, b.check_out)
+    ]
+    if not rows:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(RoomNight), rows)
+    except IntegrityError as e:
+        raise NightsTaken() from e
+    count_nights(rows, 1)
+
+
+def release_nights(*bookings):
+    ids = [b.id for b in bookings]
+    if ids:
+        held = RoomNight.query.filter(RoomNight.booking_id.in_(ids))
+        nights = held.with_entities(RoomNight.room_id, RoomNight.night).all()
+        count_nights([{'room_id': room_id, 'night': night} for room_id, night in nights], -1)
+        held.delete(synchronize_session=False)
+
+
+def sync_nights(booking, old_status, old_room_id):
+    """Bring the ledger in line with a booking's status change or room move."""
+    was_held = old_status != 'cancelled'
+    is_held = booking.status != 'cancelled'
+    moved = booking.room_id != old_room_id
+    if was_held and (moved or not is_held):
+        release_nights(booking)
+    if is_held and (moved or not was_held):
+        claim_nights(booking)
+
+
+def release_room(room_id):
+    """Drop a deleted room's nights; its inventory goes with inventory.move_room(), called first."""
+    RoomNight.query.filter_by(room_id=room_id).delete(synchronize_session=False)
+
+
+# ==================== READS ====================
+
+def rooms_sold(start, end, room_type=None):
+    """{night: rooms held} for every night in [start, end) with at least one booking."""
+    query = db.session.query(RoomNight.night, db.func.count(RoomNight.id)).filter(
+        RoomNight.night >= start,
+        RoomNight.night < end
+    )
+    if room_type:
+        query = query.join(Room, Room.id == RoomNight.room_id).filter(Room.room_type == room_type)
+    return dict(query.group_by(RoomNight.night).all())
+
+
+# ==================== BACKFILL ====================
+
+def backfill_room_nights(commit=True):
+    """Rebuild the ledger from Booking; return (nights written, ids of overlapping bookings).
+
+    Where existing bookings overlap, the earliest created one keeps the night and
+    the others are reported so they can be moved or cancelled by hand. Migrations
+    pass commit=False to keep the rebuild in their own transaction.
+    """
+    RoomNight.__table__.create(db.session.connection(), checkfirst=True)
+    RoomNight.query.delete()
+    held = set()
+    rows = []
+    conflicts = []
+    bookings = db.session.query(Booking.id, Booking.room_id, Booking.check_in, Booking.check_out).filter(
+        Booking.status != 'cancelled'
+    ).order_by(Booking.created_at, Booking.id)
+    for booking_id, room_id, check_in, check_out in bookings:
+        clashed = False
+        for night in stay_nights(check_in, check_out):
+            if (room_id, night) in held:
+                clashed = True
+                continue
+            held.add((room_id, night))
+            rows.append({'room_id': room_id, 'night': night, 'booking_id': booking_id})
+        if clashed:
+            conflicts.append(booking_id)
+    if rows:
+        db.session.execute(insert(RoomNight), rows)
+    if commit:
+        db.session.commit()
+    return len(rows), conflicts
@@ -0,0 +1,314 @@
+"""Email outbox and background sender.
+
+Endpoints never talk to the mail server. They queue an EmailOutbox row in the
+same transaction as the booking change, and a small pool of worker threads
+drains the outbox over reused SMTP connections, retrying failed messages with
+exponential backoff.
+
+Set SMTP_HOST/SMTP_PORT (and SMTP_STARTTLS=0) to point at a local stand-in,
+for example `python -m aiosmtpd -n -l localhost:1025`.
+"""
+import os
+import queue
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from models import db, EmailOutbox
+
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') == '1'
+SMTP_TIMEOUT = int(os.getenv('SMTP_TIMEOUT', 10))
+MAIL_WORKERS = int(os.getenv('MAIL_WORKERS', 2))
+MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 6))
+MAIL_BACKOFF_SECONDS = int(os.getenv('MAIL_BACKOFF_SECONDS', 30))
+MAIL_POLL_SECONDS = 5
+MAIL_LEASE_SECONDS = 300
+MAIL_BATCH_SIZE = 20
+SMTP_IDLE_CHECK_SECONDS = 60
+
+
+def sender_address():
+    return os.getenv('EMAIL_ADDRESS', 'your-email@gmail.com')
+
+
+def sender_password():
+    return os.getenv('EMAIL_PASSWORD', 'your-password')
+
+
+def mail_configured():
+    """Real credentials, or an explicitly configured (local) SMTP host."""
+    has_credentials = sender_address() != 'your-email@gmail.com' and sender_password() != 'your-password'
+    return has_credentials or 'SMTP_HOST' in os.environ
+
+
+# ==================== QUEUEING ====================
+
+def queue_email(recipient, subject, body):
+    if not mail_configured():
+        print(f"Email skipped - credentials not configured: {subject}")
+        return None
+    message = EmailOutbox(recipient=recipient, subject=subject, body=body)
+    db.session.add(message)
+    return message
+
+
+def queue_booking_notification(bookings):
+    """Queue one staff notification for a booking, or for a whole multi-room group."""
+    if not bookings:
+        return None
+    first = bookings[0]
+    if len(bookings) == 1:
+        subject = f'New Booking - {first.customer_name}'
+        stay = f"""Room: {first.room.room_number} ({first.room.room_type})
+        Check-in: {first.check_in}
+        Check-out: {first.check_out}"""
+    else:
+        subject = f'New Booking - {first.customer_name} ({len(bookings)} rooms)'
+        stay = 'Rooms:\n' + '\n'.join(
+            f"        - {b.room.room_number} ({b.room.room_type}) {b.check_in} to {b.check_out}: RM{b.total_price}"
+            for b in bookings
+        )
+    total = round(sum(b.total_price for b in bookings), 2)
+
+    body = f"""
+        New booking received:
+
+        Customer: {first.customer_name}
+        Email: {first.customer_email}
+        Phone: {first.customer_phone}
+        {stay}
+        Total: RM{total}
+        """
+    return queue_email(sender_address(), subject, body)
+
+
+def queue_confirmation_email(booking):
+    body = f"""
+        Dear {booking.customer_name},
+
+        Your booking has been confirmed!
+
+        Booking Details:
+        Booking ID: {booking.id}
+        Room: {booking.room.room_number} ({booking.room.room_type})
+        Check-in: {booking.check_in}
+        Check-out: {booking.check_out}
+        Total Amount: RM{booking.total_price}
+
+        Thank you for choosing our hotel. We look forward to welcoming you!
+
+        Best regards,
+        Hotel Management
+        """
+    return queue_email(booking.customer_email, f'Booking Confirmed - {booking.room.room_type}', body)
+
+
+def queue_room_change_email(booking, old_room):
+    body = f"""
+        Dear {booking.customer_name},
+
+        Your room for booking {booking.id} has changed.
+
+        Previous room: {old_room.room_number} ({old_room.room_type})
+        New room: {booking.room.room_number} ({booking.room.room_type})
+        Check-in: {booking.check_in}
+        Check-out: {booking.check_out}
+
+        Your dates and price are unchanged. We look forward to welcoming you!
+
+        Best regards,
+        Hotel Management
+        """
+    return queue_email(booking.customer_email, f'Room Change - Booking {booking.id}', body)
+
+
+# ==================== DELIVERY ====================
+
+class SMTPConnectionPool:
+    """Keeps logged-in SMTP connections open between messages."""
+
+    def __init__(self, size=MAIL_WORKERS):
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            server.starttls()
+        if sender_password() != 'your-password':
+            server.login(sender_address(), sender_password())
+        return server
+
+    def acquire(self):
+        try:
+            server, idle_since = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        if time.monotonic() - idle_since > SMTP_IDLE_CHECK_SECONDS:
+            try:
+                server.noop()
+            except smtplib.SMTPException:
+                self.discard(server)
+                return self._connect()
+        return server
+
+    def release(self, server):
+        try:
+            self._idle.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self.discard(server)
+
+    def discard(self, server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(server)
+
+
+def build_message(outbox):
+    msg = MIMEMultipart()
+    msg['From'] = sender_address()
+    msg['To'] = outbox.recipient
+    msg['Subject'] = outbox.subject
+    msg.attach(MIMEText(outbox.body, 'plain'))
+    return msg
+
+
+def claim_batch(limit=MAIL_BATCH_SIZE):
+    """Lease up to `limit` due messages. Safe to call from several threads or processes."""
+    now = datetime.utcnow()
+    due = db.session.query(EmailOutbox.id).filter(
+        EmailOutbox.status.in_(('pending', 'sending')),
+        EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.next_attempt_at).limit(limit).all()
+
+    claimed = []
+    for (message_id,) in due:
+        # Conditional update: only one claimant wins each row
+        won = EmailOutbox.query.filter(
+            EmailOutbox.id == message_id,
+            EmailOutbox.status.in_(('pending', 'sending')),
+            EmailOutbox.next_attempt_at <= now
+        ).update({
+            EmailOutbox.status: 'sending',
+            EmailOutbox.next_attempt_at: now + timedelta(seconds=MAIL_LEASE_SECONDS)
+        }, synchronize_session=False)
+        if won:
+            claimed.append(message_id)
+    db.session.commit()
+    return EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).all() if claimed else []
+
+
+def deliver(messages, pool):
+    """Send leased messages over one pooled connection and record the outcome."""
+    server = None
+    for message in messages:
+        try:
+            if server is None:
+                server = pool.acquire()
+            server.send_message(build_message(message))
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+        except Exception as e:
+            # Any failure counts as an attempt, so a message that can never be
+            # sent backs off and ends up 'failed' instead of being re-leased forever
+            if server is not None:
+                pool.discard(server)
+                server = None
+            message.attempts = (message.attempts or 0) + 1
+            message.last_error = str(e)
+            if message.attempts >= MAIL_MAX_ATTEMPTS:
+                message.status = 'failed'
+            else:
+                message.status = 'pending'
+                backoff = MAIL_BACKOFF_SECONDS * 2 ** (message.attempts - 1)
+                message.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+            print(f"Failed to send email {message.id} (attempt {message.attempts}): {e}")
+        db.session.commit()
+    if server is not None:
+        pool.release(server)
+
+
+def drain_outbox(pool=None):
+    """Send everything currently due; returns the number of messages attempted."""
+    own_pool = pool is None
+    pool = pool or SMTPConnectionPool(size=1)
+    attempted = 0
+    try:
+        while True:
+            messages = claim_batch()
+            if not messages:
+                return attempted
+            deliver(messages, pool)
+            attempted += len(messages)
+    finally:
+        if own_pool:
+            pool.close()
+
+
+class OutboxWorker:
+    """Background threads that keep draining the outbox."""
+
+    def __init__(self, app, workers=MAIL_WORKERS):
+        self.app = app
+        self.workers = workers
+        self.pool = SMTPConnectionPool(size=workers)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'outbox-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self.pool.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    drain_outbox(self.pool)
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+            self._wake.wait(MAIL_POLL_SECONDS)
+            self._wake.clear()
+
+
+_worker = None
+
+
+def start_outbox_worker(app, workers=MAIL_WORKERS):
+    global _worker
+    if _worker is None:
+        _worker = OutboxWorker(app, workers)
+        _worker.start()
+    return _worker
+
+
+def wake_outbox_worker():
+    """Nudge the in-process worker after committing new outbox rows."""
+    if _worker is not None:
+        _worker.wake()
@@ -0,0 +1,235 @@
+"""Versioned schema migrations.
+
+MIGRATIONS is an ordered list of (version, name, function). upgrade() applies
+every migration newer than the highest version in the schema_version table,
+committing each one together with its schema_version row (migrations never
+commit themselves, so one that fails leaves nothing behind), so startup against
+an up-to-date database is a single indexed read. Migrations only add tables,
+columns and indexes and check before creating anything, which also lets them
+bring a database created by the old drop-and-recreate startup up to date.
+
+New schema changes get a new migration appended to the list; existing
+migrations are never edited.
+"""
+from sqlalchemy import (Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table,
+                        Text, inspect, text)
+
+from models import (db, AgentDailyStats, Booking, BookingEvent, CategoryInventory, DashboardCounter, EmailOutbox, Room,
+                    RoomNight, SchemaVersion)
+
+
+def _connection():
+    return db.session.connection()
+
+
+def _columns(table):
+    return {c['name'] for c in inspect(_connection()).get_columns(table)}
+
+
+def _create_index(name, table, *columns):
+    """CREATE INDEX unless an index of that name exists; independent of the current models."""
+    shape = Table(table, MetaData(), *(Column(c) for c in columns))
+    Index(name, *(shape.c[c] for c in columns)).create(_connection(), checkfirst=True)
+
+
+# ==================== BASELINE SCHEMA ====================
+# The tables as the first release created them, frozen here so migration 1
+# builds the same schema whatever the models look like today. Later columns,
+# indexes and tables belong to the migrations that introduced them.
+
+def baseline_metadata():
+    metadata = MetaData()
+    Table('room_category', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), unique=True, nullable=False),
+          Column('description', Text),
+          Column('base_price', Float, nullable=False),
+          Column('capacity', Integer, nullable=False),
+          Column('created_at', DateTime))
+    Table('room', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('room_number', String(10), unique=True, nullable=False),
+          Column('room_type', String(50), nullable=False),
+          Column('price_per_night', Float, nullable=False),
+          Column('capacity', Integer, nullable=False),
+          Column('description', Text),
+          Column('image_url', String(500)),
+          Column('amenities', Text),
+          Column('maintenance_status', String(20)),
+          Column('category_id', Integer, ForeignKey('room_category.id'), nullable=True))
+    Table('agent', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('email', String(100), unique=True, nullable=False),
+          Column('phone', String(20), nullable=False),
+          Column('company', String(100)),
+          Column('password_hash', String(256), nullable=True),
+          Column('status', String(20)),
+          Column('created_at', DateTime))
+    Table('user', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('email', String(100), unique=True, nullable=False),
+          Column('password_hash', String(256), nullable=False),
+          Column('role', String(20)),
+          Column('status', String(20)),
+          Column('created_at', DateTime))
+    Table('booking', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('room_id', Integer, ForeignKey('room.id'), nullable=False),
+          Column('agent_id', Integer, ForeignKey('agent.id'), nullable=True),
+          Column('user_id', Integer, ForeignKey('user.id'), nullable=True),
+          Column('customer_name', String(100), nullable=False),
+          Column('customer_email', String(100), nullable=False),
+          Column('customer_phone', String(20), nullable=False),
+          Column('check_in', Date, nullable=False),
+          Column('check_out', Date, nullable=False),
+          Column('total_price', Float, nullable=False),
+          Column('status', String(20)),
+          Column('receipt_url', String(500), nullable=True),
+          Column('created_at', DateTime),
+          Column('read_by_employee', Boolean),
+          Column('booking_group', String(36), nullable=True))
+    Table('room_maintenance', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('room_id', Integer, ForeignKey('room.id'), nullable=False),
+          Column('start_date', Date, nullable=False),
+          Column('end_date', Date, nullable=True),
+          Column('reason', Text),
+          Column('status', String(20)),
+          Column('created_at', DateTime))
+    Table('holiday', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('date', Date, unique=True, nullable=False),
+          Column('rate_multiplier', Float),
+          Column('is_blackout', Boolean),
+          Column('created_at', DateTime))
+    Table('rate_rule', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('room_category', String(100), nullable=True),
+          Column('start_date', Date, nullable=False),
+          Column('end_date', Date, nullable=False),
+          Column('rate_multiplier', Float, nullable=False),
+          Column('is_active', Boolean),
+          Column('created_at', DateTime),
+          Column('created_by', Integer, ForeignKey('user.id'), nullable=True))
+    Table('rate_audit_log', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('rate_rule_id', Integer, ForeignKey('rate_rule.id'), nullable=False),
+          Column('action', String(20), nullable=False),
+          Column('old_values', Text, nullable=True),
+          Column('new_values', Text, nullable=True),
+          Column('changed_by', Integer, ForeignKey('user.id'), nullable=True),
+          Column('changed_at', DateTime))
+    return metadata
+
+
+# ==================== MIGRATIONS ====================
+
+def create_tables():
+    """The baseline tables that do not exist yet."""
+    baseline_metadata().create_all(_connection())
+
+
+def booking_room_pinning():
+    if 'room_pinned' not in _columns('booking'):
+        db.session.execute(text('ALTER TABLE booking ADD COLUMN room_pinned BOOLEAN DEFAULT 0'))
+    _create_index('ix_booking_booking_group', 'booking', 'booking_group')
+
+
+def fill_derived_tables():
+    """Build the room-night ledger, agent rollup and dashboard counters for bookings made before they existed."""
+    from ledger import backfill_room_nights
+    from rollups import rebuild_agent_stats, reconcile_counters
+
+    for model in (RoomNight, AgentDailyStats, DashboardCounter):
+        model.__table__.create(_connection(), checkfirst=True)
+    if db.session.query(Booking.id).first() is not None:
+        if db.session.query(RoomNight.id).first() is None:
+            backfill_room_nights(commit=False)
+        if db.session.query(AgentDailyStats.id).first() is None:
+            rebuild_agent_stats(commit=False)
+    reconcile_counters(commit=False)
+
+
+def hot_query_indexes():
+    # Holiday.date needs none: its unique constraint is already an index
+    _create_index('ix_booking_room_status_dates', 'booking', 'room_id', 'status', 'check_in', 'check_out')
+    _create_index('ix_booking_check_in', 'booking', 'check_in', 'check_out')
+    _create_index('ix_booking_customer_email', 'booking', 'customer_email')
+    _create_index('ix_booking_agent_id', 'booking', 'agent_id')
+    _create_index('ix_rate_rule_dates', 'rate_rule', 'start_date', 'end_date')
+    _create_index('ix_rate_rule_room_category', 'rate_rule', 'room_category')
+
+
+def booking_events():
+    BookingEvent.__table__.create(_connection(), checkfirst=True)
+
+
+def category_inventory():
+    from inventory import rebuild_inventory
+
+    CategoryInventory.__table__.create(_connection(), checkfirst=True)
+    if db.session.query(Room.id).first() is not None:
+        rebuild_inventory(commit=False)
+
+
+def dashboard_counters():
+    """Seed the dashboard counters from Booking, so writes before the first dashboard read start from the truth."""
+    from rollups import reconcile_counters
+
+    reconcile_counters(commit=False)
+
+
+def email_outbox():
+    EmailOutbox.__table__.create(_connection(), checkfirst=True)
+
+
+def sharded_dashboard_counters():
+    """The counters moved to dashboard_counter_shard (created by fill_derived_tables); drop the old table."""
+    DashboardCounter.__table__.create(_connection(), checkfirst=True)
+    if inspect(_connection()).has_table('dashboard_counter'):
+        db.session.execute(text('DROP TABLE dashboard_counter'))
+
+
+MIGRATIONS = [
+    (1, 'create_tables', create_tables),
+    (2, 'booking_room_pinning', booking_room_pinning),
+    (3, 'fill_derived_tables', fill_derived_tables),
+    (4, 'hot_query_indexes', hot_query_indexes),
+    (5, 'booking_events', booking_events),
+    (6, 'category_inventory', category_inventory),
+    (7, 'dashboard_counters', dashboard_counters),
+    (8, 'email_outbox', email_outbox),
+    (9, 'sharded_dashboard_counters', sharded_dashboard_counters),
+]
+
+
+# ==================== RUNNER ====================
+
+def current_version():
+    SchemaVersion.__table__.create(_connection(), checkfirst=True)
+    return db.session.query(db.func.max(SchemaVersion.version)).scalar() or 0
+
+
+def pending_migrations():
+    version = current_version()
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def upgrade():
+    """Apply pending migrations in order; return the (version, name) pairs applied."""
+    applied = []
+    for version, name, migrate in pending_migrations():
+        try:
+            migrate()
+            db.session.add(SchemaVersion(version=version, name=name))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        applied.append((version, name))
+    db.session.commit()
+    return applied
@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from passwords import hash_password
 
 db = SQLAlchemy()
 
@@ -54,10 +56,10 @@ class Room(db.Model):
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
-    agent_id = db.Column(db.Integer, db.ForeignKey('agent.id'), nullable=True)  # null if direct customer booking
+    agent_id = db.Column(db.Integer, db.ForeignKey('agent.id'), nullable=True, index=True)  # null if direct customer booking
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # linked registered customer
     customer_name = db.Column(db.String(100), nullable=False)
-    customer_email = db.Column(db.String(100), nullable=False)
+    customer_email = db.Column(db.String(100), nullable=False, index=True)
     customer_phone = db.Column(db.String(20), nullable=False)
     check_in = db.Column(db.Date, nullable=False)
     check_out = db.Column(db.Date, nullable=False)
@@ -66,14 +68,17 @@ class Booking(db.Model):
     receipt_url = db.Column(db.String(500), nullable=True)  # path to uploaded receipt
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     read_by_employee = db.Column(db.Boolean, default=False)
-    booking_group = db.Column(db.String(36), nullable=True)
+    booking_group = db.Column(db.String(36), nullable=True, index=True)
+    room_pinned = db.Column(db.Boolean, default=False)  # keep this room when assignments are re-optimized
+    __table_args__ = (
+        db.Index('ix_booking_room_status_dates', 'room_id', 'status', 'check_in', 'check_out'),
+        db.Index('ix_booking_check_in', 'check_in', 'check_out'),
+    )
 
     def to_dict(self):
         agent_name = None
-        if self.agent_id:
-            agent = Agent.query.get(self.agent_id)
-            if agent:
-                agent_name = agent.name
+        if self.agent_id and self.agent:
+            agent_name = self.agent.name
 
         return {
             'id': self.id,
@@ -94,7 +99,8 @@ class Booking(db.Model):
             'booking_type': 'Agent' if self.agent_id else 'Guest',
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'read_by_employee': self.read_by_employee,
-            'booking_group': self.booking_group
+            'booking_group': self.booking_group,
+            'room_pinned': bool(self.room_pinned)
         }
 
 class Agent(db.Model):
@@ -109,7 +115,7 @@ class Agent(db.Model):
     bookings = db.relationship('Booking', backref='agent', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         if not self.password_hash:
@@ -166,7 +172,7 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -202,7 +208,7 @@ class Holiday(db.Model):
 class RateRule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    room_category = db.Column(db.String(100), nullable=True)  # null = applies to all
+    room_category = db.Column(db.String(100), nullable=True, index=True)  # null = applies to all
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     rate_multiplier = db.Column(db.Float, nullable=False)
@@ -210,13 +216,13 @@ class RateRule(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     audit_logs = db.relationship('RateAuditLog', backref='rate_rule', lazy=True)
+    creator = db.relationship('User', foreign_keys=[created_by], lazy=True)
+    __table_args__ = (db.Index('ix_rate_rule_dates', 'start_date', 'end_date'),)
 
     def to_dict(self):
         creator = None
-        if self.created_by:
-            user = User.query.get(self.created_by)
-            if user:
-                creator = user.name
+        if self.created_by and self.creator:
+            creator = self.creator.name
         return {
             'id': self.id,
             'name': self.name,
@@ -238,13 +244,12 @@ class RateAuditLog(db.Model):
     new_values = db.Column(db.Text, nullable=True)  # JSON string
     changed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    changer = db.relationship('User', foreign_keys=[changed_by], lazy=True)
 
     def to_dict(self):
         changer = None
-        if self.changed_by:
-            user = User.query.get(self.changed_by)
-            if user:
-                changer = user.name
+        if self.changed_by and self.changer:
+            changer = self.changer.name
         return {
             'id': self.id,
             'rate_rule_id': self.rate_rule_id,
@@ -255,3 +260,105 @@ class RateAuditLog(db.Model):
             'changed_by_name': changer,
             'changed_at': self.changed_at.strftime('%Y-%m-%d %H:%M:%S')
         }
+
+
+class AgentDailyStats(db.Model):
+    """Per-agent, per-day booking counts and value by status, kept current on every booking write."""
+    id = db.Column(db.Integer, primary_key=True)
+    agent_id = db.Column(db.Integer, db.ForeignKey('agent.id'), nullable=False, index=True)
+    day = db.Column(db.Date, nullable=False)  # date the bookings were made
+    status = db.Column(db.String(20), nullable=False)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)  # sum of total_price
+    __table_args__ = (db.UniqueConstraint('agent_id', 'day', 'status'),)
+
+class DashboardCounter(db.Model):
+    """One shard of a named running total behind the dashboard (booking counts, revenue, unread).
+
+    A counter's value is the sum of its shards; writers spread over the shards
+    so concurrent bookings do not all update the same row.
+    """
+    __tablename__ = 'dashboard_counter_shard'
+    name = db.Column(db.String(50), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+class EmailOutbox(db.Model):
+    """Outgoing email, written with the booking change and delivered by the background mailer."""
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(100), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # also the lease while sending
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+class RoomNight(db.Model):
+    """One row per night a room is held by a non-cancelled booking; the unique key forbids overlaps."""
+    id = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
+    night = db.Column(db.Date, nullable=False, index=True)  # the night starting on this date
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False, index=True)
+    __table_args__ = (db.UniqueConstraint('room_id', 'night'),)
+
+class CategoryInventory(db.Model):
+    """Sellable rooms and rooms sold per category and night, kept current on every booking and room write."""
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(50), nullable=False)  # Room.room_type
+    night = db.Column(db.Date, nullable=False, index=True)
+    sellable = db.Column(db.Integer, nullable=False, default=0)  # rooms not under maintenance or closed
+    sold = db.Column(db.Integer, nullable=False, default=0)  # of those, rooms held by a booking
+    __table_args__ = (db.UniqueConstraint('category', 'night'),)
+
+class BookingEvent(db.Model):
+    """A booking change pushed to staff dashboards; written with the change itself (see events.py)."""
+    id = db.Column(db.Integer, primary_key=True)  # doubles as the SSE event id
+    kind = db.Column(db.String(40), nullable=False)  # booking-created, booking-status-changed, booking-room-changed, receipt-uploaded
+    booking_id = db.Column(db.Integer, nullable=False)  # no FK: events outlive deleted bookings
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    __table_args__ = {'sqlite_autoincrement': True}  # ids are never reused once old events are pruned
+
+class SchemaVersion(db.Model):
+    """One row per applied migration (see migrations.py)."""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ==================== BULK SERIALIZATION ====================
+# to_dict() follows many-to-one relationships (room, agent, creator, ...).
+# Serializing a list row by row would lazy-load each of them separately, so
+# the helpers below fetch every related row with one IN query per relationship
+# and attach them before serializing.
+
+def prefetch(rows, relationship, model, foreign_key):
+    """Populate `relationship` on every row from a single query on `model`."""
+    ids = {getattr(row, foreign_key) for row in rows} - {None}
+    related = {obj.id: obj for obj in model.query.filter(model.id.in_(ids))} if ids else {}
+    for row in rows:
+        set_committed_value(row, relationship, related.get(getattr(row, foreign_key)))
+    return rows
+
+def serialize_bookings(bookings):
+    bookings = list(bookings)
+    prefetch(bookings, 'room', Room, 'room_id')
+    prefetch(bookings, 'agent', Agent, 'agent_id')
+    return [b.to_dict() for b in bookings]
+
+def serialize_maintenance(records):
+    records = list(records)
+    prefetch(records, 'room', Room, 'room_id')
+    return [r.to_dict() for r in records]
+
+def serialize_rate_rules(rules):
+    rules = list(rules)
+    prefetch(rules, 'creator', User, 'created_by')
+    return [r.to_dict() for r in rules]
+
+def serialize_audit_logs(logs):
+    logs = list(logs)
+    prefetch(logs, 'changer', User, 'changed_by')
+    return [l.to_dict() for l in logs]
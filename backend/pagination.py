@@ -0,0 +1,117 @@
+"""Keyset pagination and streamed JSON for list endpoints.
+
+List endpoints keep returning a plain JSON array by default. Two opt-in modes
+are available through query parameters:
+
+    ?limit=50[&cursor=...]  one page ordered newest first, as
+                            {"items": [...], "next_cursor": "..." | null}
+    ?stream=1               the full list, serialized in chunks from a
+                            server-side cursor so memory use stays flat
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+from models import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, columns):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(raw) != len(columns):
+            raise InvalidCursor(cursor)
+        values = []
+        for column, value in zip(columns, raw):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def _after(columns, values):
+    """Rows strictly after `values` in descending (col1, col2, ...) order."""
+    clauses = []
+    for i, column in enumerate(columns):
+        clauses.append(db.and_(*[c == v for c, v in zip(columns[:i], values[:i])], column < values[i]))
+    return db.or_(*clauses)
+
+
+def page_size():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def keyset_page(query, columns, limit, cursor=None):
+    """Return (rows, next_cursor) for `query` ordered by `columns`, newest first."""
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns)))
+    rows = query.order_by(*[c.desc() for c in columns]).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows, next_cursor
+
+
+def stream_rows(query, columns, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a JSON array of every row, fetched and serialized chunk by chunk."""
+    rows = query.order_by(*[c.desc() for c in columns]).yield_per(chunk_size)
+    dumps = current_app.json.dumps
+    yield '['
+    first = True
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            for item in serialize(chunk):
+                yield dumps(item) if first else ',' + dumps(item)
+                first = False
+            chunk = []
+    for item in serialize(chunk):
+        yield dumps(item) if first else ',' + dumps(item)
+        first = False
+    yield ']'
+
+
+def wants_stream():
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def wants_page():
+    return 'limit' in request.args or 'cursor' in request.args
+
+
+def list_response(query, columns, serialize):
+    """Plain list, keyset page or stream of `query`, depending on the request."""
+    if wants_stream():
+        return Response(stream_with_context(stream_rows(query, columns, serialize)),
+                        mimetype='application/json')
+    if wants_page():
+        try:
+            rows, next_cursor = keyset_page(query, columns, page_size(), request.args.get('cursor'))
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return jsonify({'items': serialize(rows), 'next_cursor': next_cursor})
+    rows = query.order_by(*[c.desc() for c in columns]).all()
+    return jsonify(serialize(rows))
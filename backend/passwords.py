@@ -0,0 +1,96 @@
+"""Password hashing and verification off the request thread.
+
+Password KDFs are deliberately slow, so verification runs in a dedicated
+process pool instead of blocking a web worker, and the number of in-flight
+verifications is capped so a login storm queues (or is refused with 503)
+rather than starving every other request. Set PASSWORD_WORKERS=0 to verify
+inline.
+
+The pool and the in-flight cap are per web worker process: under gunicorn
+the host runs WEB_WORKERS x PASSWORD_WORKERS KDF processes and admits up to
+WEB_WORKERS x PASSWORD_MAX_INFLIGHT checks at once. PASSWORD_WORKERS
+therefore defaults to 1: one hashing process per web worker, which with the
+default worker count already covers every core.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', 1))  # per web worker process, see above
+PASSWORD_MAX_INFLIGHT = int(os.getenv('PASSWORD_MAX_INFLIGHT', max(PASSWORD_WORKERS, 1) * 4))
+PASSWORD_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_QUEUE_TIMEOUT', 5))
+
+
+class VerifierBusy(Exception):
+    """Too many password checks are already queued."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_inflight = threading.BoundedSemaphore(PASSWORD_MAX_INFLIGHT)
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+@lru_cache(maxsize=None)
+def current_hash_prefix():
+    """Method and parameters werkzeug writes for PASSWORD_HASH_METHOD, e.g. 'scrypt:32768:8:1'."""
+    return hash_password('').split('$', 1)[0]
+
+
+def needs_rehash(pwhash):
+    return bool(pwhash) and pwhash.split('$', 1)[0] != current_hash_prefix()
+
+
+def _executor_instance():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn: never fork a process that is running server threads
+                _executor = ProcessPoolExecutor(
+                    max_workers=PASSWORD_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _executor
+
+
+def _run(fn, *args):
+    if PASSWORD_WORKERS <= 0:
+        return fn(*args)
+    if not _inflight.acquire(timeout=PASSWORD_QUEUE_TIMEOUT):
+        raise VerifierBusy()
+    try:
+        return _executor_instance().submit(fn, *args).result()
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool next time and answer this call inline
+        shutdown()
+        return fn(*args)
+    finally:
+        _inflight.release()
+
+
+def verify_password(pwhash, password):
+    if not pwhash:
+        return False
+    return _run(check_password_hash, pwhash, password)
+
+
+def rehash_password(password):
+    return _run(hash_password, password)
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
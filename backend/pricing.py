@@ -0,0 +1,311 @@
+"""Booking price calculation.
+
+Quotes are served from a RateCalendar, a materialized array of effective
+nightly multipliers per room category. Stays outside the calendar window fall
+back to a PricingContext, which loads the holidays and active rate rules
+overlapping the stay with two queries and resolves each night in memory.
+"""
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from generations import Generation
+from models import Holiday, RateRule
+
+RATE_CALENDAR_DAYS = int(os.getenv('RATE_CALENDAR_DAYS', 800))
+RATE_CALENDAR_PAST_DAYS = 7
+
+
+class PricingContext:
+    """Holidays and active rate rules overlapping [start, end).
+
+    Both are loaded on first use, so a context shared by quotes that all hit
+    the rate calendar costs nothing.
+    """
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self._holidays = None
+        self._rules = None
+
+    def _load(self):
+        self._holidays = {
+            h.date: h for h in Holiday.query.filter(Holiday.date >= self.start, Holiday.date < self.end)
+        }
+        # Ordered by id so ties on the multiplier resolve to the same rule as before
+        self._rules = RateRule.query.filter(
+            RateRule.is_active == True,
+            RateRule.start_date < self.end,
+            RateRule.end_date >= self.start
+        ).order_by(RateRule.id).all()
+
+    @property
+    def holidays(self):
+        if self._holidays is None:
+            self._load()
+        return self._holidays
+
+    @property
+    def rules(self):
+        if self._rules is None:
+            self._load()
+        return self._rules
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def rules_for(self, day, room_type):
+        return [
+            r for r in self.rules
+            if r.start_date <= day <= r.end_date
+            and (not r.room_category or r.room_category == room_type)
+        ]
+
+
+class RateCalendar:
+    """Effective nightly multipliers per room category over a rolling window.
+
+    For every category that has its own rate rules, plus the "all categories"
+    baseline, the calendar keeps the winning rule per day and the resulting
+    multiplier (rule x holiday). Holidays and the blackout bitmap are shared by
+    all categories. Rule and holiday edits recompute only the affected days.
+    """
+
+    BASELINE = None
+
+    def __init__(self, days=RATE_CALENDAR_DAYS):
+        self.days = days
+        self._lock = threading.RLock()
+        self._built_on = None
+        self.origin = None
+        # Notes data: rules by id (referenced from _rule_idx), holidays by day offset
+        self._rules = {}      # rule id -> (name, rate_multiplier)
+        self._holidays = {}   # day offset -> (name, rate_multiplier)
+        self._blackout = None
+        self._rule_idx = {}     # category -> int32 array of winning rule ids, -1 where no rule applies
+        self._multiplier = {}   # category -> float64 array of effective multipliers
+        self._generation = Generation('rates')  # edits made by other processes force a rebuild
+
+    def ensure_current(self):
+        """Build the calendar, or roll it forward once the date has changed."""
+        today = date.today()
+        if self._built_on != today or self._generation.is_stale():
+            with self._lock:
+                if self._built_on != today or self._generation.is_stale():
+                    self.rebuild(today)
+
+    def invalidate(self):
+        with self._lock:
+            self._built_on = None
+
+    def rebuild(self, today=None):
+        today = today or date.today()
+        self._generation.mark_current()
+        origin = today - timedelta(days=RATE_CALENDAR_PAST_DAYS)
+        end = origin + timedelta(days=self.days)
+        rules = RateRule.query.filter(
+            RateRule.is_active == True,
+            RateRule.start_date < end,
+            RateRule.end_date >= origin
+        ).order_by(RateRule.id).all()
+        holidays = Holiday.query.filter(Holiday.date >= origin, Holiday.date < end).all()
+
+        with self._lock:
+            self.origin = origin
+            self._rules = {}
+            self._holidays = {}
+            self._blackout = np.zeros(self.days, dtype=bool)
+            categories = {self.BASELINE} | {r.room_category for r in rules if r.room_category}
+            self._rule_idx = {c: np.full(self.days, -1, dtype=np.int32) for c in categories}
+            self._multiplier = {c: np.ones(self.days) for c in categories}
+            self._fill(0, self.days, rules, holidays, categories)
+            self._built_on = today
+
+    def refresh(self, start, end, room_category=None):
+        """Recompute days [start, end] after a rule or holiday change.
+
+        room_category is the category the changed rule applies to; None (or '')
+        means the change affects every category, as holidays and baseline
+        rules do.
+        """
+        with self._lock:
+            self._refresh(start, end, room_category)
+            if not self._generation.bump():
+                self._built_on = None
+
+    def _refresh(self, start, end, room_category):
+        if self._built_on is None:
+            return
+        with self._lock:
+            if room_category and room_category not in self._rule_idx:
+                self.rebuild(self._built_on)
+                return
+            lo = max((start - self.origin).days, 0)
+            hi = min((end - self.origin).days + 1, self.days)
+            if lo >= hi:
+                return
+            first, last = self.origin + timedelta(days=lo), self.origin + timedelta(days=hi)
+            rules = RateRule.query.filter(
+                RateRule.is_active == True,
+                RateRule.start_date < last,
+                RateRule.end_date >= first
+            ).order_by(RateRule.id).all()
+            holidays = Holiday.query.filter(Holiday.date >= first, Holiday.date < last).all()
+            categories = [room_category] if room_category else list(self._rule_idx)
+            self._fill(lo, hi, rules, holidays, categories)
+
+    def _fill(self, lo, hi, rules, holidays, categories):
+        """Recompute days [lo, hi) of `categories`, replacing the notes of those days."""
+        for day in range(lo, hi):
+            self._holidays.pop(day, None)
+        self._blackout[lo:hi] = False
+        holiday_mult = np.ones(hi - lo)
+        for h in holidays:
+            day = (h.date - self.origin).days
+            if lo <= day < hi:
+                self._holidays[day] = (h.name, h.rate_multiplier)
+                self._blackout[day] = bool(h.is_blackout)
+                holiday_mult[day - lo] = h.rate_multiplier
+
+        rule_refs = []
+        for r in rules:
+            self._rules[r.id] = (r.name, r.rate_multiplier)
+            rule_refs.append((r.id, r))
+
+        for category in categories:
+            best = np.full(hi - lo, -np.inf)
+            idx = np.full(hi - lo, -1, dtype=np.int32)
+            # Rules are in id order and only a strictly higher multiplier replaces
+            # the current winner, matching max() over the per-night query.
+            for ref, r in rule_refs:
+                if r.room_category and r.room_category != category:
+                    continue
+                s = max((r.start_date - self.origin).days, lo) - lo
+                e = min((r.end_date - self.origin).days + 1, hi) - lo
+                if s >= e:
+                    continue
+                wins = r.rate_multiplier > best[s:e]
+                best[s:e][wins] = r.rate_multiplier
+                idx[s:e][wins] = ref
+            self._rule_idx[category][lo:hi] = idx
+            self._multiplier[category][lo:hi] = np.where(idx >= 0, best, 1.0) * holiday_mult
+
+        # Drop rules no day refers to any more (deleted, deactivated or outbid everywhere)
+        referenced = set(np.unique(np.concatenate(list(self._rule_idx.values()))).tolist())
+        for rule_id in set(self._rules) - referenced:
+            del self._rules[rule_id]
+
+    def quote(self, room_price, room_type, check_in, check_out):
+        """Price a stay from the calendar, or return None if it falls outside the window."""
+        self.ensure_current()
+        with self._lock:
+            lo = (check_in - self.origin).days
+            hi = (check_out - self.origin).days
+            if lo < 0 or hi > self.days:
+                return None
+            if hi <= lo:
+                return 0.0, [], None
+
+            blackout = self._blackout[lo:hi]
+            if blackout.any():
+                day = lo + int(np.argmax(blackout))
+                name = self._holidays[day][0]
+                blackout_date = self.origin + timedelta(days=day)
+                return None, None, f"Blackout date: {name} on {blackout_date.strftime('%Y-%m-%d')}"
+
+            category = room_type if room_type in self._rule_idx else self.BASELINE
+            multipliers = self._multiplier[category][lo:hi].tolist()
+            rule_idx = self._rule_idx[category][lo:hi].tolist()
+            holidays = [self._holidays.get(day) for day in range(lo, hi)]
+            rules = {rule_id: self._rules[rule_id] for rule_id in set(rule_idx) if rule_id >= 0}
+
+        total = 0.0
+        nightly_breakdown = []
+        for offset, multiplier in enumerate(multipliers):
+            notes = []
+            if rule_idx[offset] >= 0:
+                name, rate_multiplier = rules[rule_idx[offset]]
+                notes.append(f"Rate rule: {name} (x{rate_multiplier})")
+            if holidays[offset]:
+                name, rate_multiplier = holidays[offset]
+                notes.append(f"Holiday: {name} (x{rate_multiplier})")
+
+            nightly_total = round(room_price * multiplier, 2)
+            total += nightly_total
+            nightly_breakdown.append({
+                'date': (check_in + timedelta(days=offset)).strftime('%Y-%m-%d'),
+                'base_rate': room_price,
+                'multiplier': round(multiplier, 2),
+                'total': nightly_total,
+                'notes': ', '.join(notes) if notes else 'Standard rate'
+            })
+
+        return round(total, 2), nightly_breakdown, None
+
+
+rate_calendar = RateCalendar()
+
+
+def calculate_booking_price(room_price, room_type, check_in, check_out, context=None):
+    """Calculate booking price with holiday multipliers and rate rules.
+
+    Returns (total, nightly_breakdown, error). Stays inside the rate calendar
+    window are a slice of precomputed multipliers; anything else is resolved
+    from a PricingContext, which callers can pass in to share lookups between
+    several quotes.
+    """
+    quote = rate_calendar.quote(room_price, room_type, check_in, check_out)
+    if quote is not None:
+        return quote
+    return price_with_context(room_price, room_type, check_in, check_out, context)
+
+
+def price_with_context(room_price, room_type, check_in, check_out, context=None):
+    """Price a stay by resolving each night against a PricingContext."""
+    if context is None or not context.covers(check_in, check_out):
+        context = PricingContext(check_in, check_out)
+
+    total = 0.0
+    nightly_breakdown = []
+    current_date = check_in
+
+    while current_date < check_out:
+        nightly_rate = room_price
+        multiplier = 1.0
+        notes = []
+
+        # Check for blackout dates
+        holiday = context.holidays.get(current_date)
+        if holiday and holiday.is_blackout:
+            return None, None, f"Blackout date: {holiday.name} on {current_date.strftime('%Y-%m-%d')}"
+
+        # Check for rate rules (highest multiplier wins)
+        active_rules = context.rules_for(current_date, room_type)
+
+        if active_rules:
+            best_rule = max(active_rules, key=lambda r: r.rate_multiplier)
+            multiplier = best_rule.rate_multiplier
+            notes.append(f"Rate rule: {best_rule.name} (x{best_rule.rate_multiplier})")
+
+        # Holiday multiplier stacks on top
+        if holiday:
+            multiplier *= holiday.rate_multiplier
+            notes.append(f"Holiday: {holiday.name} (x{holiday.rate_multiplier})")
+
+        nightly_total = round(nightly_rate * multiplier, 2)
+        total += nightly_total
+
+        nightly_breakdown.append({
+            'date': current_date.strftime('%Y-%m-%d'),
+            'base_rate': room_price,
+            'multiplier': round(multiplier, 2),
+            'total': nightly_total,
+            'notes': ', '.join(notes) if notes else 'Standard rate'
+        })
+
+        current_date += timedelta(days=1)
+
+    return round(total, 2), nightly_breakdown, None
@@ -0,0 +1,199 @@
+"""Authenticated-principal cache.
+
+Resolving a bearer token used to mean a JWT decode plus a User (or Agent)
+lookup on every request. Resolved principals are now kept in a bounded LRU
+cache keyed by the token itself, for at most AUTH_CACHE_TTL seconds and never
+past the token's own expiry. Account changes invalidate the affected entries
+immediately; other worker processes drop their whole cache when they see the
+shared "principals" generation move.
+
+Stream tickets stand in for the session token where it would end up in a URL
+(EventSource cannot send headers): short-lived, and accepted only by the event
+stream, never as a bearer token.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import jwt
+
+from generations import Generation
+from models import db, User, Agent
+from passwords import needs_rehash, rehash_password, verify_password
+
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 1024))
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+STREAM_TICKET_SECONDS = int(os.getenv('STREAM_TICKET_SECONDS', 30))
+
+
+class Principal:
+    """Snapshot of the caller: a staff/customer User or a travel Agent."""
+
+    __slots__ = ('kind', 'id', 'name', 'email', 'role', 'status', 'profile')
+
+    def __init__(self, kind, id, name, email, role, status, profile):
+        self.kind = kind
+        self.id = id
+        self.name = name
+        self.email = email
+        self.role = role
+        self.status = status
+        self.profile = profile  # to_dict() of the underlying row
+
+    @classmethod
+    def from_user(cls, user):
+        return cls('user', user.id, user.name, user.email, user.role, user.status, user.to_dict())
+
+    @classmethod
+    def from_agent(cls, agent):
+        return cls('agent', agent.id, agent.name, agent.email, 'agent', agent.status, agent.to_dict())
+
+    def to_dict(self):
+        return dict(self.profile)
+
+
+class PrincipalCache:
+    def __init__(self, maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (principal, valid_until)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = Generation('principals')
+
+    def get(self, token):
+        now = time.time()
+        with self._lock:
+            if self._generation.is_stale():
+                self._entries.clear()
+                self._generation.mark_current()
+            entry = self._entries.get(token)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token, principal, token_expires_at=None):
+        valid_until = time.time() + self.ttl
+        if token_expires_at is not None:
+            valid_until = min(valid_until, token_expires_at)
+        with self._lock:
+            self._entries[token] = (principal, valid_until)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind, principal_id):
+        """Drop every cached token of one user or agent."""
+        with self._lock:
+            stale = [t for t, (p, _) in self._entries.items() if p.kind == kind and p.id == principal_id]
+            for token in stale:
+                del self._entries[token]
+            self.invalidations += len(stale)
+            if not self._generation.bump():
+                self._entries.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+def resolve_principal(token, secret_key):
+    """Return the Principal for a bearer token, or None if its account no longer exists.
+
+    Raises jwt.ExpiredSignatureError / jwt.InvalidTokenError for bad tokens.
+    """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    data = jwt.decode(token, secret_key, algorithms=['HS256'])
+    if 'user_id' in data:
+        user = User.query.get(data['user_id'])
+        principal = Principal.from_user(user) if user else None
+    elif 'agent_id' in data:
+        agent = Agent.query.get(data['agent_id'])
+        principal = Principal.from_agent(agent) if agent else None
+    else:
+        raise jwt.InvalidTokenError('Token has no subject')
+
+    if principal is not None:
+        principal_cache.put(token, principal, data.get('exp'))
+    return principal
+
+
+def issue_stream_ticket(principal, secret_key):
+    """A ticket that opens the event stream as `principal` within STREAM_TICKET_SECONDS."""
+    return jwt.encode({
+        'stream_user_id': principal.id,
+        'purpose': 'events',
+        'exp': datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+    }, secret_key, algorithm='HS256')
+
+
+def resolve_stream_ticket(ticket, secret_key):
+    """Return the Principal a stream ticket was issued to, or None if the user no longer exists.
+
+    Raises jwt.ExpiredSignatureError / jwt.InvalidTokenError like resolve_principal();
+    session tokens are not tickets.
+    """
+    data = jwt.decode(ticket, secret_key, algorithms=['HS256'])
+    if data.get('purpose') != 'events' or 'stream_user_id' not in data:
+        raise jwt.InvalidTokenError('Not a stream ticket')
+    user = db.session.get(User, data['stream_user_id'])
+    return Principal.from_user(user) if user else None
+
+
+def login_candidates(email):
+    """Users and agents registered under `email`, users first, in one indexed query."""
+    users = db.session.query(
+        db.literal('user').label('kind'), User.id, User.password_hash
+    ).filter(User.email == email)
+    agents = db.session.query(
+        db.literal('agent').label('kind'), Agent.id, Agent.password_hash
+    ).filter(Agent.email == email)
+    rows = users.union_all(agents).all()
+    return sorted(rows, key=lambda row: row.kind != 'user')
+
+
+def authenticate(email, password, kinds=('user', 'agent')):
+    """Return the User or Agent whose password matches, or None.
+
+    Hashes written with outdated parameters are upgraded on the way in.
+    Raises passwords.VerifierBusy when the verification pool is saturated.
+    """
+    if not email:
+        return None
+    for kind, principal_id, pwhash in login_candidates(email):
+        if kind not in kinds or not verify_password(pwhash, password):
+            continue
+        model = User if kind == 'user' else Agent
+        if needs_rehash(pwhash):
+            model.query.filter_by(id=principal_id).update({'password_hash': rehash_password(password)})
+            db.session.commit()
+        return model.query.get(principal_id)
+    return None
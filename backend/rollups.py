@@ -0,0 +1,218 @@
+"""Incrementally maintained booking aggregates.
+
+Agent summaries are read from AgentDailyStats and dashboard figures from
+DashboardCounter. Both are adjusted inside the same transaction as every
+booking create, status change and read_by_employee flip, so the Agent
+Transactions tab, the dashboard and the notification poll never scan Booking.
+
+Each dashboard counter is split over DASHBOARD_COUNTER_SHARDS rows and a
+booking always bumps the shard its id picks, so concurrent booking writes
+rarely wait on one another's counter row; reads sum the shards.
+"""
+import os
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Booking, AgentDailyStats, DashboardCounter
+
+SUMMARY_STATUSES = ('confirmed', 'pending', 'cancelled')
+COUNTERS = ('total_bookings', 'pending_bookings', 'confirmed_bookings', 'total_revenue', 'unread_notifications')
+DASHBOARD_COUNTER_SHARDS = int(os.getenv('DASHBOARD_COUNTER_SHARDS', 16))
+
+
+def _bump_agent_day(agent_id, day, status, count, revenue):
+    updated = AgentDailyStats.query.filter_by(agent_id=agent_id, day=day, status=status).update({
+        AgentDailyStats.bookings: AgentDailyStats.bookings + count,
+        AgentDailyStats.revenue: AgentDailyStats.revenue + revenue
+    }, synchronize_session=False)
+    if updated:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(AgentDailyStats(agent_id=agent_id, day=day, status=status,
+                                           bookings=count, revenue=revenue))
+    except IntegrityError:
+        # Another transaction created the row first
+        _bump_agent_day(agent_id, day, status, count, revenue)
+
+
+def counter_shard(booking):
+    return (booking.id or 0) % DASHBOARD_COUNTER_SHARDS
+
+
+def _bump_counter(name, delta, shard):
+    updated = DashboardCounter.query.filter_by(name=name, shard=shard).update(
+        {DashboardCounter.value: DashboardCounter.value + delta}, synchronize_session=False
+    )
+    if updated:
+        return
+    if db.session.query(DashboardCounter.shard).filter_by(name=name).first() is not None:
+        row = DashboardCounter(name=name, shard=shard, value=delta)
+    else:
+        # No shard at all yet: seed shard 0 from Booking, which (autoflushed) already includes this change
+        row = DashboardCounter(name=name, shard=0, value=count_from_bookings()[name])
+    try:
+        with db.session.begin_nested():
+            db.session.add(row)
+    except IntegrityError:
+        # Another transaction created the row first
+        _bump_counter(name, delta, shard)
+
+
+def _bump_status_counters(booking, status, sign):
+    shard = counter_shard(booking)
+    if status == 'pending':
+        _bump_counter('pending_bookings', sign, shard)
+    elif status == 'confirmed':
+        _bump_counter('confirmed_bookings', sign, shard)
+        _bump_counter('total_revenue', sign * booking.total_price, shard)
+
+
+def record_booking_status(booking, old_status=None):
+    """Move a booking into its current status bucket (and out of old_status).
+
+    old_status=None means the booking is new. Call after the booking is flushed
+    and before committing, so the aggregates change atomically with it.
+    """
+    if old_status is None:
+        _bump_counter('total_bookings', 1, counter_shard(booking))
+        if not booking.read_by_employee:
+            _bump_counter('unread_notifications', 1, counter_shard(booking))
+    if old_status == booking.status:
+        return
+    if old_status is not None:
+        _bump_status_counters(booking, old_status, -1)
+    _bump_status_counters(booking, booking.status, 1)
+
+    if booking.agent_id:
+        day = (booking.created_at or datetime.utcnow()).date()
+        if old_status is not None:
+            _bump_agent_day(booking.agent_id, day, old_status, -1, -booking.total_price)
+        _bump_agent_day(booking.agent_id, day, booking.status, 1, booking.total_price)
+
+
+def record_new_bookings(bookings):
+    """record_booking_status() for a batch of new bookings, one update per aggregate touched."""
+    counters = defaultdict(float)
+    agent_days = defaultdict(lambda: [0, 0.0])
+    for booking in bookings:
+        counters['total_bookings'] += 1
+        if not booking.read_by_employee:
+            counters['unread_notifications'] += 1
+        if booking.status == 'pending':
+            counters['pending_bookings'] += 1
+        elif booking.status == 'confirmed':
+            counters['confirmed_bookings'] += 1
+            counters['total_revenue'] += booking.total_price
+        if booking.agent_id:
+            day = (booking.created_at or datetime.utcnow()).date()
+            totals = agent_days[(booking.agent_id, day, booking.status)]
+            totals[0] += 1
+            totals[1] += booking.total_price
+    for name, delta in counters.items():
+        _bump_counter(name, delta, counter_shard(bookings[0]))
+    for (agent_id, day, status), (count, revenue) in agent_days.items():
+        _bump_agent_day(agent_id, day, status, count, revenue)
+
+
+def record_read_flag(booking, was_read):
+    if bool(was_read) != bool(booking.read_by_employee):
+        _bump_counter('unread_notifications', -1 if booking.read_by_employee else 1, counter_shard(booking))
+
+
+def stored_counters():
+    """{name: sum of its shards} for every counter that has a shard."""
+    return dict(db.session.query(DashboardCounter.name, db.func.sum(DashboardCounter.value)).group_by(
+        DashboardCounter.name
+    ).all())
+
+
+def dashboard_counters():
+    """Current counter values; the first read on an empty table reconciles them."""
+    values = stored_counters()
+    if not values:
+        reconcile_counters()
+        values = stored_counters()
+    return {name: values.get(name, 0) for name in COUNTERS}
+
+
+def count_from_bookings():
+    """Recompute every counter from the Booking table in one pass."""
+    row = db.session.query(
+        db.func.count(Booking.id),
+        db.func.sum(db.case((Booking.status == 'pending', 1), else_=0)),
+        db.func.sum(db.case((Booking.status == 'confirmed', 1), else_=0)),
+        db.func.sum(db.case((Booking.status == 'confirmed', Booking.total_price), else_=0)),
+        db.func.sum(db.case((Booking.read_by_employee == False, 1), else_=0))
+    ).one()
+    return {name: value or 0 for name, value in zip(COUNTERS, row)}
+
+
+def reconcile_counters(fix=True, commit=True):
+    """Compare the counters against Booking; return {name: (stored, actual)} for any drift.
+
+    With `fix`, stored values are corrected (and committed unless `commit` is False).
+    """
+    actual = count_from_bookings()
+    stored = stored_counters()
+    drift = {}
+    for name in COUNTERS:
+        stored_value = stored.get(name)
+        if stored_value is None or abs(stored_value - actual[name]) > 1e-6:
+            drift[name] = (stored_value, actual[name])
+            if fix:
+                # Collapse the shards into shard 0 holding the true value
+                DashboardCounter.query.filter_by(name=name).delete(synchronize_session=False)
+                db.session.add(DashboardCounter(name=name, shard=0, value=actual[name]))
+    if fix and commit:
+        db.session.commit()
+    return drift
+
+
+def agent_summaries(agent_ids=None):
+    """{agent_id: summary} from one GROUP BY over the rollup table."""
+    query = db.session.query(
+        AgentDailyStats.agent_id,
+        AgentDailyStats.status,
+        db.func.sum(AgentDailyStats.bookings),
+        db.func.sum(AgentDailyStats.revenue)
+    )
+    if agent_ids is not None:
+        query = query.filter(AgentDailyStats.agent_id.in_(agent_ids))
+    summaries = {}
+    for agent_id, status, count, revenue in query.group_by(AgentDailyStats.agent_id, AgentDailyStats.status):
+        summary = summaries.setdefault(agent_id, empty_summary())
+        summary['total'] += count
+        if status in SUMMARY_STATUSES:
+            summary[status] = count
+        if status == 'confirmed':
+            summary['revenue'] = revenue or 0
+    return summaries
+
+
+def empty_summary():
+    return {'total': 0, 'confirmed': 0, 'pending': 0, 'cancelled': 0, 'revenue': 0}
+
+
+def agent_summary(agent_id):
+    return agent_summaries([agent_id]).get(agent_id, empty_summary())
+
+
+def rebuild_agent_stats(commit=True):
+    """Recompute the rollup from the Booking table with a single GROUP BY (committed unless `commit` is False)."""
+    day = db.func.date(Booking.created_at)
+    rows = db.session.query(
+        Booking.agent_id, day, Booking.status, db.func.count(Booking.id), db.func.sum(Booking.total_price)
+    ).filter(Booking.agent_id.isnot(None)).group_by(Booking.agent_id, day, Booking.status).all()
+
+    AgentDailyStats.query.delete()
+    for agent_id, booked_on, status, count, revenue in rows:
+        if isinstance(booked_on, str):
+            booked_on = date.fromisoformat(booked_on)
+        db.session.add(AgentDailyStats(agent_id=agent_id, day=booked_on, status=status,
+                                       bookings=count, revenue=revenue or 0))
+    if commit:
+        db.session.commit()
+    return len(rows)
@@ -0,0 +1,127 @@
+"""Front-desk room status board.
+
+The board lists every room with tonight's occupant. It is built with one
+query (rooms outer-joined to the booking in them today and that booking's
+agent) and kept as a per-process snapshot for the current date, together with
+its serialized JSON, so loading the board is a dictionary read no matter how
+many rooms the property has.
+
+Booking and room writes patch the affected rooms with a query limited to
+them; the snapshot is rebuilt when the date rolls over or when another
+worker process has patched its own copy (the shared "room_board" generation).
+"""
+import json
+import threading
+from datetime import date
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from generations import Generation
+from models import db, Agent, Booking, Room
+
+
+def room_status_rows(today, room_ids=None):
+    """{room_id: board entry} for every room (or just `room_ids`) from a single query."""
+    occupant = db.and_(
+        Booking.room_id == Room.id,
+        Booking.status != 'cancelled',
+        Booking.check_in <= today,
+        Booking.check_out > today
+    )
+    query = db.session.query(Room, Booking, Agent).outerjoin(Booking, occupant).outerjoin(
+        Agent, Agent.id == Booking.agent_id
+    )
+    if room_ids is not None:
+        query = query.filter(Room.id.in_(room_ids))
+
+    entries = {}
+    for room, booking, agent in query.order_by(Room.id, Booking.check_in, Booking.id):
+        if room.id in entries:
+            continue  # overlapping legacy bookings: the earliest one is shown
+        if room.maintenance_status in ('maintenance', 'closed'):
+            status, booking = room.maintenance_status, None
+        else:
+            status = 'occupied' if booking else 'available'
+        if booking is not None:
+            set_committed_value(booking, 'room', room)
+            set_committed_value(booking, 'agent', agent)
+        entries[room.id] = {
+            'room': room.to_dict(),
+            'status': status,
+            'current_booking': booking.to_dict() if booking else None
+        }
+    return entries
+
+
+class RoomStatusBoard:
+    """Today's board, materialized per process."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._day = None
+        self._entries = {}   # room_id -> entry
+        self._json = None    # serialized board, rebuilt lazily after a patch
+        self._generation = Generation('room_board')
+
+    def _current(self, today):
+        if self._day != today or self._generation.is_stale():
+            self._generation.mark_current()
+            self._entries = room_status_rows(today)
+            self._day = today
+            self._json = None
+
+    def entries(self, today=None):
+        today = today or date.today()
+        with self._lock:
+            self._current(today)
+            return [self._entries[room_id] for room_id in sorted(self._entries)]
+
+    def as_json(self, today=None):
+        today = today or date.today()
+        with self._lock:
+            self._current(today)
+            if self._json is None:
+                self._json = json.dumps([self._entries[room_id] for room_id in sorted(self._entries)])
+            return self._json
+
+    def _published(self):
+        if not self._generation.bump():
+            self._day = None  # missed another process's patch: rebuild on the next read
+
+    def refresh_rooms(self, *room_ids):
+        """Re-read the given rooms (dropping deleted ones) after a committed change."""
+        with self._lock:
+            if self._day is not None and room_ids:
+                fresh = room_status_rows(self._day, room_ids)
+                for room_id in room_ids:
+                    if room_id in fresh:
+                        self._entries[room_id] = fresh[room_id]
+                    else:
+                        self._entries.pop(room_id, None)
+                self._json = None
+            self._published()
+
+    def sync_bookings(self, *bookings):
+        """Patch the rooms whose occupant tonight may have changed with `bookings`."""
+        with self._lock:
+            if self._day is None:
+                self._published()
+                return
+            today = self._day
+            ids = {b.id for b in bookings}
+            rooms = {b.room_id for b in bookings if b.check_in <= today < b.check_out}
+            # Rooms currently showing one of the bookings (it may have moved or been cancelled)
+            rooms.update(
+                room_id for room_id, entry in self._entries.items()
+                if entry['current_booking'] and entry['current_booking']['id'] in ids
+            )
+            if rooms:
+                self.refresh_rooms(*rooms)
+
+    def invalidate(self):
+        with self._lock:
+            self._day = None
+            self._generation.bump()
+
+
+room_board = RoomStatusBoard()
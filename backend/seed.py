@@ -0,0 +1,148 @@
+"""Default data for a new installation.
+
+seed_defaults() inserts whichever default users, agent, room categories and
+rooms are missing (matched by email, name and room number) in one transaction
+and never changes existing rows, so it is safe to run any number of times:
+
+    flask --app app seed
+"""
+from conditional import table_changed
+from inventory import move_room, sellable_category
+from models import db, Agent, Room, RoomCategory, User
+
+
+DEFAULT_ADMINS = {'admin@hotel.com': 'admin123', 'admin@admin.com': 'admin'}
+DEFAULT_AGENTS = {'lee@agent.com': 'password'}
+
+
+def default_users(skip_emails=()):
+    users = []
+    for email, password in DEFAULT_ADMINS.items():
+        if email not in skip_emails:
+            user = User(name='Admin', email=email, role='admin', status='active')
+            user.set_password(password)
+            users.append(user)
+    return users
+
+
+def default_agents(skip_emails=()):
+    if 'lee@agent.com' in skip_emails:
+        return []
+    agent = Agent(name='Lee', email='lee@agent.com', phone='0123456789', company='Lee Travel Agency',
+                  status='approved')
+    agent.set_password(DEFAULT_AGENTS['lee@agent.com'])
+    return [agent]
+
+
+def default_categories():
+    return [
+        RoomCategory(name='Deluxe Room', description='Elegant room with modern amenities', base_price=150, capacity=2),
+        RoomCategory(name='Superior Family Room', description='Spacious family room with multiple beds', base_price=280, capacity=4),
+        RoomCategory(name='Grand Suite', description='Luxurious suite for large groups', base_price=480, capacity=8),
+        RoomCategory(name='Presidential Suite', description='Ultimate luxury suite', base_price=750, capacity=2),
+    ]
+
+
+def default_rooms(categories):
+    """Sample rooms; `categories` maps category names to their ids."""
+    return [
+        # Deluxe Rooms (2 pax - 5 rooms)
+        Room(room_number='101', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=categories['Deluxe Room'],
+             description='Elegant room with modern amenities and comfortable queen bed',
+             image_url='https://images.unsplash.com/photo-1611892440504-42a792e24d32?w=800',
+             amenities='Free WiFi, Air Conditioning, Queen Bed, City View, Mini Bar, Smart TV'),
+        Room(room_number='102', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=categories['Deluxe Room'],
+             description='Stylish room with premium bedding and contemporary design',
+             image_url='https://images.unsplash.com/photo-1590490360182-c33d57733427?w=800',
+             amenities='Free WiFi, Air Conditioning, Queen Bed, City View, Mini Bar, Smart TV'),
+        Room(room_number='103', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=categories['Deluxe Room'],
+             description='Cozy deluxe room with private balcony and city views',
+             image_url='https://images.unsplash.com/photo-1598928506311-c55ded91a20c?w=800',
+             amenities='Free WiFi, Air Conditioning, Queen Bed, Balcony, Mini Bar, Smart TV'),
+        Room(room_number='104', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=categories['Deluxe Room'],
+             description='Bright and spacious room with natural lighting',
+             image_url='https://images.unsplash.com/photo-1582719478250-c89cae4dc85b?w=800',
+             amenities='Free WiFi, Air Conditioning, Queen Bed, City View, Mini Bar, Smart TV'),
+        Room(room_number='105', room_type='Deluxe Room', price_per_night=150, capacity=2, category_id=categories['Deluxe Room'],
+             description='Modern deluxe room with sophisticated decor',
+             image_url='https://images.unsplash.com/photo-1566665797739-1674de7a421a?w=800',
+             amenities='Free WiFi, Air Conditioning, Queen Bed, City View, Mini Bar, Smart TV'),
+
+        # Superior Family Rooms (4 pax - 5 rooms)
+        Room(room_number='201', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=categories['Superior Family Room'],
+             description='Spacious family room with 2 queen beds and sitting area',
+             image_url='https://images.unsplash.com/photo-1631049307264-da0ec9d70304?w=800',
+             amenities='Free WiFi, Air Conditioning, 2 Queen Beds, Sofa, Mini Bar, Smart TV, Coffee Maker'),
+        Room(room_number='202', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=categories['Superior Family Room'],
+             description='Family-friendly room with separate sleeping and living areas',
+             image_url='https://images.unsplash.com/photo-1591088398332-8a7791972843?w=800',
+             amenities='Free WiFi, Air Conditioning, 2 Queen Beds, Sofa, Mini Bar, Smart TV, Coffee Maker'),
+        Room(room_number='203', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=categories['Superior Family Room'],
+             description='Modern family suite with premium comfort',
+             image_url='https://images.unsplash.com/photo-1618773928121-c32242e63f39?w=800',
+             amenities='Free WiFi, Air Conditioning, 2 Queen Beds, Sofa, Mini Bar, Smart TV, Coffee Maker'),
+        Room(room_number='204', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=categories['Superior Family Room'],
+             description='Large family room with panoramic city views',
+             image_url='https://images.unsplash.com/photo-1595576508898-0ad5c879a061?w=800',
+             amenities='Free WiFi, Air Conditioning, 2 Queen Beds, City View, Mini Bar, Smart TV, Coffee Maker'),
+        Room(room_number='205', room_type='Superior Family Room', price_per_night=280, capacity=4, category_id=categories['Superior Family Room'],
+             description='Comfortable family accommodation with modern facilities',
+             image_url='https://images.unsplash.com/photo-1522771739844-6a9f6d5f14af?w=800',
+             amenities='Free WiFi, Air Conditioning, 2 Queen Beds, Sofa, Mini Bar, Smart TV, Coffee Maker'),
+
+        # Grand Suite (8 pax - 3 rooms)
+        Room(room_number='301', room_type='Grand Suite', price_per_night=480, capacity=8, category_id=categories['Grand Suite'],
+             description='Luxurious suite with multiple bedrooms perfect for large groups',
+             image_url='https://images.unsplash.com/photo-1582719508461-905c673771fd?w=800',
+             amenities='Free WiFi, Air Conditioning, 4 Bedrooms, Living Room, Kitchen, Dining Area, Smart TV, Washing Machine'),
+        Room(room_number='302', room_type='Grand Suite', price_per_night=480, capacity=8, category_id=categories['Grand Suite'],
+             description='Premium group accommodation with separate living and dining areas',
+             image_url='https://images.unsplash.com/photo-1629140727571-9b5c6f6267b4?w=800',
+             amenities='Free WiFi, Air Conditioning, 4 Bedrooms, Living Room, Kitchen, Balcony, Smart TV, Washing Machine'),
+        Room(room_number='303', room_type='Grand Suite', price_per_night=480, capacity=8, category_id=categories['Grand Suite'],
+             description='Spacious multi-bedroom suite with modern amenities and stunning views',
+             image_url='https://images.unsplash.com/photo-1615874959474-d609969a20ed?w=800',
+             amenities='Free WiFi, Air Conditioning, 4 Bedrooms, Living Room, Kitchen, City View, Smart TV, Washing Machine'),
+
+        # Presidential Suite (2 pax - 2 rooms)
+        Room(room_number='401', room_type='Presidential Suite', price_per_night=750, capacity=2, category_id=categories['Presidential Suite'],
+             description='Ultimate luxury suite with exclusive amenities and breathtaking views',
+             image_url='https://images.unsplash.com/photo-1631049552240-59c37f38802b?w=800',
+             amenities='Free WiFi, King Bed, Private Balcony, Jacuzzi, Living Room, Dining Area, Butler Service, Premium Minibar'),
+        Room(room_number='402', room_type='Presidential Suite', price_per_night=750, capacity=2, category_id=categories['Presidential Suite'],
+             description='Exquisite penthouse suite with unparalleled luxury and personalized service',
+             image_url='https://images.unsplash.com/photo-1591088398332-8a7791972843?w=800',
+             amenities='Free WiFi, King Bed, Ocean View, Jacuzzi, Living Room, Dining Area, Butler Service, Premium Minibar'),
+    ]
+
+
+def _present(column, values):
+    return set(db.session.scalars(db.select(column).where(column.in_(values))))
+
+
+def _missing(model, key, rows):
+    """The `rows` whose `key` value is not in the table yet."""
+    present = _present(getattr(model, key), [getattr(r, key) for r in rows])
+    return [r for r in rows if getattr(r, key) not in present]
+
+
+def seed_defaults():
+    """Insert missing default rows and commit once; return {table: rows inserted}."""
+    # Passwords are only hashed for accounts that are actually missing
+    users = default_users(_present(User.email, DEFAULT_ADMINS))
+    agents = default_agents(_present(Agent.email, DEFAULT_AGENTS))
+    categories = _missing(RoomCategory, 'name', default_categories())
+    db.session.add_all(users + agents + categories)
+    db.session.flush()
+
+    category_ids = dict(db.session.query(RoomCategory.name, RoomCategory.id))
+    rooms = _missing(Room, 'room_number', default_rooms(category_ids))
+    db.session.add_all(rooms)
+    db.session.flush()
+    for room in rooms:
+        move_room(room.id, None, sellable_category(room))
+    db.session.commit()
+    table_changed('room_categories', 'rooms')
+
+    created = {'users': users, 'agents': agents, 'room categories': categories, 'rooms': rooms}
+    return {name: len(rows) for name, rows in created.items() if rows}
@@ -0,0 +1,163 @@
+"""Tape chart: every room against every night of a date window.
+
+The chart is built from one query returning every booking and maintenance
+interval that touches the window. The intervals are painted into a room x day
+integer grid with numpy. Cell codes are:
+
+    0     free
+    n > 0 booking n
+    -n    maintenance record n
+
+Each room's row is sent as `runs`, run-length encoded [code, nights] pairs,
+or as `cells`, one code per night, whichever is shorter as JSON. A room that
+sits empty for a month or holds one guest for a week is a single pair, while
+a room turning over every night or two costs no more than the plain row, so
+the chart is never larger than the dense grid.
+"""
+import numpy as np
+from sqlalchemy import String, cast, select, union_all
+
+from models import db, Booking, Room, RoomMaintenance
+
+FREE = 0
+
+
+def blocked_intervals(start, end, details=False):
+    """(code, room_id, start, end[, label, status]) for bookings and maintenance overlapping [start, end).
+
+    Dates come back as YYYY-MM-DD strings for numpy to parse in bulk; ongoing
+    maintenance without an end date has end None. The label (customer name or
+    maintenance reason) and status are only selected with `details`.
+    """
+    booking_columns = [Booking.id.label('code'), Booking.room_id,
+                       cast(Booking.check_in, String).label('start'), cast(Booking.check_out, String).label('end')]
+    maintenance_columns = [-RoomMaintenance.id, RoomMaintenance.room_id,
+                           cast(RoomMaintenance.start_date, String), cast(RoomMaintenance.end_date, String)]
+    if details:
+        booking_columns += [Booking.customer_name.label('label'), Booking.status]
+        maintenance_columns += [RoomMaintenance.reason, RoomMaintenance.status]
+
+    bookings = select(*booking_columns).where(
+        Booking.status != 'cancelled',
+        Booking.check_in < end,
+        Booking.check_out > start
+    )
+    maintenance = select(*maintenance_columns).where(
+        RoomMaintenance.start_date < end,
+        db.or_(
+            RoomMaintenance.end_date > start,
+            db.and_(RoomMaintenance.end_date.is_(None), RoomMaintenance.status == 'ongoing')
+        )
+    )
+    return db.session.execute(union_all(bookings, maintenance)).all()
+
+
+def paint(grid, rows, starts, ends, codes):
+    """Write codes[i] into grid[rows[i], starts[i]:ends[i]]; later intervals win where they overlap."""
+    lengths = ends - starts
+    keep = lengths > 0
+    rows, starts, lengths, codes = rows[keep], starts[keep], lengths[keep], codes[keep]
+    if not len(rows):
+        return
+    # Column index of every covered cell: each interval's start plus 0..length-1
+    first = np.cumsum(lengths) - lengths
+    cols = np.arange(lengths.sum()) - np.repeat(first - starts, lengths)
+    grid[np.repeat(rows, lengths), cols] = np.repeat(codes, lengths)
+
+
+def json_digits(values):
+    """Characters JSON spends on each integer in `values`."""
+    return np.floor(np.log10(np.maximum(np.abs(values), 1))).astype(np.int64) + 1 + (values < 0)
+
+
+def encode_rows(grid):
+    """Per row, {'runs': [[code, count], ...]} or {'cells': [code, ...]}, whichever is shorter as JSON."""
+    rooms, days = grid.shape
+    if not days:
+        return [{'runs': []} for _ in range(rooms)]
+    flat = grid.ravel()
+    change = np.ones(flat.size, dtype=bool)
+    change[1:] = flat[1:] != flat[:-1]
+    change[::days] = True  # every row starts a new run
+    run_starts = np.flatnonzero(change)
+    counts = np.diff(np.append(run_starts, flat.size))
+    pairs = np.column_stack((flat[run_starts], counts))
+    run_rows = run_starts // days
+    bounds = np.searchsorted(run_rows, np.arange(rooms + 1))
+
+    # A pair costs its two numbers, a comma and brackets; a cell its number; both a separating comma
+    run_sizes = np.bincount(run_rows, weights=json_digits(pairs[:, 0]) + json_digits(counts) + 4, minlength=rooms)
+    cell_sizes = json_digits(grid).sum(axis=1) + days
+    return [
+        {'runs': pairs[bounds[i]:bounds[i + 1]].tolist()} if run_sizes[i] <= cell_sizes[i]
+        else {'cells': grid[i].tolist()}
+        for i in range(rooms)
+    ]
+
+
+def tape_chart(start, end, details=False):
+    """The chart for the nights from `start` up to (not including) `end`.
+
+    With `details`, the bookings and maintenance records on the chart are
+    listed by id as well, for labelling the runs.
+    """
+    days = (end - start).days
+    rooms = db.session.query(Room.id, Room.room_number, Room.room_type, Room.maintenance_status).order_by(
+        Room.id
+    ).all()
+    intervals = blocked_intervals(start, end, details)
+
+    grid = np.full((len(rooms), days), FREE, dtype=np.int64)
+    if intervals and rooms:
+        codes, room_ids, began, ended = list(zip(*intervals))[:4]
+        codes = np.asarray(codes, dtype=np.int64)
+        origin = np.datetime64(start, 'D')
+        starts = np.clip((np.array(began, dtype='datetime64[D]') - origin).astype(np.int64), 0, days)
+        ends = np.array(ended, dtype='datetime64[D]')  # open-ended maintenance is NaT
+        ends = np.where(np.isnat(ends), days, np.clip((ends - origin).astype(np.int64), 0, days))
+
+        # Grid row of each interval; rows of rooms that no longer exist are dropped
+        room_order = np.asarray([room.id for room in rooms], dtype=np.int64)
+        room_ids = np.asarray(room_ids, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(room_order, room_ids), len(rooms) - 1)
+        known = room_order[rows] == room_ids
+
+        # Maintenance first, so a booking in a room under maintenance stays visible
+        for layer in (known & (codes < 0), known & (codes > 0)):
+            paint(grid, rows[layer], starts[layer], ends[layer], codes[layer])
+
+    chart = {
+        'from': start.strftime('%Y-%m-%d'),
+        'to': end.strftime('%Y-%m-%d'),
+        'days': days,
+        'rooms': [
+            {
+                'room_id': room.id,
+                'room_number': room.room_number,
+                'room_type': room.room_type,
+                'maintenance_status': room.maintenance_status,
+                **nights
+            }
+            for room, nights in zip(rooms, encode_rows(grid))
+        ]
+    }
+    if details:
+        chart['bookings'], chart['maintenance'] = {}, {}
+        for code, room_id, began, ended, label, status in intervals:
+            if code > 0:
+                chart['bookings'][code] = {
+                    'room_id': room_id,
+                    'customer_name': label,
+                    'status': status,
+                    'check_in': began,
+                    'check_out': ended
+                }
+            else:
+                chart['maintenance'][-code] = {
+                    'room_id': room_id,
+                    'reason': label,
+                    'status': status,
+                    'start_date': began,
+                    'end_date': ended
+                }
+    return chart
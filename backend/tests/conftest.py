@@ -0,0 +1,52 @@
+"""Shared fixtures: the application on a throwaway SQLite database, seeded like a fresh install."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, init_db
+from availability import availability_index
+from generations import generations
+from models import db
+from pricing import rate_calendar
+from principals import principal_cache
+from room_board import room_board
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'hotel.db'}",
+        'GENERATIONS_FILE': str(tmp_path / 'cache-generations'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'TESTING': True
+    })
+    # The per-process caches outlive any one app; make them read this database
+    availability_index.invalidate()
+    rate_calendar.invalidate()
+    room_board.invalidate()
+    principal_cache.clear()
+    init_db(app)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    generations.close()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, email, password):
+    response = client.post('/api/auth/login', json={'email': email, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+@pytest.fixture
+def admin_headers(client):
+    return login(client, 'admin@hotel.com', 'admin123')
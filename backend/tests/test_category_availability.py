@@ -0,0 +1,22 @@
+"""Category availability (/api/rooms/category-availability) on the public booking page."""
+import pytest
+
+
+def availability(client, check_in, check_out):
+    return client.get(f'/api/rooms/category-availability?check_in={check_in}&check_out={check_out}')
+
+
+def test_counts_free_rooms_per_category(client):
+    response = availability(client, '2027-03-01', '2027-03-04')
+    assert response.status_code == 200
+    counts = {row['category']: (row['available_rooms'], row['total_rooms']) for row in response.get_json()}
+    assert counts and all(available == total for available, total in counts.values())
+
+
+@pytest.mark.parametrize('check_in, check_out', [
+    ('2027-03-01', '9999-01-01'),  # would size the room x night matrix to ~2.9 million nights
+    ('2027-03-04', '2027-03-01'),
+    ('2027-03-01', '2027-03-01'),
+])
+def test_rejects_empty_and_oversized_stays(client, check_in, check_out):
+    assert availability(client, check_in, check_out).status_code == 400
@@ -0,0 +1,67 @@
+"""Concurrent booking requests through the real endpoints: no double booking, no 500s.
+
+Threads hammer POST /api/bookings (auto-assigned and room-specific) and
+POST /api/bookings/multi for a handful of rooms over a few nights. With the
+reservation locks disabled the room-night ledger is the only guard left, so
+that run exercises claim_nights() and retry_on_lock on their own.
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+import pytest
+
+from allocator import reservation_locks
+from benchmark import count_double_bookings
+from models import db, Booking, Room, RoomNight
+
+THREADS = 8
+REQUESTS = 160
+ROOM_TYPES = ('Deluxe Room', 'Grand Suite')
+
+
+def request_for(rng, room_ids):
+    check_in = date.today() + timedelta(days=rng.randrange(1, 6))
+    check_out = check_in + timedelta(days=rng.randint(1, 3))
+    guest = {'customer_name': 'Guest', 'customer_email': 'guest@example.com', 'customer_phone': '0',
+             'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()}
+    kind = rng.random()
+    if kind < 0.4:
+        return '/api/bookings', dict(guest, room_type=rng.choice(ROOM_TYPES))
+    if kind < 0.7:
+        return '/api/bookings', dict(guest, room_id=rng.choice(room_ids))
+    return '/api/bookings/multi', dict(guest, rooms=[
+        {'room_type': room_type, 'quantity': rng.randint(1, 2)} for room_type in ROOM_TYPES
+    ])
+
+
+@pytest.mark.parametrize('locks', [True, False], ids=['reservation-locks', 'ledger-only'])
+def test_concurrent_bookings_never_overlap(app, monkeypatch, locks):
+    if not locks:
+        monkeypatch.setattr(reservation_locks, 'hold', lambda *room_types: nullcontext())
+    with app.app_context():
+        room_ids = [room_id for (room_id,) in db.session.query(Room.id).filter(Room.room_type.in_(ROOM_TYPES))]
+
+    def hammer(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        statuses = []
+        for _ in range(REQUESTS // THREADS):
+            path, body = request_for(rng, room_ids)
+            response = client.post(path, json=body)
+            statuses.append(response.status_code)
+            if response.status_code != 201:
+                assert 'error' in response.get_json()
+        return statuses
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        statuses = [status for result in pool.map(hammer, range(THREADS)) for status in result]
+
+    assert set(statuses) <= {201, 400, 409}
+    assert statuses.count(201) > 0 and statuses.count(201) < len(statuses)
+    with app.app_context():
+        assert count_double_bookings() == 0
+        active = Booking.query.filter(Booking.status != 'cancelled').all()
+        held = db.session.query(db.func.count(RoomNight.id)).scalar()
+        assert held == sum((b.check_out - b.check_in).days for b in active)
@@ -0,0 +1,75 @@
+"""Dashboard counters match the Booking table even when a write comes before the first dashboard read."""
+from datetime import date, timedelta
+
+from app import init_db
+from models import db, Booking, DashboardCounter, SchemaVersion
+
+
+def book(client, days_ahead):
+    check_in = date.today() + timedelta(days=days_ahead)
+    response = client.post('/api/bookings', json={
+        'customer_name': 'Guest', 'customer_email': 'guest@example.com', 'customer_phone': '0',
+        'room_type': 'Deluxe Room', 'check_in': check_in.isoformat(),
+        'check_out': (check_in + timedelta(days=1)).isoformat()
+    })
+    assert response.status_code == 201, response.get_json()
+
+
+def expected(app):
+    with app.app_context():
+        bookings = Booking.query.all()
+        return {
+            'total_bookings': len(bookings),
+            'pending_bookings': sum(b.status == 'pending' for b in bookings),
+            'unread': sum(not b.read_by_employee for b in bookings)
+        }
+
+
+def dashboard(client, headers):
+    stats = client.get('/api/dashboard/stats', headers=headers).get_json()
+    return {
+        'total_bookings': stats['total_bookings'],
+        'pending_bookings': stats['pending_bookings'],
+        'unread': client.get('/api/notifications/unread', headers=headers).get_json()['count']
+    }
+
+
+def drop_counters(app):
+    with app.app_context():
+        DashboardCounter.query.delete()
+        db.session.commit()
+
+
+def test_write_before_first_read_counts_existing_bookings(app, client, admin_headers):
+    for n in range(5):
+        book(client, n)
+    drop_counters(app)
+
+    book(client, 10)
+    assert dashboard(client, admin_headers) == expected(app) == {'total_bookings': 6, 'pending_bookings': 6,
+                                                                 'unread': 6}
+
+
+def test_upgrade_seeds_counters_of_an_existing_database(app, client, admin_headers):
+    for n in range(5):
+        book(client, n)
+    drop_counters(app)
+    with app.app_context():
+        SchemaVersion.query.filter(SchemaVersion.version >= 7).delete()  # from dashboard_counters on
+        db.session.commit()
+
+    init_db(app)
+    with app.app_context():
+        assert DashboardCounter.query.count() == 5
+    book(client, 10)
+    assert dashboard(client, admin_headers) == expected(app)
+
+
+def test_bookings_spread_over_counter_shards(app, client, admin_headers):
+    book(client, 0)  # seeds the counters
+    for n in range(1, 6):
+        book(client, n)
+    with app.app_context():
+        shards = {c.shard for c in DashboardCounter.query.filter_by(name='total_bookings')}
+    assert len(shards) > 1
+    assert dashboard(client, admin_headers) == expected(app)
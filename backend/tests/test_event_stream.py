@@ -0,0 +1,80 @@
+"""Access to the booking event stream (/api/events)."""
+import principals
+from events import EventBus, Subscription, event_bus, events_after
+from models import db, BookingEvent
+
+
+def ticket_for(client, headers):
+    response = client.post('/api/events/ticket', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['ticket']
+
+
+def open_stream(client, query):
+    response = client.get(f'/api/events?{query}', buffered=False)
+    try:
+        first = next(iter(response.response)) if response.status_code == 200 else None
+    finally:
+        response.close()
+    return response.status_code, first
+
+
+def test_stream_opens_with_a_ticket(client, admin_headers):
+    status, first = open_stream(client, f'ticket={ticket_for(client, admin_headers)}')
+    assert status == 200
+    assert first.startswith(b'retry:')
+
+
+def test_session_token_is_not_accepted_in_the_url(client, admin_headers):
+    token = admin_headers['Authorization'].split(' ')[1]
+    assert open_stream(client, f'access_token={token}')[0] == 401
+    assert open_stream(client, f'ticket={token}')[0] == 401
+
+
+def test_ticket_is_not_a_bearer_token(client, admin_headers):
+    ticket = ticket_for(client, admin_headers)
+    assert client.get('/api/bookings', headers={'Authorization': f'Bearer {ticket}'}).status_code == 401
+
+
+def test_expired_ticket_is_rejected(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(principals, 'STREAM_TICKET_SECONDS', -1)
+    assert open_stream(client, f'ticket={ticket_for(client, admin_headers)}')[0] == 401
+
+
+def test_ticket_requires_staff(client):
+    assert client.post('/api/events/ticket').status_code == 401
+
+
+def test_streams_over_the_cap_get_503(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(event_bus, 'max_streams', 1)
+    held = client.get(f'/api/events?ticket={ticket_for(client, admin_headers)}', buffered=False)
+    assert held.status_code == 200
+
+    busy = client.get(f'/api/events?ticket={ticket_for(client, admin_headers)}', buffered=False)
+    assert busy.status_code == 503
+    assert int(busy.headers['Retry-After']) > 0
+
+    held.close()  # frees the slot, even though the stream was never read
+    assert open_stream(client, f'ticket={ticket_for(client, admin_headers)}')[0] == 200
+
+
+def add_event(event_id, booking_id):
+    db.session.add(BookingEvent(id=event_id, kind='booking-created', booking_id=booking_id, payload='{}'))
+    db.session.commit()
+
+
+def test_event_committed_after_a_higher_id_is_still_delivered(app):
+    # PostgreSQL and MySQL allocate ids at insert, so id 5 can commit after id 10
+    bus = EventBus()
+    subscription = Subscription()
+    bus._subscribers.add(subscription)  # no bus thread: the test polls by hand
+    with app.app_context():
+        bus._start()
+        add_event(10, 1)
+        bus._fetch()
+        add_event(5, 2)
+        bus._fetch()
+        bus._fetch()
+        delivered = [subscription.queue.get_nowait()[0] for _ in range(subscription.queue.qsize())]
+        assert delivered == [10, 5]  # 5 once, 10 not again
+        assert [row[0] for row in events_after(10, 100)] == [5]
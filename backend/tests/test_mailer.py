@@ -0,0 +1,83 @@
+"""Outbox delivery against an in-process SMTP stand-in on localhost."""
+import socketserver
+import threading
+
+import pytest
+
+import mailer
+from models import db, EmailOutbox
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: greet, accept every command and collect DATA."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost test SMTP')
+        for raw in self.rfile:
+            command = raw.decode().strip().upper()
+            if command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for line in self.rfile:
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(line.decode())
+                self.server.messages.append(''.join(lines))
+                self.reply('250 OK')
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('SMTP_HOST', '127.0.0.1')
+    monkeypatch.setattr(mailer, 'SMTP_HOST', '127.0.0.1')
+    monkeypatch.setattr(mailer, 'SMTP_PORT', server.server_address[1])
+    monkeypatch.setattr(mailer, 'SMTP_STARTTLS', False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def book(client):
+    response = client.post('/api/bookings', json={
+        'customer_name': 'Mail Guest', 'customer_email': 'guest@example.com', 'customer_phone': '1',
+        'check_in': '2027-05-01', 'check_out': '2027-05-03', 'room_type': 'Deluxe Room'
+    })
+    assert response.status_code == 201, response.get_json()
+
+
+def test_booking_notification_is_delivered(app, client, smtp_server):
+    book(client)
+    with app.app_context():
+        assert mailer.drain_outbox() == 1
+        message = EmailOutbox.query.one()
+        assert message.status == 'sent' and message.attempts == 0
+    assert len(smtp_server.messages) == 1
+    assert 'Subject: New Booking - Mail Guest' in smtp_server.messages[0]
+
+
+def test_unexpected_error_counts_as_an_attempt(app, client, smtp_server, monkeypatch):
+    book(client)
+
+    def broken(message):
+        raise ValueError('cannot encode')
+
+    monkeypatch.setattr(mailer, 'build_message', broken)
+    with app.app_context():
+        assert mailer.drain_outbox() == 1
+        message = EmailOutbox.query.one()
+        assert (message.status, message.attempts, message.last_error) == ('pending', 1, 'cannot encode')
+        assert mailer.claim_batch() == []  # backing off, not re-leased straight away
+        db.session.rollback()
+    assert smtp_server.messages == []
@@ -0,0 +1,16 @@
+"""Validation of POST /api/bookings/multi."""
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.mark.parametrize('quantity', [0, -1, 'two'])
+def test_multi_booking_rejects_quantities_below_one(client, quantity):
+    check_in = date.today() + timedelta(days=1)
+    response = client.post('/api/bookings/multi', json={
+        'customer_name': 'Guest', 'customer_email': 'guest@example.com', 'customer_phone': '0',
+        'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=1)).isoformat(),
+        'rooms': [{'room_type': 'Deluxe Room', 'quantity': quantity}]
+    })
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
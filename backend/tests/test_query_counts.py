@@ -0,0 +1,59 @@
+"""List endpoints cost the same number of queries for one row as for many (no lazy-load N+1)."""
+from datetime import date, timedelta
+
+import pytest
+
+from benchmark import QueryCounter
+from conftest import login
+from models import db, Agent, Booking, RateRule, Room, User
+
+CUSTOMER = {'name': 'Query Count', 'email': 'count@example.com', 'password': 'secret123'}
+
+
+def add_rows(app, count, offset=0):
+    """`count` bookings for the customer and rate rules, each on its own room, agent and creator."""
+    with app.app_context():
+        rooms = Room.query.order_by(Room.id).all()
+        customer = User.query.filter_by(email=CUSTOMER['email']).one()
+        for n in range(offset, offset + count):
+            agent = Agent(name=f'Agent {n}', email=f'agent{n}@example.com', phone='0', status='approved')
+            creator = User(name=f'Staff {n}', email=f'staff{n}@example.com', password_hash='-', role='employee')
+            db.session.add_all([agent, creator])
+            db.session.flush()
+            check_in = date.today() + timedelta(days=3 * n)
+            db.session.add(Booking(
+                room_id=rooms[n % len(rooms)].id, agent_id=agent.id, user_id=customer.id,
+                customer_name=CUSTOMER['name'], customer_email=CUSTOMER['email'], customer_phone='0',
+                check_in=check_in, check_out=check_in + timedelta(days=2), total_price=100, status='confirmed'
+            ))
+            db.session.add(RateRule(name=f'Rule {n}', start_date=check_in, end_date=check_in, rate_multiplier=1.1,
+                                    created_by=creator.id))
+        db.session.commit()
+
+
+def queries_for(app, client, path, headers):
+    client.get(path, headers=headers)  # warm the principal cache and indexes
+    with app.app_context(), QueryCounter() as counter:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return counter.count, len(response.get_json())
+
+
+@pytest.mark.parametrize('path, as_customer', [
+    ('/api/bookings', False),
+    ('/api/my-bookings', True),
+    ('/api/my-bookings', False),
+    ('/api/rates', False),
+])
+def test_list_queries_do_not_grow_with_rows(app, client, admin_headers, path, as_customer):
+    assert client.post('/api/auth/register', json=CUSTOMER).status_code == 201
+    headers = login(client, CUSTOMER['email'], CUSTOMER['password']) if as_customer else admin_headers
+
+    add_rows(app, 1)
+    one, rows = queries_for(app, client, path, headers)
+    assert rows == 1
+
+    add_rows(app, 24, offset=1)
+    many, rows = queries_for(app, client, path, headers)
+    assert rows == 25
+    assert many == one
@@ -0,0 +1,43 @@
+"""Room re-optimization (/api/rooms/reassign) moves as few guests as it can and tells the dashboard."""
+import json
+from datetime import date, timedelta
+
+from models import Booking, BookingEvent
+
+
+def book(client, headers, room_id, first, last, pinned=True):
+    response = client.post('/api/bookings', json={
+        'customer_name': 'Guest', 'customer_email': 'guest@example.com', 'customer_phone': '0', 'room_id': room_id,
+        'check_in': (date.today() + timedelta(days=first)).isoformat(),
+        'check_out': (date.today() + timedelta(days=last)).isoformat()
+    })
+    assert response.status_code == 201, response.get_json()
+    booking_id = response.get_json()['id']
+    if not pinned:
+        client.put(f'/api/bookings/{booking_id}', json={'room_pinned': False}, headers=headers)
+    return booking_id
+
+
+def test_only_stays_that_strand_nights_move(app, client, admin_headers):
+    # Grand Suites 11-13; days are counted from today
+    book(client, admin_headers, 11, 2, 4)
+    book(client, admin_headers, 11, 5, 8)
+    book(client, admin_headers, 11, 20, 22)
+    book(client, admin_headers, 11, 23, 30)
+    book(client, admin_headers, 12, 1, 3)
+    frozen = book(client, admin_headers, 12, 4, 5, pinned=False)  # strands night 3, but arrives too soon
+    book(client, admin_headers, 12, 20, 21)
+    stranding = book(client, admin_headers, 12, 22, 23, pinned=False)  # strands night 21; fits 11 exactly
+    harmless = book(client, admin_headers, 13, 40, 42, pinned=False)
+
+    response = client.post('/api/rooms/reassign', json={'room_type': 'Grand Suite'}, headers=admin_headers)
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['changes'] == [{'booking_id': stranding, 'from_room_id': 12, 'to_room_id': 11}]
+    assert report['after']['orphan_nights'] < report['before']['orphan_nights']
+
+    with app.app_context():
+        rooms = {b.id: b.room_id for b in Booking.query.filter(Booking.id.in_((frozen, stranding, harmless)))}
+        assert rooms == {frozen: 12, stranding: 11, harmless: 13}
+        events = BookingEvent.query.filter_by(kind='booking-room-changed').all()
+        assert [(e.booking_id, json.loads(e.payload)['previous_room_id']) for e in events] == [(stranding, 12)]
@@ -0,0 +1,48 @@
+"""Migrations build the schema the models describe, the same way on every database."""
+from sqlalchemy import create_engine, inspect
+
+from app import create_app
+from migrations import MIGRATIONS, baseline_metadata, upgrade
+from models import db
+
+
+def schema(engine):
+    inspector = inspect(engine)
+    return {
+        table: (
+            {c['name'] for c in inspector.get_columns(table)},
+            {i['name'] for i in inspector.get_indexes(table)}
+        )
+        for table in inspector.get_table_names()
+    }
+
+
+def migrated_app(tmp_path, name):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / name}",
+        'GENERATIONS_FILE': str(tmp_path / 'cache-generations'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'TESTING': True
+    })
+
+
+def test_migrations_from_scratch_build_the_models_schema(app, tmp_path):
+    fresh = migrated_app(tmp_path, 'fresh.db')
+    with fresh.app_context():
+        assert [version for version, _ in upgrade()] == [m[0] for m in MIGRATIONS]
+        built = schema(db.engine)
+        db.engine.dispose()
+
+    modelled = create_engine(f"sqlite:///{tmp_path / 'modelled.db'}")
+    db.metadata.create_all(modelled)
+    assert built == schema(modelled)
+
+
+def test_first_migration_builds_only_the_baseline_tables(app, tmp_path):
+    fresh = migrated_app(tmp_path, 'baseline.db')
+    with fresh.app_context():
+        MIGRATIONS[0][2]()
+        db.session.commit()
+        assert set(inspect(db.engine).get_table_names()) == set(baseline_metadata().tables)
+        assert 'room_pinned' not in {c['name'] for c in inspect(db.engine).get_columns('booking')}
+        db.engine.dispose()
@@ -0,0 +1,29 @@
+"""Tape chart rows (/api/tape-chart) come run-length encoded or night by night, whichever is shorter."""
+from datetime import date, timedelta
+
+
+def nights(room):
+    if 'cells' in room:
+        return room['cells']
+    return [code for code, count in room['runs'] for _ in range(count)]
+
+
+def test_each_room_gets_the_shorter_encoding(client, admin_headers):
+    start = date.today() + timedelta(days=30)
+    booked = []
+    for offset in range(0, 10, 2):  # room 1 turns over every other night
+        check_in = start + timedelta(days=offset)
+        response = client.post('/api/bookings', json={
+            'customer_name': 'Guest', 'customer_email': 'guest@example.com', 'customer_phone': '0', 'room_id': 1,
+            'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=1)).isoformat()
+        })
+        booked.append(response.get_json()['id'])
+
+    end = start + timedelta(days=10)
+    response = client.get(f'/api/tape-chart?from={start}&to={end}', headers=admin_headers)
+    assert response.status_code == 200
+    rooms = {room['room_id']: room for room in response.get_json()['rooms']}
+
+    assert 'cells' in rooms[1]
+    assert nights(rooms[1]) == [code for booking_id in booked for code in (booking_id, 0)]
+    assert rooms[2]['runs'] == [[0, 10]]
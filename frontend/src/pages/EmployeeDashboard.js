@@ -1,6 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import authAxios, { getUser, isAdmin } from '../utils/auth';
+import authAxios, { API_URL, getUser, isAdmin } from '../utils/auth';
 import CategoryManagementTab from './tabs/CategoryManagementTab';
 import UserManagementTab from './tabs/UserManagementTab';
 import HolidayManagementTab from './tabs/HolidayManagementTab';
@@ -16,6 +16,7 @@ function EmployeeDashboard() {
   const toast = useToast();
 
   const [activeTab, setActiveTab] = useState('dashboard');
+  const activeTabRef = useRef(activeTab);
   const [activeSubMenu, setActiveSubMenu] = useState('');
   const [stats, setStats] = useState({});
   const [bookings, setBookings] = useState([]);
@@ -70,10 +71,71 @@ function EmployeeDashboard() {
 
   useEffect(() => {
     fetchData();
-    const interval = setInterval(fetchNotifications, 30000);
-    return () => clearInterval(interval);
+    if (!window.EventSource) {
+      const interval = setInterval(fetchNotifications, 30000);
+      return () => clearInterval(interval);
+    }
+    // Booking changes are pushed by the server. The stream is opened with a short-lived
+    // ticket instead of the session token, so every (re)connect asks for a fresh one and
+    // resumes after the last event seen. Failed attempts (e.g. 503 when the server has
+    // no stream slot free) back off up to a minute.
+    let source = null;
+    let retryTimer = null;
+    let stopped = false;
+    let lastEventId = null;
+    let failures = 0;
+    const onBookingEvent = (event) => {
+      if (event.lastEventId) {
+        lastEventId = event.lastEventId;
+      }
+      fetchNotifications();
+      if (activeTabRef.current === 'bookings') {
+        fetchBookings();
+      }
+    };
+    const reconnectLater = () => {
+      if (!stopped) {
+        retryTimer = setTimeout(connect, Math.min(3000 * 2 ** failures, 60000));
+        failures += 1;
+      }
+    };
+    const connect = async () => {
+      try {
+        const response = await authAxios.post('/events/ticket');
+        if (stopped) return;
+        const params = new URLSearchParams({ ticket: response.data.ticket });
+        if (lastEventId) {
+          params.set('last_event_id', lastEventId);
+        }
+        source = new EventSource(`${API_URL}/events?${params}`);
+        ['booking-created', 'booking-status-changed', 'booking-room-changed', 'receipt-uploaded', 'resync'].forEach((type) =>
+          source.addEventListener(type, onBookingEvent)
+        );
+        source.onopen = () => {
+          failures = 0;
+        };
+        source.onerror = () => {
+          source.close();
+          reconnectLater();
+        };
+      } catch (error) {
+        reconnectLater();
+      }
+    };
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      if (source) {
+        source.close();
+      }
+    };
   }, []);
 
+  useEffect(() => {
+    activeTabRef.current = activeTab;
+  }, [activeTab]);
+
   // Close action dropdown when clicking outside
   useEffect(() => {
     if (!openActionDropdown) return;